@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, Tuple
 
 class Settings(BaseModel):
     api_title: str = "CEMS API"
@@ -10,9 +10,60 @@ class Settings(BaseModel):
     modbus_default_port: int = 502
     modbus_default_unit: int = 1
 
+    # Read plan: รวม mapping ที่อยู่ติดกันเป็น block เดียว
+    modbus_max_block_registers: int = 125  # ขีดจำกัดของโปรโตคอล Modbus ต่อ 1 request
+    modbus_block_gap_tolerance: int = 4  # ยอมอ่าน register ที่ไม่ได้ใช้คั่นกลางได้ไม่เกินกี่ตัว
+    modbus_max_block_coils: int = 2000  # ขีดจำกัดของ read_coils ต่อ 1 request
+    modbus_coil_gap_tolerance: int = 256  # coil ที่ไม่ได้ใช้คั่นกลางได้ไม่เกินกี่ตัว (1 coil = 1 bit)
+
+    # Connection manager: socket ที่ใช้ร่วมกันทั้ง process (key = host:port)
+    modbus_max_connections_per_gateway: int = 2
+    modbus_connect_timeout: float = 3.0  # วินาที
+    modbus_lease_timeout: float = 5.0  # รอ socket ว่างได้นานสุดกี่วินาที
+    modbus_keepalive_interval: float = 30.0  # ตรวจ socket ที่ว่างอยู่ทุกกี่วินาที
+
+    # Acquisition engine (asyncio): อ่านทุก device พร้อมกัน
+    modbus_request_timeout: float = 0.3  # timeout ต่อ 1 request (วินาที)
+    modbus_poll_timeout: float = 0.5  # เวลาสูงสุดของ 1 รอบ poll - device ที่ช้ากว่านี้ถูกยกเลิก
+    modbus_min_request_timeout: float = 0.05  # timeout ต่ำสุดที่คำนวณจาก RTT
+    modbus_max_request_timeout: float = 3.0  # timeout สูงสุดที่คำนวณจาก RTT (เช่น device ผ่าน radio link)
+    modbus_pipeline_retry_after: float = 300.0  # device ที่ตอบ pipelined request ผิดพลาด ใช้แบบทีละ request กี่วินาทีก่อนลองใหม่
+    modbus_pipeline_fallback_timeouts: int = 3  # pipelined รอบที่ timeout ติดกันกี่รอบจึงเลิก pipelining (response ผิดคู่ = เลิกทันที)
+    modbus_max_retries: int = 2  # ลองซ้ำหลัง timeout ได้มากสุดกี่ครั้งต่อ request
+    modbus_breaker_failure_threshold: int = 3  # ล้มเหลวติดกันกี่ครั้งจึงพัก device
+    modbus_breaker_base_backoff: float = 1.0  # พัก device ครั้งแรกกี่วินาที (เพิ่มเป็น 2 เท่าทุกครั้งที่ทดสอบไม่ผ่าน)
+    modbus_breaker_max_backoff: float = 60.0
+    # > 0 = แบ่ง device ตาม gateway ไปอ่านใน worker process หลายตัว (สำหรับ device จำนวนมาก)
+    acquisition_workers: int = 0
+    # หลาย uvicorn worker: worker ที่ได้ lock เป็นผู้ poll แล้วเขียนค่าล่าสุดลง shared memory ให้ worker อื่นอ่าน
+    acquisition_lock_path: str = ""  # ว่าง = <tempdir>/cems_acquisition.lock
+    shared_table_name: str = "cems_latest"
+    shared_table_capacity: int = 512  # จำนวน parameter สูงสุดในตาราง
+    shared_table_refresh: float = 0.1  # worker ที่ไม่ได้ poll อ่านตารางทุกกี่วินาที
+    config_check_interval: float = 1.0  # ตรวจ mtime ของ devices.json/mappings.json ทุกกี่วินาที (แก้จาก worker อื่น)
+    modbus_default_poll_interval: float = 1.0  # รอบ poll ของ mapping ที่ไม่ได้กำหนด pollInterval
+    status_poll_interval: float = 5.0  # อ่าน coil ของ status/alarm ทุกกี่วินาที
+    deadband_default: float = 0.0  # deadband (absolute) ของ mapping ที่ไม่ได้กำหนด - 0 = ส่งเมื่อค่าเปลี่ยน
+    # deadband (% ของค่าที่ส่งล่าสุด) ของ mapping ที่ไม่ได้กำหนด - กัน noise ของ float ไม่ให้นับเป็นค่าเปลี่ยน
+    # ตั้ง deadbandPercent: 0 ใน mapping เพื่อส่งทุกครั้งที่ค่าเปลี่ยน
+    deadband_default_percent: float = 0.1
+    deadband_max_silence: float = 60.0  # heartbeat: ส่งค่าซ้ำอย่างน้อยทุกกี่วินาที
+    # O2 correction: O2 อ้างอิงเริ่มต้น (แก๊สใน gas.json กำหนด referenceO2 ของตัวเองได้)
+    o2_reference_default: float = 7.0
+    o2_correction_min: float = 0.0  # O2 ที่วัดได้ต้องมากกว่านี้...
+    o2_correction_max: float = 21.0  # ...และน้อยกว่านี้ จึงจะ correct
+    o2_correction_max_factor: float = 10.0  # factor ที่มากกว่านี้ถือว่าผิดปกติ ไม่ correct
+    # คำนวณ *Corr ย้อนหลังใหม่ (เมื่อ rule ของ O2 correction เปลี่ยน)
+    recorrection_chunk_seconds: float = 21600.0  # อ่านค่าดิบทีละกี่วินาทีของข้อมูล (6 ชม. ~ 21,600 แถวที่ 1 วินาที)
+    recorrection_write_batch: int = 5000  # จำนวนแถวต่อ 1 write request
+    recorrection_checkpoint_path: str = "config/recorrection_checkpoint.json"
+    # ค่าเฉลี่ยแบบ rolling ใน memory: ความยาว bucket (วินาที) และจำนวน bucket ที่ปิดแล้วที่เก็บไว้ต่อ window
+    rolling_windows: Tuple[int, ...] = (60, 900, 3600)
+    rolling_history: int = 60
+
     data_update_interval: int = 10000  # 10 วินาที
     max_data_points: int = 50000  # เพิ่ม max_data_points เป็น 50000
 
     config_file_path: str = "config.json"
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
@@ -8,6 +8,7 @@ class DeviceConfig(BaseModel):
     port: int
     unit: int
     enabled: bool = True
+    pipeline: int = 0  # จำนวน request ที่ส่งค้างบน socket ได้พร้อมกัน (0/1 = ส่งทีละ request แล้วรอ response)
 
 class MappingConfig(BaseModel):
     id: Optional[int] = None
@@ -18,6 +19,10 @@ class MappingConfig(BaseModel):
     format: str = "AB CD"
     count: int = 2
     device: str
+    pollInterval: Optional[float] = None  # วินาที - ไม่ระบุ = ใช้ค่า default ของระบบ
+    deadband: Optional[float] = None  # ส่งต่อเมื่อค่าเปลี่ยนเกินค่านี้ (หน่วยเดียวกับค่า)
+    deadbandPercent: Optional[float] = None  # ส่งต่อเมื่อค่าเปลี่ยนเกินกี่ % ของค่าที่ส่งล่าสุด
+    maxSilence: Optional[float] = None  # วินาที - ส่งซ้ำแม้ค่าไม่เปลี่ยนเมื่อเงียบนานเกินนี้ (heartbeat)
 
 class GasConfig(BaseModel):
     parameter: str
@@ -50,6 +55,7 @@ class DeviceCreate(BaseModel):
     host: str
     port: int = 502
     unit: int = 1
+    pipeline: int = 0
 
 class DeviceUpdate(BaseModel):
     name: Optional[str] = None
@@ -57,6 +63,7 @@ class DeviceUpdate(BaseModel):
     host: Optional[str] = None
     port: Optional[int] = None
     unit: Optional[int] = None
+    pipeline: Optional[int] = None
 
 class MappingCreate(BaseModel):
     name: str
@@ -66,6 +73,10 @@ class MappingCreate(BaseModel):
     format: str = "AB CD"
     count: int = 2
     device: str
+    pollInterval: Optional[float] = None  # วินาที - ไม่ระบุ = ใช้ค่า default ของระบบ
+    deadband: Optional[float] = None  # ส่งต่อเมื่อค่าเปลี่ยนเกินค่านี้ (หน่วยเดียวกับค่า)
+    deadbandPercent: Optional[float] = None  # ส่งต่อเมื่อค่าเปลี่ยนเกินกี่ % ของค่าที่ส่งล่าสุด
+    maxSilence: Optional[float] = None  # วินาที - ส่งซ้ำแม้ค่าไม่เปลี่ยนเมื่อเงียบนานเกินนี้ (heartbeat)
 
 class GasSettings(BaseModel):
     key: str
@@ -75,6 +86,9 @@ class GasSettings(BaseModel):
     min: float = 0
     max: float = 100
     alarm: float = 80
+    showCorrected: bool = True
+    correct: Optional[bool] = None  # O2 correction - None = ตามค่าเริ่มต้นของแก๊สนั้น
+    referenceO2: Optional[float] = None  # O2 อ้างอิง (%) - None = settings.o2_reference_default
 
 class SystemParams(BaseModel):
     logInterval: int = 1
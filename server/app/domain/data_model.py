@@ -2,6 +2,10 @@ from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 
+# field คงที่ของ DataPoint (ลำดับเดียวกับที่ประกาศ)
+FIXED_FIELDS = ("SO2", "NOx", "O2", "CO", "Dust", "Temperature", "Velocity", "Flowrate", "Pressure")
+_FIXED_FIELD_SET = frozenset(FIXED_FIELDS)
+
 class DataPoint(BaseModel):
     timestamp: datetime
     
@@ -25,7 +29,7 @@ class DataPoint(BaseModel):
     def get(self, key: str, default: float = 0.0) -> float:
         """ดึงค่า parameter - ลอง fixed field ก่อน แล้วค่อยลอง extra_params"""
         # ถ้ามี fixed field ใช้ fixed
-        if key in ['SO2', 'NOx', 'O2', 'CO', 'Dust', 'Temperature', 'Velocity', 'Flowrate', 'Pressure']:
+        if key in _FIXED_FIELD_SET:
             return getattr(self, key, default)
         # ไม่งั้นใช้ extra_params
         return self.extra_params.get(key, default)
@@ -33,7 +37,7 @@ class DataPoint(BaseModel):
     def set(self, key: str, value: float):
         """ตั้งค่า parameter - ถ้ามี fixed field ใช้ fixed ไม่งั้นใช้ extra_params"""
         # ถ้ามี fixed field ใช้ fixed
-        if key in ['SO2', 'NOx', 'O2', 'CO', 'Dust', 'Temperature', 'Velocity', 'Flowrate', 'Pressure']:
+        if key in _FIXED_FIELD_SET:
             setattr(self, key, value)
         # ไม่งั้นใช้ extra_params
         else:
@@ -74,4 +78,11 @@ class StackData(BaseModel):
 class DataResponse(BaseModel):
     success: bool
     data:Optional[List[StackData]] = None
-    message:Optional[str] = None
\ No newline at end of file
+    message:Optional[str] = None
+
+class RecorrectionRequest(BaseModel):
+    """ช่วงข้อมูลที่ต้องคำนวณ *Corr ใหม่"""
+    stack_id: str = "stack1"
+    start_time: datetime
+    end_time: datetime
+    chunk_seconds: Optional[float] = None
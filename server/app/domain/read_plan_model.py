@@ -0,0 +1,29 @@
+from pydantic import BaseModel, Field
+from typing import List, Any, Optional
+
+class BlockChannel(BaseModel):
+    name: str
+    address: int
+    count: int
+    dataType: str = "float32"
+    format: str = "AB CD"
+    offset: int  # ตำแหน่งของ channel ภายใน block (นับเป็น register)
+
+class ReadBlock(BaseModel):
+    start: int
+    count: int
+    channels: List[BlockChannel]
+    decoder: Optional[Any] = Field(default=None, exclude=True, repr=False)  # BlockDecoder ที่ compile แล้ว
+
+class DeviceReadPlan(BaseModel):
+    device: str
+    host: str
+    port: int
+    unit: int
+    pipeline: int = 0  # window ของ pipelined request (จาก DeviceConfig)
+    blocks: List[ReadBlock] = []
+    mapping_count: int = 0  # จำนวน request ถ้าอ่านทีละ mapping แบบเดิม
+
+    @property
+    def round_trips_saved(self) -> int:
+        return max(self.mapping_count - len(self.blocks), 0)
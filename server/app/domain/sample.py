@@ -0,0 +1,93 @@
+from array import array
+from datetime import datetime
+from typing import Dict, Iterable, Mapping, Optional, Tuple
+from app.domain.data_model import DataPoint, FIXED_FIELDS
+
+# field คงที่ของ DataPoint - อยู่ต้น schema เสมอ (ลำดับเดียวกับ DataPoint)
+FIXED_PARAMETERS = FIXED_FIELDS
+
+class SampleSchema:
+    """ลำดับชื่อ parameter -> index ของ Sample.values (สร้างครั้งเดียวต่อชุดชื่อ แล้วใช้ซ้ำทุก tick)"""
+
+    __slots__ = ("names", "index", "extra_start")
+
+    def __init__(self, extra: Iterable[str] = ()):
+        extra = tuple(name for name in dict.fromkeys(extra) if name not in FIXED_PARAMETERS)
+        self.names: Tuple[str, ...] = FIXED_PARAMETERS + extra
+        self.index: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+        self.extra_start = len(FIXED_PARAMETERS)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __repr__(self) -> str:
+        return f"SampleSchema({len(self.names)} parameters)"
+
+# schema ของ dashboard/InfluxDB ที่ใช้เฉพาะ field คงที่
+FIXED_SCHEMA = SampleSchema()
+
+class Sample:
+    """ค่าของทุก parameter ณ เวลาหนึ่ง: timestamp + array ของ float ตาม schema
+
+    ใช้ภายในบน hot path (poll -> correction -> WebSocket/InfluxDB) แทน DataPoint
+    สร้าง DataPoint (pydantic) เฉพาะตอนส่งออกทาง REST API ด้วย to_data_point()
+    """
+
+    __slots__ = ("schema", "timestamp", "values")
+
+    def __init__(self, schema: SampleSchema, timestamp: datetime, values: Optional[array] = None):
+        self.schema = schema
+        self.timestamp = timestamp
+        self.values = values if values is not None else array("d", bytes(8 * len(schema)))
+
+    @classmethod
+    def from_mapping(cls, schema: SampleSchema, timestamp: datetime, data: Mapping[str, float],
+                     allowed=None, missing: float = 0.0) -> "Sample":
+        """สร้างจาก dict ของค่า - ชื่อที่ไม่มีใน data (หรือไม่อยู่ใน allowed) เป็น missing
+
+        missing=NaN ใช้เมื่อต้องแยก "ไม่ได้อ่าน" ออกจาก 0 จริง (เช่น ค่าเฉลี่ยตามช่วงเวลา)
+        """
+        get = data.get
+        if allowed is None:
+            values = array("d", [missing if (value := get(name)) is None else value for name in schema.names])
+        else:
+            values = array("d", [missing if name not in allowed or (value := get(name)) is None else value
+                                 for name in schema.names])
+        return cls(schema, timestamp, values)
+
+    def get(self, name: str, default: float = 0.0) -> float:
+        i = self.schema.index.get(name)
+        return default if i is None else self.values[i]
+
+    def set(self, name: str, value: float):
+        self.values[self.schema.index[name]] = value
+
+    def copy(self, timestamp: Optional[datetime] = None) -> "Sample":
+        return Sample(self.schema, timestamp or self.timestamp, array("d", self.values))
+
+    def as_dict(self) -> Dict[str, float]:
+        """dict ชื่อ -> ค่า (เหมือน DataPoint.to_dict())"""
+        return dict(zip(self.schema.names, self.values))
+
+    def to_json_dict(self) -> Dict:
+        """รูปแบบเดียวกับ DataPoint.dict() แต่ timestamp เป็น ISO string (สำหรับ json.dumps โดยตรง)"""
+        names = self.schema.names
+        start = self.schema.extra_start
+        result = {"timestamp": self.timestamp.isoformat()}
+        result.update(zip(names[:start], self.values[:start]))
+        result["extra_params"] = dict(zip(names[start:], self.values[start:]))
+        return result
+
+    def to_data_point(self) -> DataPoint:
+        """DataPoint สำหรับ REST API (สร้างตอนส่งออกเท่านั้น)"""
+        names = self.schema.names
+        start = self.schema.extra_start
+        fields = dict(zip(names[:start], self.values[:start]))
+        return DataPoint(
+            timestamp=self.timestamp,
+            extra_params=dict(zip(names[start:], self.values[start:])),
+            **fields,
+        )
+
+    def __repr__(self) -> str:
+        return f"Sample({self.timestamp.isoformat()}, {self.as_dict()})"
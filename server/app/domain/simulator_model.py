@@ -0,0 +1,45 @@
+from pydantic import BaseModel
+from typing import List, Dict, Optional
+
+class WaveformConfig(BaseModel):
+    kind: str = "sine"  # constant, sine, ramp, square, random_walk
+    base: float = 50.0
+    amplitude: float = 5.0
+    period: float = 60.0  # วินาที
+    noise: float = 0.0  # ส่วนเบี่ยงเบนมาตรฐานของ noise ที่บวกเพิ่ม
+    phase: float = 0.0  # วินาที
+
+class SimulatedChannel(BaseModel):
+    name: str
+    address: int
+    dataType: str = "float32"
+    format: str = "AB CD"
+    waveform: WaveformConfig = WaveformConfig()
+
+class SimulatedCoil(BaseModel):
+    name: str
+    address: int
+    period: float = 0.0  # วินาที - 0 = ค่าคงที่ตาม value
+    value: int = 0
+
+class FaultProfile(BaseModel):
+    latency: float = 0.0  # วินาทีต่อ request
+    jitter: float = 0.0  # สุ่มเพิ่ม/ลดจาก latency ได้ไม่เกินค่านี้
+    drop_rate: float = 0.0  # สัดส่วน request ที่ไม่ตอบเลย (0-1)
+    exception_rate: float = 0.0  # สัดส่วน request ที่ตอบ exception (0-1)
+    exception_code: int = 4  # server device failure
+    strict_addresses: bool = False  # ตอบ illegal address เมื่ออ่านช่วงที่ไม่มี mapping
+    pipelining: bool = False  # ประมวลผล request ที่ส่งค้างมาบน connection เดียวพร้อมกัน (ตอบตามลำดับที่เสร็จ)
+
+class SimulatedUnit(BaseModel):
+    unit: int
+    device: str
+    channels: List[SimulatedChannel] = []
+    coils: List[SimulatedCoil] = []
+
+class SimulatedGateway(BaseModel):
+    host: str = "127.0.0.1"
+    port: int
+    units: Dict[int, SimulatedUnit] = {}
+    faults: FaultProfile = FaultProfile()
+    source: Optional[str] = None  # host:port เดิมใน devices.json
@@ -21,4 +21,15 @@ class StatusResponse(BaseModel):
     system_status: str
     active_alarms: int
     statuses: List[StatusItem]
-    alarms: List[AlarmItem]
\ No newline at end of file
+    alarms: List[AlarmItem]
+
+
+class StatusEvent(BaseModel):
+    """การเปลี่ยนสถานะของ status/alarm 1 ตัว (บันทึกเฉพาะเมื่อค่าเปลี่ยน)"""
+    name: str
+    type: str  # status / alarm
+    device: str
+    address: int
+    old: Optional[int] = None  # None = ค่าแรกที่อ่านได้หลังเริ่มระบบ
+    new: int
+    timestamp: datetime
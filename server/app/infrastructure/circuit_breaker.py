@@ -0,0 +1,132 @@
+from typing import Dict, Optional
+from app.core.config import settings
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(ConnectionError):
+    """device ถูกพักไว้ (breaker เปิดอยู่) - ไม่ส่ง request ไปจนกว่าจะถึงเวลาทดสอบครั้งถัดไป"""
+
+    def __init__(self, key: str, retry_in: float):
+        self.key = key
+        self.retry_in = retry_in
+        super().__init__(f"Device '{key}' is unavailable, next probe in {retry_in:.1f}s")
+
+class _Breaker:
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0  # ล้มเหลวติดกันกี่ครั้ง
+        self.trips = 0  # เปิดติดกันกี่ครั้ง (ใช้คำนวณ backoff)
+        self.backoff = 0.0
+        self.next_probe = 0.0  # monotonic time ที่ยอมให้ทดสอบครั้งถัดไป
+        self.probing = False  # มี request ทดสอบ (half-open) ค้างอยู่หรือไม่
+        self.last_error: Optional[str] = None
+        self.last_change = time.time()
+
+class CircuitBreakerRegistry:
+    """สถานะสุขภาพของแต่ละ device (closed / open / half-open)
+
+    - closed: ส่ง request ตามปกติ ล้มเหลวติดกันครบ failure_threshold จะเปิด breaker
+    - open: ปฏิเสธทันทีโดยไม่แตะ network จนถึง next_probe (backoff เพิ่มเป็น 2 เท่าทุกครั้งที่เปิดซ้ำ)
+    - half-open: ยอมให้ request เดียวผ่านไปทดสอบ สำเร็จ = closed, ล้มเหลว = open ต่อ
+    """
+
+    def __init__(self, failure_threshold: Optional[int] = None,
+                 base_backoff: Optional[float] = None,
+                 max_backoff: Optional[float] = None):
+        self.failure_threshold = failure_threshold or settings.modbus_breaker_failure_threshold
+        self.base_backoff = base_backoff or settings.modbus_breaker_base_backoff
+        self.max_backoff = max_backoff or settings.modbus_breaker_max_backoff
+        self._breakers: Dict[str, _Breaker] = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key: str) -> bool:
+        """ส่ง request ไปที่ device นี้ได้หรือไม่ (open -> half-open เมื่อถึงเวลาทดสอบ)"""
+        breaker = self._breakers.get(key)
+        if breaker is None or breaker.state == CLOSED:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            if breaker.state == OPEN and now >= breaker.next_probe:
+                self._set_state(breaker, HALF_OPEN)
+            # request ทดสอบที่ไม่ได้รายงานผลภายใน backoff ถือว่าหายไป - ให้ทดสอบใหม่ได้
+            if breaker.state == HALF_OPEN and (not breaker.probing or now >= breaker.next_probe):
+                breaker.probing = True
+                breaker.next_probe = now + max(breaker.backoff, self.base_backoff)
+                return True
+            return breaker.state == CLOSED
+
+    def check(self, key: str):
+        """เหมือน allow() แต่ raise CircuitOpenError ถ้าไม่อนุญาต"""
+        if not self.allow(key):
+            breaker = self._breakers[key]
+            raise CircuitOpenError(key, max(breaker.next_probe - time.monotonic(), 0.0))
+
+    def record_success(self, key: str):
+        breaker = self._breakers.get(key)
+        if breaker is None or (breaker.state == CLOSED and breaker.failures == 0):
+            return
+        with self._lock:
+            breaker.failures = 0
+            breaker.trips = 0
+            breaker.backoff = 0.0
+            breaker.probing = False
+            if breaker.state != CLOSED:
+                logger.info(f"Device {key} recovered")
+                self._set_state(breaker, CLOSED)
+
+    def record_failure(self, key: str, error: Optional[str] = None):
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = self._breakers[key] = _Breaker()
+            breaker.failures += 1
+            breaker.last_error = error
+            breaker.probing = False
+            if breaker.state == HALF_OPEN or (breaker.state == CLOSED and breaker.failures >= self.failure_threshold):
+                breaker.trips += 1
+                breaker.backoff = min(self.base_backoff * 2 ** (breaker.trips - 1), self.max_backoff)
+                breaker.next_probe = time.monotonic() + breaker.backoff
+                logger.warning(f"Device {key} marked down for {breaker.backoff:.1f}s: {error}")
+                self._set_state(breaker, OPEN)
+
+    def reset(self, key: Optional[str] = None):
+        """ล้างสถานะ (เช่น หลังแก้ config ของ device)"""
+        with self._lock:
+            if key is None:
+                self._breakers.clear()
+            else:
+                self._breakers.pop(key, None)
+
+    def get_state(self, key: str) -> str:
+        breaker = self._breakers.get(key)
+        return breaker.state if breaker else CLOSED
+
+    def get_stats(self) -> Dict[str, Dict]:
+        now = time.monotonic()
+        return {
+            key: {
+                "state": breaker.state,
+                "consecutive_failures": breaker.failures,
+                "backoff": breaker.backoff,
+                "next_probe_in": round(max(breaker.next_probe - now, 0.0), 3) if breaker.state != CLOSED else None,
+                "next_probe_at": (time.time() + max(breaker.next_probe - now, 0.0)) if breaker.state != CLOSED else None,
+                "last_error": breaker.last_error,
+                "last_change": breaker.last_change,
+            }
+            for key, breaker in list(self._breakers.items())
+        }
+
+    @staticmethod
+    def _set_state(breaker: _Breaker, state: str):
+        breaker.state = state
+        breaker.last_change = time.time()
+
+# ใช้ instance เดียวทั้ง process (ทั้ง REST, status และ acquisition engine เห็นสถานะเดียวกัน)
+device_breakers = CircuitBreakerRegistry()
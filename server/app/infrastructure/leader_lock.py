@@ -0,0 +1,51 @@
+from typing import Optional
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # Windows - รันได้ process เดียว ถือว่าเป็นผู้ถือ lock เสมอ
+    fcntl = None
+
+class LeaderLock:
+    """เลือกผู้ทำงานเพียง process เดียวจากหลาย uvicorn worker ด้วย file lock (flock)
+
+    lock ถูกปล่อยอัตโนมัติเมื่อ process ที่ถือจบหรือตาย - worker อื่นที่ลอง acquire() ซ้ำจะได้แทน
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def acquire(self) -> bool:
+        """ลองถือ lock แบบไม่รอ - คืน True ถ้าได้ (หรือถืออยู่แล้ว)"""
+        if self._fd is not None:
+            return True
+        if fcntl is None:
+            self._fd = -1
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        logger.info(f"Acquired leader lock {self.path} (pid {os.getpid()})")
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        if self._fd >= 0:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+        self._fd = None
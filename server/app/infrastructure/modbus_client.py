@@ -14,7 +14,7 @@ class ModbusClient:
         if data_type == 'float32':
             # ต้องอ่าน 2 registers สำหรับ float32
             count = 2
-            resp = self.client.read_holding_registers(address=address, count=count, unit=self.unit)
+            resp = self.client.read_holding_registers(address=address, count=count, slave=self.unit)
             if resp.isError():
                 return None
             
@@ -24,7 +24,7 @@ class ModbusClient:
         elif data_type == 'int16':
             # อ่าน 1 register สำหรับ int16
             count = 1
-            resp = self.client.read_holding_registers(address=address, count=count, unit=self.unit)
+            resp = self.client.read_holding_registers(address=address, count=count, slave=self.unit)
             if resp.isError():
                 return None
             
@@ -35,15 +35,16 @@ class ModbusClient:
             print("Unsupported data type")
             return None
 
-# ตัวอย่างการใช้งาน
-client = ModbusClient()
-if client.connect():
-    # อ่านค่า float32 จาก address 0
-    temperature = client.read_value(address=0, data_type='float32')
-    print(f"Temperature (Float32): {temperature}")
+# ตัวอย่างการใช้งาน (รันไฟล์นี้โดยตรงเท่านั้น - ไม่เชื่อมต่อตอน import)
+if __name__ == "__main__":
+    client = ModbusClient()
+    if client.connect():
+        # อ่านค่า float32 จาก address 0
+        temperature = client.read_value(address=0, data_type='float32')
+        print(f"Temperature (Float32): {temperature}")
 
-    # อ่านค่า int16 จาก address 2
-    status_code = client.read_value(address=2, data_type='int16')
-    print(f"Status (Int16): {status_code}")
+        # อ่านค่า int16 จาก address 2
+        status_code = client.read_value(address=2, data_type='int16')
+        print(f"Status (Int16): {status_code}")
 
-    client.close()
\ No newline at end of file
+        client.close()
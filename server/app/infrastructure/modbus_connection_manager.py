@@ -0,0 +1,380 @@
+from pymodbus.client import ModbusTcpClient, AsyncModbusTcpClient
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.infrastructure.modbus_pipeline import PipelinedModbusClient
+import asyncio
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class _GatewayPool:
+    """socket ที่เปิดค้างไว้ของ gateway หนึ่งตัว (host:port)
+
+    open_count นับทุก socket ที่เปิดอยู่หรือกำลังเปิด (sync ที่ว่าง/ถูกยืม + async + pipelined)
+    และไม่เกิน max_connections เสมอ - socket ที่ว่างอยู่ยังนับเป็น 1 connection ของ gateway
+    """
+
+    def __init__(self, host: str, port: int, max_connections: int):
+        self.host = host
+        self.port = port
+        self.max_connections = max_connections
+        self.lock = threading.Lock()
+        self.released = threading.Condition(self.lock)  # แจ้ง lease() ที่รอเมื่อมี socket ว่างหรือ slot คืน
+        self.idle: List[Tuple[ModbusTcpClient, float]] = []  # (client, เวลาที่คืนล่าสุด)
+        self.broken = set()  # id ของ client ที่ต้องปิดแล้วเปิดใหม่
+        self.open_count = 0
+        self.engine_count = 0  # socket ของ async + pipelined client
+        self.last_unit = 1
+        self.units = set()  # unit id ที่ใช้ socket ของ gateway นี้ร่วมกัน
+        # async client ของ acquisition engine (1 socket ต่อ gateway, ถือ slot ไว้ตลอดอายุ)
+        self.async_client: Optional[AsyncModbusTcpClient] = None
+        self.async_lock: Optional[asyncio.Lock] = None
+        # socket แยกสำหรับ device ที่เปิด pipelining (ถือ slot ไว้ตลอดอายุเช่นกัน)
+        self.pipeline_client: Optional[PipelinedModbusClient] = None
+        self.connects = 0
+        self.reconnects = 0
+        self.errors = 0
+
+class ModbusConnectionManager:
+    """จัดการการเชื่อมต่อ Modbus TCP ของทั้ง process
+
+    - ใช้ socket ซ้ำตาม host:port แทนการเปิดใหม่ทุก poll
+    - จำกัดจำนวน socket ที่เปิดอยู่ต่อ gateway (analyzer ส่วนใหญ่รับได้แค่ 2-4 connection)
+      socket ที่ว่างอยู่ก็นับ - lease ที่ไม่มี socket ว่างและเปิดเพิ่มไม่ได้จะรอจนมีตัวคืน
+    - ตรวจ socket ที่ว่างอยู่เป็นระยะ (keepalive) และเปิดใหม่เมื่อเกิด error
+    - acquisition engine (asyncio) ใช้ async client 1 ตัวต่อ gateway นับรวมใน limit เดียวกัน
+      async + pipelined ใช้ได้ไม่เกิน max - 1 socket (เหลือ 1 ให้ status/coil/diagnostic เสมอ)
+      ถ้าเต็มเพราะ socket sync ที่ว่างอยู่ จะปิด socket ว่างนั้นแล้วใช้ slot แทน
+    - analyzer หลายตัวหลัง gateway เดียวกัน (unit id ต่างกัน) ใช้ socket ชุดเดียวกัน
+    """
+
+    def __init__(self, max_connections_per_gateway: Optional[int] = None,
+                 connect_timeout: Optional[float] = None,
+                 lease_timeout: Optional[float] = None,
+                 keepalive_interval: Optional[float] = None):
+        self.max_connections_per_gateway = max_connections_per_gateway or settings.modbus_max_connections_per_gateway
+        self.connect_timeout = connect_timeout or settings.modbus_connect_timeout
+        self.lease_timeout = lease_timeout or settings.modbus_lease_timeout
+        self.keepalive_interval = keepalive_interval or settings.modbus_keepalive_interval
+        self._pools: Dict[str, _GatewayPool] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def gateway_key(host: str, port: int) -> str:
+        return f"{host}:{port}"
+
+    @contextmanager
+    def lease(self, host: str, port: int, unit: int = 1):
+        """ยืม client ที่เชื่อมต่อแล้วของ gateway นี้ - คืนอัตโนมัติเมื่อออกจาก with"""
+        pool = self._get_pool(host, port)
+        pool.last_unit = unit
+        pool.units.add(unit)
+        client = self._checkout(pool)
+
+        try:
+            yield client
+        except Exception:
+            # error ระหว่างใช้งาน - ปิด socket นี้ทิ้ง แล้วเปิดใหม่ใน lease ถัดไป
+            pool.errors += 1
+            self._discard(pool, client)
+            raise
+        else:
+            self._checkin(pool, client)
+
+    def invalidate(self, client: ModbusTcpClient):
+        """บอกว่า client นี้มีปัญหา (เช่น timeout) ให้ปิดทิ้งตอนคืน"""
+        host = client.comm_params.host
+        port = client.comm_params.port
+        pool = self._pools.get(self.gateway_key(host, port))
+        if pool:
+            with pool.lock:
+                pool.broken.add(id(client))
+                pool.errors += 1
+
+    def keepalive(self):
+        """ตรวจ socket ที่ว่างเกิน keepalive_interval ด้วยการอ่าน 1 register
+
+        device ตอบ exception ก็ถือว่ายังเชื่อมต่ออยู่ - ปิดทิ้งเฉพาะตัวที่ไม่ตอบเลย
+        """
+        now = time.monotonic()
+        for pool in list(self._pools.values()):
+            # socket ที่ตรวจอยู่ถือ slot ของตัวเอง (ไม่เปิดเพิ่ม) - ตรวจทีละตัว
+            while True:
+                with pool.lock:
+                    stale = next((e for e in pool.idle if now - e[1] >= self.keepalive_interval), None)
+                    if stale is None:
+                        break
+                    pool.idle.remove(stale)
+                client = stale[0]
+                try:
+                    client.read_holding_registers(0, 1, slave=pool.last_unit)
+                    alive = client.connected
+                except Exception:
+                    alive = False
+                if alive:
+                    self._checkin(pool, client)
+                else:
+                    logger.info(f"Dropping dead Modbus connection to {pool.host}:{pool.port}")
+                    self._discard(pool, client)
+
+    def async_lock(self, host: str, port: int) -> asyncio.Lock:
+        """lock สำหรับใช้ async client ของ gateway ทีละ request"""
+        pool = self._get_pool(host, port)
+        if pool.async_lock is None:
+            pool.async_lock = asyncio.Lock()
+        return pool.async_lock
+
+    async def get_async_client(self, host: str, port: int, timeout: Optional[float] = None,
+                               unit: Optional[int] = None) -> AsyncModbusTcpClient:
+        """คืน async client ที่เชื่อมต่ออยู่ของ gateway - เปิดใหม่ถ้ายังไม่มีหรือหลุดไปแล้ว
+
+        client ตัวเดียวใช้ได้กับทุก unit หลัง gateway (ระบุ unit ต่อ request ด้วย slave=)
+        """
+        pool = self._get_pool(host, port)
+        if unit is not None:
+            pool.units.add(unit)
+        client = pool.async_client
+        if client is not None:
+            if client.connected:
+                return client
+            pool.reconnects += 1
+            self.reset_async_client(host, port)
+
+        self._reserve_engine_slot(pool)
+        client = AsyncModbusTcpClient(
+            host,
+            port=port,
+            timeout=timeout or self.connect_timeout,
+            retries=0,
+        )
+        try:
+            await asyncio.wait_for(client.connect(), timeout=self.connect_timeout)
+        except (asyncio.TimeoutError, OSError):
+            pass
+        except asyncio.CancelledError:
+            # รอบ poll ถูกยกเลิกระหว่างเชื่อมต่อ - คืน slot ก่อนออก
+            client.close()
+            self._release_engine_slot(pool)
+            raise
+        if not client.connected:
+            client.close()
+            self._release_engine_slot(pool)
+            raise ConnectionError(f"Failed to connect to Modbus gateway {self.gateway_key(host, port)}")
+
+        with pool.lock:
+            pool.async_client = client
+            pool.connects += 1
+        logger.info(f"Opened async Modbus connection to {host}:{port}")
+        return client
+
+    def reset_async_client(self, host: str, port: int):
+        """ปิด async client (เช่น หลัง request timeout) เพื่อทิ้ง response ที่ค้างอยู่"""
+        pool = self._pools.get(self.gateway_key(host, port))
+        if not pool or pool.async_client is None:
+            return
+        with pool.lock:
+            client, pool.async_client = pool.async_client, None
+        try:
+            client.close()
+        except Exception as e:
+            logger.error(f"Error closing async Modbus connection to {host}:{port}: {e}")
+        self._release_engine_slot(pool)
+
+    async def get_pipelined_client(self, host: str, port: int, unit: Optional[int] = None,
+                                   reclaim_async: bool = False) -> PipelinedModbusClient:
+        """คืน client แบบ pipelined ของ gateway - เปิดใหม่ถ้ายังไม่มีหรือหลุดไปแล้ว
+
+        reclaim_async: ทุก device ของ gateway ใช้ pipelining - ปิด async client ที่ไม่มีใครใช้อยู่
+        (เหลือจากช่วง fallback) เพื่อคืน slot ก่อนเปิด socket ใหม่
+        """
+        pool = self._get_pool(host, port)
+        if unit is not None:
+            pool.units.add(unit)
+        client = pool.pipeline_client
+        if client is not None:
+            if client.connected:
+                return client
+            pool.reconnects += 1
+            self.reset_pipelined_client(host, port)
+
+        if reclaim_async and pool.async_client is not None and not (pool.async_lock and pool.async_lock.locked()):
+            self.reset_async_client(host, port)
+
+        self._reserve_engine_slot(pool)
+        client = PipelinedModbusClient(host, port, self.connect_timeout)
+        try:
+            connected = await client.connect()
+        except asyncio.CancelledError:
+            client.close()
+            self._release_engine_slot(pool)
+            raise
+        if not connected:
+            client.close()
+            self._release_engine_slot(pool)
+            raise ConnectionError(f"Failed to connect to Modbus gateway {self.gateway_key(host, port)}")
+
+        with pool.lock:
+            pool.pipeline_client = client
+            pool.connects += 1
+        logger.info(f"Opened pipelined Modbus connection to {host}:{port}")
+        return client
+
+    def reset_pipelined_client(self, host: str, port: int):
+        """ปิด client แบบ pipelined (response ที่ค้างอยู่ถูกทิ้ง)"""
+        pool = self._pools.get(self.gateway_key(host, port))
+        if not pool or pool.pipeline_client is None:
+            return
+        with pool.lock:
+            client, pool.pipeline_client = pool.pipeline_client, None
+        client.close()
+        self._release_engine_slot(pool)
+
+    def _reserve_engine_slot(self, pool: _GatewayPool):
+        """จอง slot ให้ async/pipelined client - ปิด socket sync ที่ว่างอยู่ถ้า gateway เต็ม
+
+        async + pipelined รวมกันได้ไม่เกิน max_connections - 1 (อย่างน้อย 1) ให้ lease() ยังมี socket ใช้
+        """
+        limit = max(pool.max_connections - 1, 1)
+        victim = None
+        with pool.lock:
+            if pool.engine_count >= limit:
+                raise ConnectionError(
+                    f"Connection limit reached for Modbus gateway {pool.host}:{pool.port} "
+                    f"({pool.engine_count} engine sockets of {pool.max_connections})"
+                )
+            if pool.open_count >= pool.max_connections:
+                if not pool.idle:
+                    raise ConnectionError(f"Connection limit reached for Modbus gateway {pool.host}:{pool.port}")
+                # socket sync ที่ว่างนานที่สุดส่ง slot ต่อให้ (open_count เท่าเดิม)
+                victim = pool.idle.pop(0)[0]
+                pool.broken.discard(id(victim))
+            else:
+                pool.open_count += 1
+            pool.engine_count += 1
+        if victim is not None:
+            logger.info(f"Closing idle Modbus connection to {pool.host}:{pool.port} for the acquisition engine")
+            try:
+                victim.close()
+            except Exception as e:
+                logger.error(f"Error closing Modbus connection to {pool.host}:{pool.port}: {e}")
+
+    def _release_engine_slot(self, pool: _GatewayPool):
+        with pool.lock:
+            pool.engine_count = max(pool.engine_count - 1, 0)
+            pool.open_count = max(pool.open_count - 1, 0)
+            pool.released.notify()
+
+    def close_gateway(self, host: str, port: int):
+        """ปิด socket ที่ว่างอยู่ทั้งหมดของ gateway (เช่น หลังแก้ config)"""
+        pool = self._pools.get(self.gateway_key(host, port))
+        if not pool:
+            return
+        with pool.lock:
+            idle, pool.idle = pool.idle, []
+        for client, _ in idle:
+            self._discard(pool, client)
+
+    def close_all(self):
+        for pool in list(self._pools.values()):
+            self.close_gateway(pool.host, pool.port)
+            self.reset_async_client(pool.host, pool.port)
+            self.reset_pipelined_client(pool.host, pool.port)
+
+    def get_stats(self) -> List[Dict]:
+        stats = []
+        for key, pool in self._pools.items():
+            stats.append({
+                "gateway": key,
+                "open_connections": pool.open_count,
+                "idle_connections": len(pool.idle),
+                "engine_connections": pool.engine_count,
+                "async_connected": bool(pool.async_client and pool.async_client.connected),
+                "pipeline": pool.pipeline_client.get_stats() if pool.pipeline_client else None,
+                "max_connections": pool.max_connections,
+                "units": sorted(pool.units),
+                "connects": pool.connects,
+                "reconnects": pool.reconnects,
+                "errors": pool.errors,
+            })
+        return stats
+
+    def _get_pool(self, host: str, port: int) -> _GatewayPool:
+        key = self.gateway_key(host, port)
+        pool = self._pools.get(key)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(key)
+                if pool is None:
+                    pool = _GatewayPool(host, port, self.max_connections_per_gateway)
+                    self._pools[key] = pool
+        return pool
+
+    def _checkout(self, pool: _GatewayPool) -> ModbusTcpClient:
+        """socket ที่ว่างอยู่ หรือเปิดใหม่ถ้ายังไม่เต็ม max_connections - เต็มแล้วรอได้ไม่เกิน lease_timeout"""
+        deadline = time.monotonic() + self.lease_timeout
+        with pool.lock:
+            while True:
+                if pool.idle:
+                    client = pool.idle.pop()[0]
+                    break
+                if pool.open_count < pool.max_connections:
+                    pool.open_count += 1  # จอง slot ก่อนเปิด socket (นอก lock)
+                    client = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No free Modbus connection to {pool.host}:{pool.port}")
+                pool.released.wait(remaining)
+
+        if client is not None:
+            if client.connected:
+                return client
+            # socket หลุดระหว่างว่าง - ปิดแล้วเปิดใหม่ด้วย slot เดิม
+            pool.reconnects += 1
+            try:
+                client.close()
+            except Exception as e:
+                logger.error(f"Error closing Modbus connection to {pool.host}:{pool.port}: {e}")
+            with pool.lock:
+                pool.broken.discard(id(client))
+
+        client = ModbusTcpClient(host=pool.host, port=pool.port, timeout=self.connect_timeout)
+        if not client.connect():
+            client.close()
+            self._release_slot(pool)
+            raise ConnectionError(f"Failed to connect to Modbus gateway {pool.host}:{pool.port}")
+        with pool.lock:
+            pool.connects += 1
+        logger.info(f"Opened Modbus connection to {pool.host}:{pool.port}")
+        return client
+
+    def _checkin(self, pool: _GatewayPool, client: ModbusTcpClient):
+        with pool.lock:
+            broken = id(client) in pool.broken
+        if broken or not client.connected:
+            pool.reconnects += 1
+            self._discard(pool, client)
+            return
+        with pool.lock:
+            pool.idle.append((client, time.monotonic()))
+            pool.released.notify()
+
+    def _discard(self, pool: _GatewayPool, client: ModbusTcpClient):
+        try:
+            client.close()
+        except Exception as e:
+            logger.error(f"Error closing Modbus connection to {pool.host}:{pool.port}: {e}")
+        with pool.lock:
+            pool.broken.discard(id(client))
+        self._release_slot(pool)
+
+    def _release_slot(self, pool: _GatewayPool):
+        with pool.lock:
+            pool.open_count = max(pool.open_count - 1, 0)
+            pool.released.notify()
+
+# ใช้ instance เดียวทั้ง process
+modbus_connection_manager = ModbusConnectionManager()
@@ -0,0 +1,79 @@
+from typing import List, Tuple, Optional
+import asyncio
+import struct
+
+# Modbus TCP (MBAP) framing แบบไม่พึ่ง pymodbus - ใช้กับ simulator และ client ที่ต้องคุม transaction id เอง
+# MBAP header: transaction id, protocol id (0), length (unit id + PDU), unit id
+MBAP_HEADER = struct.Struct(">HHHB")
+READ_REQUEST = struct.Struct(">BHH")  # function, address, count
+EXCEPTION_PDU = struct.Struct(">BB")
+
+READ_COILS = 0x01
+READ_DISCRETE_INPUTS = 0x02
+READ_HOLDING_REGISTERS = 0x03
+READ_INPUT_REGISTERS = 0x04
+BIT_FUNCTIONS = (READ_COILS, READ_DISCRETE_INPUTS)
+REGISTER_FUNCTIONS = (READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS)
+
+ILLEGAL_FUNCTION = 0x01
+ILLEGAL_DATA_ADDRESS = 0x02
+ILLEGAL_DATA_VALUE = 0x03
+SERVER_DEVICE_FAILURE = 0x04
+SERVER_DEVICE_BUSY = 0x06
+GATEWAY_TARGET_FAILED = 0x0B
+
+MAX_PDU = 253
+
+class ModbusFrameError(Exception):
+    """frame ที่อ่านได้ไม่ถูกต้องตามรูปแบบ MBAP"""
+
+def encode_frame(transaction_id: int, unit: int, pdu: bytes) -> bytes:
+    return MBAP_HEADER.pack(transaction_id & 0xFFFF, 0, len(pdu) + 1, unit) + pdu
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[int, int, bytes]:
+    """อ่าน 1 frame จาก stream - คืน (transaction id, unit, pdu)"""
+    header = await reader.readexactly(MBAP_HEADER.size)
+    transaction_id, protocol, length, unit = MBAP_HEADER.unpack(header)
+    if protocol != 0 or length < 2 or length > MAX_PDU + 1:
+        raise ModbusFrameError(f"Invalid MBAP header: protocol={protocol} length={length}")
+    pdu = await reader.readexactly(length - 1)
+    return transaction_id, unit, pdu
+
+def encode_read_request(transaction_id: int, unit: int, function: int, address: int, count: int) -> bytes:
+    return encode_frame(transaction_id, unit, READ_REQUEST.pack(function, address, count))
+
+def decode_read_request(pdu: bytes) -> Tuple[int, int, int]:
+    """คืน (function, address, count)"""
+    if len(pdu) < READ_REQUEST.size:
+        raise ModbusFrameError(f"Short read request PDU ({len(pdu)} bytes)")
+    return READ_REQUEST.unpack_from(pdu)
+
+def encode_register_response(function: int, registers: List[int]) -> bytes:
+    return struct.pack(f">BB{len(registers)}H", function, len(registers) * 2, *registers)
+
+def encode_bit_response(function: int, bits: List[int]) -> bytes:
+    packed = bytearray((len(bits) + 7) // 8)
+    for i, bit in enumerate(bits):
+        if bit:
+            packed[i // 8] |= 1 << (i % 8)
+    return bytes((function, len(packed))) + bytes(packed)
+
+def encode_exception(function: int, code: int) -> bytes:
+    return EXCEPTION_PDU.pack(function | 0x80, code)
+
+def decode_read_response(pdu: bytes, count: int) -> Tuple[int, Optional[List[int]], Optional[int]]:
+    """แปลง PDU ของ response การอ่าน - คืน (function, values, exception code)
+
+    values เป็น registers (FC 3/4) หรือ bits 0/1 (FC 1/2) จำนวน count ตัว
+    """
+    function = pdu[0]
+    if function & 0x80:
+        return function & 0x7F, None, pdu[1] if len(pdu) > 1 else None
+    byte_count = pdu[1]
+    payload = pdu[2:2 + byte_count]
+    if function in REGISTER_FUNCTIONS:
+        return function, list(struct.unpack(f">{byte_count // 2}H", payload))[:count], None
+    if function in BIT_FUNCTIONS:
+        bits = [(payload[i // 8] >> (i % 8)) & 1 for i in range(min(count, byte_count * 8))]
+        return function, bits, None
+    raise ModbusFrameError(f"Unsupported function code {function}")
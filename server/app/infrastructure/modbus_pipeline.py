@@ -0,0 +1,136 @@
+from typing import Dict, List, Optional, Tuple
+from app.infrastructure.modbus_frame import (
+    read_frame, encode_read_request, decode_read_response, ModbusFrameError, READ_HOLDING_REGISTERS,
+)
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class PipelineError(Exception):
+    """device ตอบไม่ตรงกับ request ที่ส่ง (เช่น unit/function ผิด) - ถือว่าไม่รองรับ pipelining"""
+
+class ModbusExceptionResult(Exception):
+    """device ตอบ exception response"""
+
+    def __init__(self, function: int, exception_code: Optional[int]):
+        super().__init__(f"Modbus exception {exception_code} (function {function})")
+        self.function = function
+        self.exception_code = exception_code
+
+class PipelinedModbusClient:
+    """Modbus TCP client ที่ส่ง request ค้างได้หลายตัวบน socket เดียว
+
+    แต่ละ request ได้ transaction id ของตัวเอง ตัวรับ (task เดียว) จับคู่ response กับ request ด้วย id
+    จึงไม่ต้องรอ response ก่อนส่ง request ถัดไป - N request ใช้เวลาประมาณ 1 RTT แทน N RTT
+    จำนวนที่ค้างได้พร้อมกันกำหนดโดยผู้เรียก (window ของแต่ละ device)
+    """
+
+    def __init__(self, host: str, port: int, connect_timeout: float = 3.0):
+        self.host = host
+        self.port = port
+        self.connect_timeout = connect_timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._receiver: Optional[asyncio.Task] = None
+        self._pending: Dict[int, Tuple[asyncio.Future, int, int, int]] = {}  # tid -> (future, unit, function, count)
+        self._next_tid = 0
+        self.sent = 0
+        self.received = 0
+        self.unmatched = 0  # response ที่ไม่มี request รออยู่ (เช่น มาหลัง timeout)
+        self.max_in_flight = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing() \
+            and self._receiver is not None and not self._receiver.done()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    async def connect(self) -> bool:
+        try:
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), timeout=self.connect_timeout
+            )
+        except (asyncio.TimeoutError, OSError):
+            return False
+        self._receiver = asyncio.create_task(self._receive(), name=f"modbus-pipeline:{self.host}:{self.port}")
+        return True
+
+    async def read_registers(self, unit: int, address: int, count: int,
+                             function: int = READ_HOLDING_REGISTERS) -> List[int]:
+        """ส่ง request แล้วรอ response ของ transaction นี้ - ผู้เรียกคุม timeout ด้วย wait_for"""
+        if not self.connected:
+            raise ConnectionError(f"Pipelined connection to {self.host}:{self.port} is closed")
+        tid = self._next_tid = (self._next_tid + 1) & 0xFFFF
+        future = asyncio.get_running_loop().create_future()
+        self._pending[tid] = (future, unit, function, count)
+        self.max_in_flight = max(self.max_in_flight, len(self._pending))
+        try:
+            self._writer.write(encode_read_request(tid, unit, function, address, count))
+            self.sent += 1
+            return await future
+        finally:
+            self._pending.pop(tid, None)
+
+    async def _receive(self):
+        try:
+            while True:
+                tid, unit, pdu = await read_frame(self._reader)
+                self.received += 1
+                entry = self._pending.pop(tid, None)
+                if entry is None:
+                    self.unmatched += 1
+                    continue
+                future, expected_unit, function, count = entry
+                if future.done():
+                    continue
+                if unit != expected_unit or pdu[0] & 0x7F != function:
+                    future.set_exception(PipelineError(
+                        f"Transaction {tid}: expected unit {expected_unit} function {function}, "
+                        f"got unit {unit} function {pdu[0] & 0x7F}"
+                    ))
+                    continue
+                try:
+                    response_function, values, exception_code = decode_read_response(pdu, count)
+                except (ModbusFrameError, IndexError) as e:
+                    future.set_exception(PipelineError(f"Transaction {tid}: {e}"))
+                    continue
+                if values is None:
+                    future.set_exception(ModbusExceptionResult(response_function, exception_code))
+                elif len(values) < count:
+                    future.set_exception(PipelineError(f"Transaction {tid}: {len(values)} of {count} registers"))
+                else:
+                    future.set_result(values)
+        except (asyncio.IncompleteReadError, ConnectionError, ModbusFrameError, OSError) as e:
+            self._fail_pending(ConnectionError(f"Pipelined connection to {self.host}:{self.port} lost: {e}"))
+        except asyncio.CancelledError:
+            self._fail_pending(ConnectionError(f"Pipelined connection to {self.host}:{self.port} closed"))
+            raise
+
+    def _fail_pending(self, error: Exception):
+        pending, self._pending = self._pending, {}
+        for future, *_ in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    def close(self):
+        if self._receiver is not None:
+            self._receiver.cancel()
+            self._receiver = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._fail_pending(ConnectionError(f"Pipelined connection to {self.host}:{self.port} closed"))
+
+    def get_stats(self) -> Dict:
+        return {
+            "connected": self.connected,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "sent": self.sent,
+            "received": self.received,
+            "unmatched": self.unmatched,
+        }
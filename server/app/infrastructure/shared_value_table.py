@@ -0,0 +1,290 @@
+from typing import List, Dict, Optional, Tuple
+from types import MappingProxyType
+from datetime import datetime, timezone, timedelta
+from multiprocessing import shared_memory
+from app.services.snapshot_hub import AcquisitionSnapshot
+import json
+import math
+import struct
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    from multiprocessing import resource_tracker
+except ImportError:  # pragma: no cover - Windows
+    resource_tracker = None
+
+thailand_tz = timezone(timedelta(hours=7))
+
+MAGIC = b"CEMSLV01"
+# magic, seq (seqlock), snapshot seq, change_seq, slot, timestamp, status timestamp,
+# schema version, จำนวน parameter, capacity, ความยาว names/status/alarms (bytes)
+HEADER = struct.Struct("<8sQQQqddIIIIII")
+NAMES_SIZE = 32 * 1024
+STATUS_SIZE = 256
+ALARMS_SIZE = 32 * 1024
+READ_RETRIES = 100
+
+class SharedTableError(Exception):
+    """เปิด/สร้าง shared memory ไม่ได้ หรือ layout ไม่ตรงกัน"""
+
+class SharedValueTable:
+    """ตารางค่าล่าสุดใน multiprocessing.shared_memory สำหรับใช้ร่วมกันหลาย uvicorn worker
+
+    ผู้เขียนมีรายเดียว (worker ที่ได้ acquisition lock) ส่วน worker อื่นอ่านอย่างเดียว
+    layout คงที่: header | values float64[capacity] | changed bitmap | names | status | alarms
+    ลำดับของ values ตาม schema (ชื่อ parameter) ที่เก็บไว้ในส่วน names - schema_version เพิ่มเมื่อชุดชื่อเปลี่ยน
+
+    ใช้ seqlock: ผู้เขียนเพิ่ม seq เป็นเลขคี่ก่อนเขียน และเป็นเลขคู่เมื่อเขียนเสร็จ
+    ผู้อ่านอ่าน seq ก่อนและหลัง ถ้าเป็นเลขคี่หรือไม่ตรงกันให้อ่านใหม่ (ไม่มี lock ข้าม process)
+    """
+
+    def __init__(self, name: str, capacity: int = 512):
+        self.name = name
+        self.capacity = capacity
+        self.values_offset = HEADER.size
+        self.changed_offset = self.values_offset + capacity * 8
+        self.names_offset = self.changed_offset + (capacity + 7) // 8
+        self.status_offset = self.names_offset + NAMES_SIZE
+        self.alarms_offset = self.status_offset + STATUS_SIZE
+        self.size = self.alarms_offset + ALARMS_SIZE
+        self.values_struct = struct.Struct(f"<{capacity}d")
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        # ฝั่งผู้เขียน
+        self._schema: Dict[str, int] = {}
+        self._schema_version = 0
+        self._names_len = 0
+        self._dropped = set()  # ชื่อที่เกิน capacity
+        self._status_ts = math.nan
+        # ฝั่งผู้อ่าน - decode names/alarms ใหม่เฉพาะเมื่อเปลี่ยน
+        self._names: Tuple[str, ...] = ()
+        self._names_version = -1
+        self._alarms = None
+        self._alarms_ts = None
+        self._last: Optional[AcquisitionSnapshot] = None
+        self._last_seqlock = -1
+        self.reads = 0
+        self.retries = 0
+
+    # ---- เปิด/ปิด ----
+    def create_or_attach(self) -> "SharedValueTable":
+        """สำหรับผู้เขียน: ใช้ segment เดิมถ้ามี (เช่น ผู้เขียนคนก่อนตาย) ไม่เช่นนั้นสร้างใหม่"""
+        try:
+            self._open(create=False)
+            header = self._read_header()
+            if header[0] != MAGIC or header[9] != self.capacity:
+                raise SharedTableError("layout mismatch")
+        except (FileNotFoundError, SharedTableError):
+            if self._shm is not None:
+                self.unlink()
+                self.close()
+            self._open(create=True)
+            HEADER.pack_into(self._shm.buf, 0, MAGIC, 0, 0, 0, -1, math.nan, math.nan, 0, 0, self.capacity, 0, 0, 0)
+
+        # ผู้เขียนคนก่อนอาจตายระหว่างเขียน (seq ค้างเป็นเลขคี่)
+        seq = self._read_header()[1]
+        if seq % 2:
+            self._set_seq(seq + 1)
+        header = self._read_header()
+        self._schema_version = header[7]
+        self._schema = {name: i for i, name in enumerate(self._decode_names(header))}
+        return self
+
+    def attach(self) -> bool:
+        """สำหรับผู้อ่าน: คืน False ถ้ายังไม่มีผู้เขียนสร้าง segment"""
+        if self._shm is not None:
+            return True
+        try:
+            self._open(create=False)
+        except FileNotFoundError:
+            return False
+        if self._read_header()[0] != MAGIC:
+            self.close()
+            return False
+        return True
+
+    def _open(self, create: bool):
+        self._shm = shared_memory.SharedMemory(name=self.name, create=create, size=self.size if create else 0)
+        if self._shm.size < self.size:
+            raise SharedTableError(f"shared memory {self.name} is {self._shm.size} bytes, need {self.size}")
+        # segment อยู่ตลอดอายุของ service - ไม่ให้ resource tracker ลบเมื่อ worker ใดตัวหนึ่งจบ
+        if resource_tracker is not None:
+            try:
+                resource_tracker.unregister(self._shm._name, "shared_memory")
+            except Exception:
+                pass
+
+    def close(self):
+        if self._shm is not None:
+            self._shm.close()
+            self._shm = None
+
+    def unlink(self):
+        if self._shm is not None:
+            # unlink() จะ unregister เอง - register คืนก่อนเพื่อไม่ให้ resource tracker แจ้ง KeyError
+            if resource_tracker is not None:
+                resource_tracker.register(self._shm._name, "shared_memory")
+            self._shm.unlink()
+
+    # ---- เขียน ----
+    def write(self, snapshot: AcquisitionSnapshot):
+        buf = self._shm.buf
+        header = self._read_header()
+        seq = header[1] + 1  # เลขคี่ = กำลังเขียน
+        self._set_seq(seq)
+        try:
+            if any(name not in self._schema and name not in self._dropped for name in snapshot.values):
+                self._update_schema(snapshot.values)
+
+            values = [math.nan] * self.capacity
+            for name, value in snapshot.values.items():
+                index = self._schema.get(name)
+                if index is not None:
+                    values[index] = value
+            self.values_struct.pack_into(buf, self.values_offset, *values)
+
+            changed = bytearray((self.capacity + 7) // 8)
+            for name in snapshot.changes:
+                index = self._schema.get(name)
+                if index is not None:
+                    changed[index // 8] |= 1 << (index % 8)
+            buf[self.changed_offset:self.changed_offset + len(changed)] = changed
+
+            status = snapshot.status.encode("utf-8")[:STATUS_SIZE]
+            buf[self.status_offset:self.status_offset + len(status)] = status
+
+            alarms_len = header[12]
+            status_ts = snapshot.status_timestamp.timestamp() if snapshot.status_timestamp else math.nan
+            if snapshot.status_alarms is not None and status_ts != self._status_ts:
+                alarms = json.dumps([dict(item) for item in snapshot.status_alarms], default=str).encode("utf-8")
+                if len(alarms) > ALARMS_SIZE:
+                    logger.warning(f"Status/alarm data ({len(alarms)} bytes) exceeds shared table - sharing an empty list")
+                    alarms = b"[]"
+                buf[self.alarms_offset:self.alarms_offset + len(alarms)] = alarms
+                alarms_len = len(alarms)
+                self._status_ts = status_ts
+
+            HEADER.pack_into(
+                buf, 0, MAGIC, seq, snapshot.seq, snapshot.change_seq,
+                -1 if snapshot.slot is None else snapshot.slot,
+                snapshot.timestamp.timestamp() if snapshot.timestamp else math.nan,
+                status_ts,
+                self._schema_version, len(self._schema), self.capacity,
+                self._names_len, len(status), alarms_len,
+            )
+        finally:
+            self._set_seq(seq + 1)
+
+    def _update_schema(self, values):
+        # ชื่อเดิมคงตำแหน่งเดิม ชื่อใหม่ต่อท้าย (ผู้อ่านเดิมยังอ่าน index เดิมได้)
+        added = False
+        for name in values:
+            if name in self._schema:
+                continue
+            if len(self._schema) >= self.capacity:
+                if name not in self._dropped:
+                    logger.warning(f"Shared table full ({self.capacity}) - {name} not shared")
+                    self._dropped.add(name)
+                continue
+            self._schema[name] = len(self._schema)
+            added = True
+        if not added:
+            return
+        names = json.dumps(list(self._schema)).encode("utf-8")
+        if len(names) > NAMES_SIZE:
+            raise SharedTableError(f"parameter names ({len(names)} bytes) exceed {NAMES_SIZE}")
+        self._shm.buf[self.names_offset:self.names_offset + len(names)] = names
+        self._names_len = len(names)
+        self._schema_version += 1
+
+    def _set_seq(self, seq: int):
+        struct.pack_into("<Q", self._shm.buf, 8, seq)
+
+    def _read_header(self) -> tuple:
+        return HEADER.unpack_from(self._shm.buf, 0)
+
+    # ---- อ่าน ----
+    def read(self) -> Optional[AcquisitionSnapshot]:
+        """snapshot ล่าสุด - คืนตัวเดิม (ไม่ decode ใหม่) ถ้ายังไม่มีการเขียนเพิ่ม"""
+        if self._shm is None and not self.attach():
+            return None
+        buf = self._shm.buf
+        for _ in range(READ_RETRIES):
+            seq = struct.unpack_from("<Q", buf, 8)[0]
+            if seq % 2:
+                self.retries += 1
+                time.sleep(0)
+                continue
+            if self._last is not None and seq == self._last_seqlock:
+                return self._last
+
+            header = self._read_header()
+            values = self.values_struct.unpack_from(buf, self.values_offset)
+            changed = bytes(buf[self.changed_offset:self.names_offset])
+            names_raw = bytes(buf[self.names_offset:self.names_offset + header[10]]) \
+                if header[7] != self._names_version else None
+            status = bytes(buf[self.status_offset:self.status_offset + header[11]])
+            alarms_raw = bytes(buf[self.alarms_offset:self.alarms_offset + header[12]]) \
+                if header[6] != self._alarms_ts and header[12] else None
+
+            if struct.unpack_from("<Q", buf, 8)[0] != seq:
+                # ผู้เขียนเขียนทับระหว่างอ่าน - อ่านใหม่
+                self.retries += 1
+                continue
+            self.reads += 1
+            return self._decode(seq, header, values, changed, names_raw, status, alarms_raw)
+        return self._last
+
+    def _decode(self, seq, header, values, changed, names_raw, status, alarms_raw) -> AcquisitionSnapshot:
+        if names_raw is not None:
+            self._names = tuple(json.loads(names_raw)) if names_raw else ()
+            self._names_version = header[7]
+        if alarms_raw is not None:
+            self._alarms = tuple(MappingProxyType(item) for item in json.loads(alarms_raw))
+            self._alarms_ts = header[6]
+
+        names = self._names
+        value_map = {}
+        changes = {}
+        for i, name in enumerate(names):
+            value = values[i]
+            if math.isnan(value):
+                continue
+            value_map[name] = value
+            if changed[i // 8] & (1 << (i % 8)):
+                changes[name] = value
+
+        _, _, snapshot_seq, change_seq, slot, ts, status_ts = header[:7]
+        snapshot = AcquisitionSnapshot(
+            seq=snapshot_seq,
+            change_seq=change_seq,
+            slot=None if slot < 0 else slot,
+            timestamp=None if math.isnan(ts) else datetime.fromtimestamp(ts, thailand_tz),
+            values=MappingProxyType(value_map),
+            changes=MappingProxyType(changes),
+            status=status.decode("utf-8", "replace"),
+            status_alarms=self._alarms,
+            status_timestamp=None if math.isnan(status_ts) else datetime.fromtimestamp(status_ts, thailand_tz),
+        )
+        self._last = snapshot
+        self._last_seqlock = seq
+        return snapshot
+
+    def _decode_names(self, header) -> List[str]:
+        if not header[10]:
+            return []
+        self._names_len = header[10]
+        return json.loads(bytes(self._shm.buf[self.names_offset:self.names_offset + header[10]]))
+
+    def get_stats(self) -> Dict:
+        return {
+            "name": self.name,
+            "size": self.size,
+            "capacity": self.capacity,
+            "parameters": len(self._schema) or len(self._names),
+            "schema_version": self._schema_version or self._names_version,
+            "reads": self.reads,
+            "retries": self.retries,
+        }
@@ -0,0 +1,339 @@
+from typing import List, Dict, Tuple, Optional
+from app.core.config import settings
+from app.services.config_service import StaticConfigService
+from app.services.config_snapshot_service import ConfigSnapshot
+from app.services.modbus_data_service import ModbusDataService
+from app.services.modbus_acquisition_service import ModbusAcquisitionService, merge_device_values
+from app.services.poll_scheduler import PollScheduler
+from app.services.deadband_filter import DeadbandFilter
+import multiprocessing
+import asyncio
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# worker ส่ง RTT stats กลับทุกกี่รอบ (ไม่ต้องส่งทุกรอบ)
+STATS_EVERY = 10
+
+def shard_gateways(config: ConfigSnapshot, workers: int) -> List[List[str]]:
+    """แบ่ง device เป็น shard ตาม gateway (host:port) - unit หลัง gateway เดียวกันอยู่ shard เดียวกันเสมอ
+
+    gateway ที่มี block มากที่สุดไปอยู่ shard ที่ภาระน้อยที่สุดก่อน (greedy)
+    """
+    gateways: Dict[Tuple[str, int], List[str]] = {}
+    for device in config.devices:
+        gateways.setdefault((device.host, device.port), []).append(device.name)
+
+    def load(names: List[str]) -> int:
+        return sum(max(1, len(config.read_plans[name].blocks)) for name in names)
+
+    shards: List[List[str]] = [[] for _ in range(workers)]
+    loads = [0] * workers
+    for _, names in sorted(gateways.items(), key=lambda item: (-load(item[1]), item[0])):
+        i = loads.index(min(loads))
+        shards[i].extend(names)
+        loads[i] += load(names)
+    return shards
+
+def _worker_main(shard_id: int, conn, request_timeout: float, poll_timeout: float):
+    """entry point ของ worker process"""
+    try:
+        asyncio.run(_worker_loop(shard_id, conn, request_timeout, poll_timeout))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        conn.close()
+
+async def _worker_loop(shard_id: int, conn, request_timeout: float, poll_timeout: float):
+    config = StaticConfigService()
+    acquisition = ModbusAcquisitionService(
+        ModbusDataService(config), request_timeout=request_timeout, poll_timeout=poll_timeout
+    )
+    # block ที่อ่านได้ส่งกลับพร้อมผล - ให้ register cache ของ API process ใช้ตอบ read แบบ max_age ได้
+    acquisition.register_cache.record_updates()
+    loop = asyncio.get_running_loop()
+    inbox: asyncio.Queue = asyncio.Queue()
+
+    def on_readable():
+        try:
+            while conn.poll():
+                inbox.put_nowait(conn.recv())
+        except (EOFError, OSError):
+            # API process ปิด pipe - จบ worker
+            loop.remove_reader(conn.fileno())
+            inbox.put_nowait(("stop",))
+
+    loop.add_reader(conn.fileno(), on_readable)
+    cycles = 0
+    try:
+        while True:
+            messages = [await inbox.get()]
+            while not inbox.empty():
+                messages.append(inbox.get_nowait())
+
+            poll = None
+            for message in messages:
+                kind = message[0]
+                if kind == "stop":
+                    return
+                if kind == "config":
+                    _, base_interval, devices, mappings = message
+                    acquisition.scheduler.fixed_interval = base_interval
+                    config.replace(devices, mappings)
+                elif kind == "poll":
+                    # poll ที่ค้างหลายรอบ (worker ช้ากว่า tick) ทำเฉพาะรอบล่าสุด
+                    poll = message
+            if poll is None:
+                continue
+
+            _, cycle, tick = poll
+            acquisition.refresh_config()
+            acquisition.scheduler.tick = tick
+            await acquisition.poll_once()
+            cycles += 1
+            conn.send((
+                "result",
+                cycle,
+                acquisition.device_values,
+                acquisition.device_status,
+                acquisition.last_cycle,
+                acquisition.rtt.get_stats() if cycles % STATS_EVERY == 1 else None,
+                acquisition.register_cache.take_updates(),
+            ))
+    finally:
+        loop.remove_reader(conn.fileno())
+        acquisition.connection_manager.close_all()
+        logger.info(f"Acquisition shard {shard_id} stopped")
+
+class _Shard:
+    def __init__(self, shard_id: int):
+        self.id = shard_id
+        self.devices: List[str] = []
+        self.process: Optional[multiprocessing.Process] = None
+        self.conn = None
+        self.waiting: Optional[Tuple[int, asyncio.Future]] = None  # (cycle, future) ที่รอผลอยู่
+        self.starts = 0
+        self.late = 0
+        self.last_cycle: Dict = {}
+        self.timeouts: Dict = {}
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.conn is not None and self.process.is_alive()
+
+class ShardedAcquisitionService:
+    """แบ่ง device ตาม gateway ไปให้ worker process N ตัวอ่านพร้อมกัน (ใช้ได้หลาย core)
+
+    - worker แต่ละตัวรัน ModbusAcquisitionService ของ shard ตัวเอง (socket, RTT, circuit breaker แยกกัน)
+    - API process ส่งคำสั่ง poll (cycle, tick) ทุกรอบ แล้ว worker ส่งค่าที่ decode แล้วกลับทาง Pipe (Unix socket)
+      พร้อม register ของ block ที่อ่านได้ (ใส่ลง register cache ของ API process)
+    - deadband และการ publish snapshot ทำที่ API process เหมือนโหมด process เดียว
+    - worker ที่ตายจะถูกเปิดใหม่ในรอบถัดไป ส่วน shard ที่ตอบไม่ทันรอบถือว่า timeout
+    """
+
+    IPC_MARGIN = 0.05  # เผื่อเวลาส่งผลกลับผ่าน pipe (วินาที)
+
+    def __init__(self, modbus_data_service: ModbusDataService,
+                 workers: Optional[int] = None,
+                 request_timeout: Optional[float] = None,
+                 poll_timeout: Optional[float] = None):
+        self.modbus_data_service = modbus_data_service
+        self.workers = workers or settings.acquisition_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.request_timeout = request_timeout or settings.modbus_request_timeout
+        self.poll_timeout = poll_timeout or settings.modbus_poll_timeout
+        # ใช้คำนวณ tick และแสดงตาราง poll เท่านั้น - plan ถูก compile ใน worker
+        self.scheduler = PollScheduler(modbus_data_service.read_plan_service)
+        self.deadband = DeadbandFilter()
+        self.config: Optional[ConfigSnapshot] = None
+        self.shards = [_Shard(i) for i in range(self.workers)]
+        self.shard_values: Dict[int, Dict[str, Dict[str, float]]] = {}  # shard -> device -> ค่าล่าสุด
+        self.changes: Dict[str, float] = {}
+        self.change_seq = 0
+        self.device_status: Dict[str, Dict] = {}
+        self.last_cycle: Dict = {}
+        self.tick = 0
+        self.cycle = 0
+        self._context = multiprocessing.get_context("spawn")
+
+    @property
+    def poll_interval(self) -> float:
+        return self.scheduler.base_interval
+
+    async def poll_once(self) -> Optional[Dict]:
+        config = self.modbus_data_service.config_snapshot()
+        if config is not self.config:
+            self._apply_config(config)
+        self._ensure_workers()
+
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        self.cycle += 1
+        waiting: Dict[int, asyncio.Future] = {}
+        for shard in self.shards:
+            if not shard.devices or not shard.alive:
+                continue
+            future = loop.create_future()
+            shard.waiting = (self.cycle, future)
+            try:
+                shard.conn.send(("poll", self.cycle, self.tick))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Acquisition shard {shard.id} unreachable: {e}")
+                self._drop_worker(shard)
+                continue
+            waiting[shard.id] = future
+        self.scheduler.tick = self.tick = self.tick + 1
+
+        if waiting:
+            await asyncio.wait(waiting.values(), timeout=self._cycle_timeout())
+
+        for shard in self.shards:
+            future = waiting.get(shard.id)
+            shard.waiting = None
+            if future is not None and future.done() and not future.cancelled():
+                values, status, last_cycle, timeouts, blocks = future.result()
+                self.modbus_data_service.register_cache.store_updates(blocks)
+                self.shard_values[shard.id] = values
+                self.device_status.update(status)
+                shard.last_cycle = last_cycle
+                if timeouts is not None:
+                    shard.timeouts = timeouts
+                continue
+            if future is not None:
+                future.cancel()
+            if shard.devices:
+                # shard ไม่ตอบทันรอบ (หรือ worker ตาย) - ไม่ใช้ค่าเก่าของ shard นี้ต่อ
+                shard.late += 1
+                self.shard_values.pop(shard.id, None)
+                for name in shard.devices:
+                    self._set_status(name, "timeout", f"shard {shard.id} did not answer")
+
+        data = merge_device_values({
+            name: values for shard_values in self.shard_values.values() for name, values in shard_values.items()
+        })
+        self.changes = self.deadband.filter(data)
+        if self.changes:
+            self.change_seq += 1
+        self.last_cycle = {
+            "duration_ms": round((time.monotonic() - started) * 1000, 1),
+            "shards": len(waiting),
+            "shards_ok": sum(1 for shard in self.shards if shard.id in waiting and shard.id in self.shard_values),
+            "devices": sum(len(shard.devices) for shard in self.shards),
+            "devices_ok": sum(shard.last_cycle.get("devices_ok", 0) for shard in self.shards if shard.id in self.shard_values),
+            "changed": len(self.changes),
+            "blocks": sum(shard.last_cycle.get("blocks", 0) for shard in self.shards if shard.id in self.shard_values),
+        }
+        return data if data else None
+
+    def _apply_config(self, config: ConfigSnapshot):
+        self.config = config
+        self.scheduler.update(config.devices, config.mappings)
+        self.deadband.update(config.mappings)
+        self.tick = 0
+        self.shard_values = {}
+        for shard, names in zip(self.shards, shard_gateways(config, self.workers)):
+            shard.devices = names
+            if shard.alive:
+                self._send_config(shard)
+        logger.info(f"Acquisition sharded: {[len(s.devices) for s in self.shards]} devices per worker")
+
+    def _send_config(self, shard: _Shard):
+        names = set(shard.devices)
+        devices = [d for d in self.config.devices if d.name in names]
+        mappings = [m for name in shard.devices for m in self.config.device_mappings.get(name, ())]
+        shard.conn.send(("config", self.scheduler.base_interval, devices, mappings))
+
+    def _ensure_workers(self):
+        """เปิด worker ที่ยังไม่มีหรือตายไปแล้ว พร้อมส่ง config ของ shard"""
+        for shard in self.shards:
+            if shard.alive or not shard.devices:
+                continue
+            if shard.process is not None:
+                logger.warning(f"Acquisition shard {shard.id} exited (code {shard.process.exitcode}) - restarting")
+                self._drop_worker(shard)
+            parent_conn, child_conn = self._context.Pipe()
+            process = self._context.Process(
+                target=_worker_main,
+                args=(shard.id, child_conn, self.request_timeout, self.poll_timeout),
+                name=f"modbus-shard-{shard.id}",
+                daemon=True,
+            )
+            process.start()
+            child_conn.close()
+            shard.process = process
+            shard.conn = parent_conn
+            shard.starts += 1
+            asyncio.get_running_loop().add_reader(parent_conn.fileno(), self._on_readable, shard)
+            self._send_config(shard)
+
+    def _on_readable(self, shard: _Shard):
+        try:
+            while shard.conn is not None and shard.conn.poll():
+                message = shard.conn.recv()
+                if message[0] != "result":
+                    continue
+                cycle, payload = message[1], message[2:]
+                if shard.waiting and shard.waiting[0] == cycle and not shard.waiting[1].done():
+                    shard.waiting[1].set_result(payload)
+                # ผลของรอบที่หมดเวลาไปแล้วทิ้งได้เลย
+        except (EOFError, OSError):
+            self._drop_worker(shard)
+
+    def _drop_worker(self, shard: _Shard):
+        if shard.conn is not None:
+            try:
+                asyncio.get_running_loop().remove_reader(shard.conn.fileno())
+            except (RuntimeError, ValueError, OSError):
+                pass
+            shard.conn.close()
+            shard.conn = None
+        if shard.waiting and not shard.waiting[1].done():
+            shard.waiting[1].cancel()
+        if shard.process is not None and shard.process.is_alive():
+            shard.process.terminate()
+        shard.process = None
+
+    def _cycle_timeout(self) -> float:
+        return max(self.poll_interval, self.poll_timeout) + self.IPC_MARGIN
+
+    def _set_status(self, device_name: str, status: str, error: Optional[str] = None):
+        self.device_status[device_name] = {
+            "status": status,
+            "error": error,
+            "updated_at": time.time(),
+        }
+
+    def close(self, timeout: float = 2.0):
+        """หยุด worker ทั้งหมด"""
+        for shard in self.shards:
+            if shard.conn is not None:
+                try:
+                    shard.conn.send(("stop",))
+                except (OSError, ValueError):
+                    pass
+        for shard in self.shards:
+            if shard.process is not None:
+                shard.process.join(timeout)
+            self._drop_worker(shard)
+
+    def get_stats(self) -> Dict:
+        return {
+            "poll_interval": self.poll_interval,
+            "last_cycle": self.last_cycle,
+            "devices": self.device_status,
+            "timeouts": {name: stats for shard in self.shards for name, stats in shard.timeouts.items()},
+            "deadband": self.deadband.get_stats(),
+            "shards": [
+                {
+                    "id": shard.id,
+                    "pid": shard.process.pid if shard.process is not None else None,
+                    "alive": shard.alive,
+                    "devices": len(shard.devices),
+                    "starts": shard.starts,
+                    "late": shard.late,
+                    "last_cycle": shard.last_cycle,
+                }
+                for shard in self.shards
+            ],
+        }
@@ -1,5 +1,11 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+from app.core.config import settings
 from app.domain.config_model import *
+import os
+import time
+
+DEVICES_FILE = "config/devices.json"
+MAPPINGS_FILE = "config/mappings.json"
 
 class ConfigService:
     def __init__(self):
@@ -9,6 +15,11 @@ class ConfigService:
         self.system_params = SystemConfig()
         self.stacks = []
         self.thresholds = []
+        # เพิ่มทุกครั้งที่ devices/mappings เปลี่ยน - ผู้ใช้ config เทียบ version แทนการอ่าน list ใหม่ทุกรอบ
+        self.version = 0
+        # mtime ของไฟล์ตอนโหลดล่าสุด - ไฟล์ที่ถูกแก้จาก worker อื่นโหลดใหม่ใน reload_if_changed()
+        self._file_mtimes: Tuple[int, int] = (0, 0)
+        self._checked_at = 0.0
         
         # โหลดข้อมูลเริ่มต้นจากไฟล์ config
         self._load_default_configs()
@@ -21,36 +32,67 @@ class ConfigService:
             
             # โหลด thresholds
             self._load_thresholds_from_file()
-            
-            # ล้างข้อมูลเก่าใน memory
-            self.devices.clear()
-            self.mappings.clear()
-            
+
+            # stat ก่อนอ่าน - ถ้าไฟล์ถูกเขียนระหว่างอ่าน รอบตรวจถัดไปจะโหลดใหม่อีกครั้ง
+            self._file_mtimes = self._stat_files()
+
+            # อ่านลง list ใหม่แล้วสลับทีเดียว (thread อื่นไม่เห็น list ที่โหลดไม่ครบ)
+            devices = []
+            mappings = []
+
             # โหลด devices จากไฟล์ JSON (อ่านใหม่ทุกครั้ง)
-            devices_file = "config/devices.json"
+            devices_file = DEVICES_FILE
             if os.path.exists(devices_file):
                 with open(devices_file, 'r') as f:
                     devices_data = json.load(f)
                     for device_data in devices_data:
                         device = DeviceConfig(**device_data)
-                        self.devices.append(device)
+                        devices.append(device)
             
             # โหลด mappings จากไฟล์ JSON (อ่านใหม่ทุกครั้ง)
-            mappings_file = "config/mappings.json"
+            mappings_file = MAPPINGS_FILE
             if os.path.exists(mappings_file):
                 with open(mappings_file, 'r') as f:
                     mappings_data = json.load(f)
                     for mapping_data in mappings_data:
                         mapping = MappingConfig(**mapping_data)
-                        self.mappings.append(mapping)
-            
+                        mappings.append(mapping)
+
+            self.devices = devices
+            self.mappings = mappings
             print(f"ConfigService loaded: {len(self.devices)} devices, {len(self.mappings)} mappings")
                             
         except Exception as e:
             print(f"Failed to load default configs: {e}")
             # ถ้าไฟล์เสีย ให้ล้างข้อมูลใน memory
-            self.devices.clear()
-            self.mappings.clear()
+            self.devices = []
+            self.mappings = []
+        self.version += 1
+
+    @staticmethod
+    def _stat_files() -> Tuple[int, int]:
+        mtimes = []
+        for path in (DEVICES_FILE, MAPPINGS_FILE):
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                mtimes.append(0)
+        return tuple(mtimes)
+
+    def reload_if_changed(self) -> bool:
+        """โหลด devices/mappings ใหม่ถ้าไฟล์เปลี่ยนตั้งแต่โหลดล่าสุด (เช่น แก้ผ่าน API ที่ worker อื่น)
+
+        stat ไฟล์ไม่เกิน 1 ครั้งต่อ settings.config_check_interval - คืน True ถ้าโหลดใหม่
+        """
+        now = time.monotonic()
+        if now - self._checked_at < settings.config_check_interval:
+            return False
+        self._checked_at = now
+        if self._stat_files() == self._file_mtimes:
+            return False
+        print("ConfigService: devices/mappings changed on disk - reloading")
+        self._load_default_configs()
+        return True
 
     def get_devices(self) -> List[DeviceConfig]:
         """ดึงข้อมูล devices - ใช้ข้อมูลใน memory"""
@@ -78,6 +120,7 @@ class ConfigService:
             if mapping.id is None:
                 mapping.id = len(self.mappings) + 1
             self.mappings.append(mapping)
+        self.version += 1
         return True
 
     def get_gas_settings(self) -> List[GasConfig]:
@@ -153,4 +196,27 @@ class ConfigService:
             return True
         except Exception as e:
             print(f"Error saving thresholds: {e}")
-            return False
\ No newline at end of file
+            return False
+
+
+class StaticConfigService:
+    """devices/mappings ที่กำหนดจากโค้ด (ไม่อ่านไฟล์) - ใช้ใน acquisition worker, benchmark และ simulator"""
+
+    def __init__(self, devices: List[DeviceConfig] = None, mappings: List[MappingConfig] = None):
+        self.devices = list(devices or [])
+        self.mappings = list(mappings or [])
+        self.version = 1
+
+    def replace(self, devices: List[DeviceConfig], mappings: List[MappingConfig]):
+        self.devices = list(devices)
+        self.mappings = list(mappings)
+        self.version += 1
+
+    def get_devices(self) -> List[DeviceConfig]:
+        return self.devices.copy()
+
+    def get_device_by_name(self, name: str) -> Optional[DeviceConfig]:
+        return next((d for d in self.devices if d.name == name), None)
+
+    def get_mappings(self) -> List[MappingConfig]:
+        return self.mappings.copy()
@@ -0,0 +1,117 @@
+from typing import NamedTuple, Mapping, Tuple, Dict, Optional
+from types import MappingProxyType
+from app.domain.config_model import DeviceConfig, MappingConfig
+from app.domain.read_plan_model import DeviceReadPlan
+from app.services.read_plan_service import ReadPlanService
+from app.services.register_decoder import BlockDecoder
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ConfigSnapshot(NamedTuple):
+    """config ที่ compile แล้ว 1 version: devices -> read plan -> decoder -> ชื่อ parameter
+
+    สร้างใหม่เฉพาะเมื่อ ConfigService.version เปลี่ยน - รอบ poll แค่เทียบ version
+    """
+    version: int
+    devices: Tuple[DeviceConfig, ...]
+    mappings: Tuple[MappingConfig, ...]
+    device_configs: Mapping[str, Dict]  # รูปแบบเดิมของ ModbusDataService.device_configs
+    device_mappings: Mapping[str, Tuple[MappingConfig, ...]]
+    read_plans: Mapping[str, DeviceReadPlan]  # ทุก block มี decoder compile ไว้แล้ว
+    parameter_names: Tuple[str, ...]
+    built_at: float
+    build_ms: float
+
+class ConfigSnapshotService:
+    """ถือ ConfigSnapshot ล่าสุด และ build ใหม่เมื่อ config เปลี่ยนเท่านั้น"""
+
+    def __init__(self, config_service, read_plan_service: ReadPlanService):
+        self.config_service = config_service
+        self.read_plan_service = read_plan_service
+        self.builds = 0
+        self._snapshot: Optional[ConfigSnapshot] = None
+        self._lock = threading.Lock()
+
+    def current(self) -> ConfigSnapshot:
+        # ไฟล์ config ที่ถูกแก้จาก worker อื่น - ConfigService โหลดใหม่และเพิ่ม version (ตรวจตามรอบ ไม่ใช่ทุกครั้ง)
+        reload_if_changed = getattr(self.config_service, "reload_if_changed", None)
+        if reload_if_changed is not None:
+            reload_if_changed()
+        # config_service ที่ไม่มี version (เช่น config คงที่ใน benchmark) ถือเป็น version 0 ตลอด
+        version = getattr(self.config_service, "version", 0)
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+        with self._lock:
+            # อีก thread อาจ build เสร็จแล้วระหว่างรอ lock
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.version != version:
+                snapshot = self._build(version)
+                self._snapshot = snapshot
+            return snapshot
+
+    def invalidate(self):
+        """บังคับให้ build ใหม่ในครั้งถัดไป (เช่น หลังล้าง split point ของ read plan)"""
+        self._snapshot = None
+
+    def _build(self, version: int) -> ConfigSnapshot:
+        started = time.perf_counter()
+        devices = tuple(self.config_service.get_devices())
+        mappings = tuple(self.config_service.get_mappings())
+
+        grouped: Dict[str, list] = {d.name: [] for d in devices}
+        for mapping in mappings:
+            if mapping.device in grouped:
+                grouped[mapping.device].append(mapping)
+
+        device_configs = {}
+        read_plans = {}
+        for device in devices:
+            device_mappings = grouped[device.name]
+            device_configs[device.name] = {
+                "host": device.host,
+                "port": device.port,
+                "unit": device.unit,
+                "mappings": {
+                    m.name: {"address": m.address, "dataType": m.dataType, "endian": "big"}
+                    for m in device_mappings
+                },
+            }
+            plan = self.read_plan_service.compile_device(device, device_mappings)
+            for block in plan.blocks:
+                block.decoder = BlockDecoder(block.channels)
+            read_plans[device.name] = plan
+
+        parameter_names = tuple(dict.fromkeys(m.name for ms in grouped.values() for m in ms))
+        build_ms = (time.perf_counter() - started) * 1000
+        self.builds += 1
+        logger.info(f"Config snapshot v{version}: {len(devices)} devices, {len(mappings)} mappings ({build_ms:.1f} ms)")
+        return ConfigSnapshot(
+            version=version,
+            devices=devices,
+            mappings=mappings,
+            device_configs=MappingProxyType(device_configs),
+            device_mappings=MappingProxyType({name: tuple(ms) for name, ms in grouped.items()}),
+            read_plans=MappingProxyType(read_plans),
+            parameter_names=parameter_names,
+            built_at=time.time(),
+            build_ms=round(build_ms, 2),
+        )
+
+    def get_stats(self) -> Dict:
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {"version": None, "builds": self.builds}
+        return {
+            "version": snapshot.version,
+            "builds": self.builds,
+            "devices": len(snapshot.devices),
+            "mappings": len(snapshot.mappings),
+            "parameters": len(snapshot.parameter_names),
+            "blocks": sum(len(p.blocks) for p in snapshot.read_plans.values()),
+            "build_ms": snapshot.build_ms,
+            "built_at": snapshot.built_at,
+        }
@@ -0,0 +1,173 @@
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+from app.domain.sample import Sample, SampleSchema
+from app.core.config import settings
+
+# numpy ไม่บังคับ - ถ้าไม่มีใช้ loop ธรรมดา (ผลเหมือนกัน แต่ bulk ช้ากว่า)
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+AMBIENT_O2 = 21.0
+AMBIENT_MARGIN = 0.1  # O2 ที่ใกล้ 21% เกินนี้ถือว่าหารไม่ได้ (เช่น purge ด้วยอากาศ)
+
+# parameter ที่ต้อง O2 correction เมื่อ gas.json ไม่ได้กำหนด (emission gases) - ที่เหลือ copy ค่าเดิม
+DEFAULT_CORRECTED = ("SO2", "NOx", "CO", "Dust", "HCl", "NH3", "SO3", "H2S", "NO", "NO2")
+# ไม่ correct เสมอ (physical parameters)
+NEVER_CORRECTED = frozenset(("O2", "Temperature", "Velocity", "Flowrate", "Pressure", "Humidity"))
+
+def correct_value(value: float, factor: float) -> float:
+    """ค่าหลัง correction - ปัด 1 ตำแหน่ง, 0 คงเป็น 0"""
+    return round(value * factor, 1) if value != 0 else 0.0
+
+class CorrectionEngine:
+    """O2-reference correction ที่ compile จาก config ครั้งเดียว
+
+    corrected = ค่า * (21 - O2 อ้างอิงของแก๊ส) / (21 - O2 ที่วัดได้)
+    - rules: ชื่อแก๊ส -> O2 อ้างอิง (%) เฉพาะแก๊สที่ต้อง correct
+    - O2 ที่วัดได้ต้องอยู่ในช่วง (o2_min, o2_max) และห่างจาก 21% เกิน AMBIENT_MARGIN ไม่งั้นไม่ correct ทั้งแถว
+    - factor ของแก๊สใดที่ <= 0 หรือ > max_factor แก๊สนั้นไม่ถูก correct
+
+    apply() ใช้กับ Sample ของ live path, apply_columns() ใช้กับข้อมูลย้อนหลังทั้งชุด (numpy ครั้งเดียวต่อ column)
+    ทั้งสองทางใช้ rule และเงื่อนไขเดียวกัน
+    """
+
+    def __init__(self, rules: Mapping[str, float], o2_min: float = 0.0, o2_max: float = AMBIENT_O2,
+                 max_factor: float = 10.0, o2_name: str = "O2"):
+        self.rules: Dict[str, float] = dict(rules)
+        self.o2_min = o2_min
+        self.o2_max = o2_max
+        self.max_factor = max_factor
+        self.o2_name = o2_name
+        # O2 อ้างอิง -> ชื่อแก๊ส (ส่วนใหญ่มีกลุ่มเดียว = คำนวณ factor ครั้งเดียวต่อแถว)
+        groups: Dict[float, List[str]] = {}
+        for name, reference in self.rules.items():
+            groups.setdefault(reference, []).append(name)
+        self._groups: Tuple[Tuple[float, Tuple[str, ...]], ...] = tuple(
+            (AMBIENT_O2 - reference, tuple(names)) for reference, names in groups.items()
+        )
+        self._plans: Dict[SampleSchema, Tuple[Tuple[float, Tuple[int, ...]], ...]] = {}
+
+    @classmethod
+    def from_gas_settings(cls, gas_settings: Optional[Iterable[Mapping]] = None,
+                          default_reference: Optional[float] = None) -> "CorrectionEngine":
+        """สร้างจากรายการใน gas.json
+
+        แต่ละแก๊สกำหนดได้ (ไม่บังคับ): "correct" (bool) และ "referenceO2" (%)
+        แก๊สที่ไม่ได้กำหนด correct ใช้ DEFAULT_CORRECTED, ไม่กำหนด referenceO2 ใช้ค่าเริ่มต้นจาก settings
+        """
+        default_reference = settings.o2_reference_default if default_reference is None else default_reference
+        rules = {name: default_reference for name in DEFAULT_CORRECTED}
+        for gas in gas_settings or ():
+            name = gas.get("key")
+            if not name or name in NEVER_CORRECTED:
+                continue
+            correct = gas.get("correct")
+            if correct is False:
+                rules.pop(name, None)
+            elif correct or name in rules:
+                reference = gas.get("referenceO2")
+                rules[name] = float(reference) if reference is not None else default_reference
+        return cls(
+            rules,
+            o2_min=settings.o2_correction_min,
+            o2_max=settings.o2_correction_max,
+            max_factor=settings.o2_correction_max_factor,
+        )
+
+    def o2_valid(self, o2: float) -> bool:
+        return self.o2_min < o2 < self.o2_max and abs(AMBIENT_O2 - o2) >= AMBIENT_MARGIN
+
+    def factor_valid(self, factor: float) -> bool:
+        return 0 < factor <= self.max_factor
+
+    def factors(self, o2: float) -> Dict[str, float]:
+        """ชื่อแก๊ส -> correction factor ที่ O2 นี้ (เฉพาะแก๊สที่ correct ได้)"""
+        if not self.o2_valid(o2):
+            return {}
+        denominator = AMBIENT_O2 - o2
+        result = {}
+        for numerator, names in self._groups:
+            factor = numerator / denominator
+            if self.factor_valid(factor):
+                result.update(dict.fromkeys(names, factor))
+        return result
+
+    def _plan(self, schema: SampleSchema) -> Tuple[Tuple[float, Tuple[int, ...]], ...]:
+        plan = self._plans.get(schema)
+        if plan is None:
+            index = schema.index
+            plan = tuple(
+                (numerator, tuple(index[name] for name in names if name in index))
+                for numerator, names in self._groups
+            )
+            plan = self._plans[schema] = tuple(group for group in plan if group[1])
+        return plan
+
+    def apply(self, sample: Sample) -> Sample:
+        """correct sample หนึ่งแถว - คืน sample เดิมเมื่อไม่มีอะไรต้อง/ควร correct"""
+        o2 = sample.get(self.o2_name)
+        if not self.o2_valid(o2):
+            return sample
+        denominator = AMBIENT_O2 - o2
+        corrected = None
+        for numerator, indexes in self._plan(sample.schema):
+            factor = numerator / denominator
+            if not self.factor_valid(factor):
+                continue
+            if corrected is None:
+                corrected = sample.copy()
+                values = corrected.values
+            for i in indexes:
+                values[i] = correct_value(values[i], factor)
+        return sample if corrected is None else corrected
+
+    def apply_columns(self, o2: Sequence[float], columns: Mapping[str, Sequence[float]]) -> Dict[str, Sequence[float]]:
+        """correct ข้อมูลหลายแถวแบบ column (เช่นข้อมูลย้อนหลังสำหรับรายงาน)
+
+        คืน dict ชื่อ -> column ที่ correct แล้ว (column ที่ไม่ต้อง correct คืนตัวเดิม)
+        มี numpy = ndarray และคำนวณทั้ง column ทีเดียว, ไม่มี = list
+        """
+        wanted = [(name, self.rules[name]) for name in columns if name in self.rules]
+        result = dict(columns)
+        if not wanted:
+            return result
+        if np is None:
+            valid = [self.o2_valid(value) for value in o2]
+            for name, reference in wanted:
+                numerator = AMBIENT_O2 - reference
+                corrected = []
+                for value, o2_value, ok in zip(columns[name], o2, valid):
+                    if ok:
+                        factor = numerator / (AMBIENT_O2 - o2_value)
+                        if self.factor_valid(factor):
+                            value = correct_value(value, factor)
+                    corrected.append(value)
+                result[name] = corrected
+            return result
+
+        o2 = np.asarray(o2, dtype=float)
+        valid = (o2 > self.o2_min) & (o2 < self.o2_max) & (np.abs(AMBIENT_O2 - o2) >= AMBIENT_MARGIN)
+        denominator = np.where(valid, AMBIENT_O2 - o2, 1.0)
+        factors: Dict[float, Tuple] = {}  # O2 อ้างอิง -> (factor, mask) คำนวณครั้งเดียวต่อกลุ่ม
+        for name, reference in wanted:
+            if reference not in factors:
+                factor = (AMBIENT_O2 - reference) / denominator
+                factors[reference] = (factor, valid & (factor > 0) & (factor <= self.max_factor))
+            factor, mask = factors[reference]
+            column = np.asarray(columns[name], dtype=float)
+            corrected = np.where(mask, 0.0, column)
+            rows = np.flatnonzero(mask & (column != 0))
+            # ปัดด้วย round() ของ Python ทีละค่า (ตรงกับ correct_value) - np.round ปัดค่ากึ่งกลางต่างออกไป
+            corrected[rows] = [round(value, 1) for value in (column[rows] * factor[rows]).tolist()]
+            result[name] = corrected
+        return result
+
+    def get_stats(self) -> Dict:
+        return {
+            "rules": self.rules,
+            "o2_min": self.o2_min,
+            "o2_max": self.o2_max,
+            "max_factor": self.max_factor,
+            "vectorized": np is not None,
+        }
@@ -0,0 +1,92 @@
+from typing import List, Dict, Tuple, Optional
+from app.core.config import settings
+from app.domain.config_model import MappingConfig
+import math
+import time
+
+class DeadbandFilter:
+    """report-by-exception: ส่งต่อเฉพาะค่าที่เปลี่ยนเกิน deadband หรือเงียบนานเกิน maxSilence
+
+    ค่าที่ส่งต่อ (reported) ใช้เป็นฐานเทียบครั้งถัดไป ไม่ใช่ค่าที่อ่านได้ล่าสุด
+    ทำให้ค่าที่ค่อย ๆ drift ทีละนิดยังถูกส่งเมื่อสะสมเกิน deadband
+    """
+
+    def __init__(self, default_deadband: Optional[float] = None,
+                 default_percent: Optional[float] = None,
+                 max_silence: Optional[float] = None):
+        self.default_deadband = settings.deadband_default if default_deadband is None else default_deadband
+        self.default_percent = settings.deadband_default_percent if default_percent is None else default_percent
+        self.max_silence = max_silence or settings.deadband_max_silence
+        self._signature = None
+        self._limits: Dict[str, Tuple[float, float, float]] = {}  # name -> (absolute, percent, max_silence)
+        self._reported: Dict[str, Tuple[float, float]] = {}  # name -> (ค่าที่ส่งล่าสุด, monotonic time)
+        self.values_in = 0
+        self.values_out = 0
+        self.heartbeats = 0
+
+    def update(self, mappings: List[MappingConfig]) -> bool:
+        """อ่าน deadband ของแต่ละ mapping ใหม่เมื่อ config เปลี่ยน"""
+        signature = tuple((m.name, m.deadband, m.deadbandPercent, m.maxSilence) for m in mappings)
+        if signature == self._signature:
+            return False
+        self._signature = signature
+        self._limits = {
+            m.name: (
+                self.default_deadband if m.deadband is None else m.deadband,
+                self.default_percent if m.deadbandPercent is None else m.deadbandPercent,
+                m.maxSilence or self.max_silence,
+            )
+            for m in mappings
+        }
+        # เกณฑ์เปลี่ยน - ให้ส่งค่าถัดไปของทุก parameter
+        self._reported.clear()
+        return True
+
+    def filter(self, values: Dict[str, float], now: Optional[float] = None) -> Dict[str, float]:
+        """คืนเฉพาะค่าที่ต้องส่งต่อจาก snapshot นี้"""
+        now = time.monotonic() if now is None else now
+        changed = {}
+        for name, value in values.items():
+            reported = self._reported.get(name)
+            if reported is None:
+                changed[name] = value
+                continue
+
+            last_value, last_time = reported
+            absolute, percent, max_silence = self._limits.get(
+                name, (self.default_deadband, self.default_percent, self.max_silence)
+            )
+            if self._exceeds(value, last_value, absolute, percent):
+                changed[name] = value
+            elif now - last_time >= max_silence:
+                changed[name] = value
+                self.heartbeats += 1
+
+        for name, value in changed.items():
+            self._reported[name] = (value, now)
+        # parameter ที่หายไป (device อ่านไม่ได้) - ส่งทันทีเมื่อกลับมา
+        for name in [n for n in self._reported if n not in values]:
+            del self._reported[name]
+
+        self.values_in += len(values)
+        self.values_out += len(changed)
+        return changed
+
+    @staticmethod
+    def _exceeds(value: float, last_value: float, absolute: float, percent: float) -> bool:
+        if math.isnan(value) or math.isnan(last_value):
+            return math.isnan(value) != math.isnan(last_value)
+        delta = abs(value - last_value)
+        if absolute <= 0 and percent <= 0:
+            return delta > 0
+        if absolute > 0 and delta > absolute:
+            return True
+        return percent > 0 and delta > abs(last_value) * percent / 100
+
+    def get_stats(self) -> Dict:
+        return {
+            "values_in": self.values_in,
+            "values_out": self.values_out,
+            "heartbeats": self.heartbeats,
+            "reduction": round(1 - self.values_out / self.values_in, 4) if self.values_in else 0.0,
+        }
@@ -0,0 +1,229 @@
+from typing import Any, Callable, Dict, Hashable, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import itertools
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ลำดับความสำคัญของ request (เลขน้อยทำก่อน)
+PRIORITY_POLL = 0  # รอบ poll ของ acquisition
+PRIORITY_STATUS = 1  # status/alarm coils
+PRIORITY_ON_DEMAND = 2  # อ่าน/ทดสอบจาก API
+PRIORITY_MAINTENANCE = 3
+
+EWMA_ALPHA = 0.2
+
+_local = threading.local()  # ชื่อ actor ของ thread ที่กำลังทำงานให้ actor อยู่
+
+class _Request:
+    __slots__ = ("key", "fn", "priority", "future", "waiters", "enqueued", "started", "task")
+
+    def __init__(self, key: Hashable, fn: Callable, priority: int, future: asyncio.Future):
+        self.key = key
+        self.fn = fn
+        self.priority = priority
+        self.future = future
+        self.waiters = 0
+        self.enqueued = time.monotonic()
+        self.started = False
+        self.task: Optional[asyncio.Future] = None
+
+class DeviceActor:
+    """เจ้าของการเข้าถึง device หนึ่งตัว - ทำ request ทีละตัวตามลำดับความสำคัญ
+
+    - request ที่ key เดียวกันซึ่งยังรอหรือกำลังทำอยู่ ถูกรวมเป็นครั้งเดียว (ผู้ขอทุกคนได้ผลเดียวกัน)
+    - งานแบบ async (acquisition) รันบน event loop ส่วนงาน sync (ModbusTcpClient) รันบน thread ของ actor เอง
+      client แบบ sync ของ device จึงถูกใช้จาก thread เดียวเสมอ
+    - ผู้ขอยกเลิกครบทุกคนก่อนเริ่มทำ = ข้าม request นั้น, ระหว่างทำ (async) = cancel งาน
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._counter = itertools.count()
+        self._inflight: Dict[Hashable, _Request] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.current: Optional[Hashable] = None
+        self.depth = 0  # request ที่รออยู่ (ไม่นับตัวที่กำลังทำ)
+        self.max_depth = 0
+        self.served = 0
+        self.merged = 0
+        self.skipped = 0
+        self.errors = 0
+        self.service_ewma: Optional[float] = None
+        self.service_max = 0.0
+        self.wait_ewma: Optional[float] = None
+
+    async def submit(self, key: Hashable, fn: Callable, priority: int = PRIORITY_ON_DEMAND) -> Any:
+        request = self._inflight.get(key)
+        if request is None:
+            request = _Request(key, fn, priority, asyncio.get_running_loop().create_future())
+            self._inflight[key] = request
+            self._enqueue(request)
+            self.depth += 1
+            self.max_depth = max(self.max_depth, self.depth)
+            if self._worker is None or self._worker.done():
+                self._worker = asyncio.create_task(self._run(), name=f"device-actor:{self.name}")
+        else:
+            self.merged += 1
+            if priority < request.priority and not request.started:
+                # ผู้ขอใหม่เร่งกว่า - ใส่ซ้ำด้วย priority ใหม่ (ตัวเดิมถูกข้ามเมื่อหยิบขึ้นมา)
+                request.priority = priority
+                self._enqueue(request)
+
+        request.waiters += 1
+        try:
+            return await asyncio.shield(request.future)
+        except asyncio.CancelledError:
+            request.waiters -= 1
+            if request.waiters == 0 and request.task is not None and asyncio.iscoroutinefunction(request.fn):
+                # งาน sync ใน thread ยกเลิกกลางทางไม่ได้ - ปล่อยให้ทำจนเสร็จ
+                request.task.cancel()
+            raise
+
+    def _enqueue(self, request: _Request):
+        self._queue.put_nowait((request.priority, next(self._counter), request))
+
+    async def _run(self):
+        while True:
+            priority, _, request = await self._queue.get()
+            if request.started or request.future.done() or priority != request.priority:
+                continue  # ถูกใส่ซ้ำด้วย priority อื่นแล้ว
+            self.depth -= 1
+            if request.waiters == 0:
+                # ผู้ขอยกเลิกหมดแล้วก่อนถึงคิว
+                self.skipped += 1
+                self._finish(request)
+                request.future.cancel()
+                continue
+            await self._serve(request)
+
+    async def _serve(self, request: _Request):
+        request.started = True
+        self.current = request.key
+        started = time.monotonic()
+        self.wait_ewma = self._ewma(self.wait_ewma, started - request.enqueued)
+        if asyncio.iscoroutinefunction(request.fn):
+            request.task = asyncio.ensure_future(request.fn())
+        else:
+            request.task = asyncio.wrap_future(self._thread_pool().submit(self._call_in_thread, request.fn))
+        try:
+            await asyncio.wait((request.task,))
+        finally:
+            self.current = None
+            self._finish(request)
+
+        elapsed = time.monotonic() - started
+        self.served += 1
+        self.service_ewma = self._ewma(self.service_ewma, elapsed)
+        self.service_max = max(self.service_max, elapsed)
+        if request.task.cancelled():
+            request.future.cancel()
+        elif request.task.exception() is not None:
+            self.errors += 1
+            request.future.set_exception(request.task.exception())
+        else:
+            request.future.set_result(request.task.result())
+
+    def _call_in_thread(self, fn: Callable):
+        _local.actor = self.name
+        try:
+            return fn()
+        finally:
+            _local.actor = None
+
+    def _thread_pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"device-{self.name}")
+        return self._executor
+
+    def _finish(self, request: _Request):
+        if self._inflight.get(request.key) is request:
+            del self._inflight[request.key]
+
+    @staticmethod
+    def _ewma(current: Optional[float], sample: float) -> float:
+        return sample if current is None else current + EWMA_ALPHA * (sample - current)
+
+    def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get_stats(self) -> Dict:
+        return {
+            "queue_depth": self.depth,
+            "max_queue_depth": self.max_depth,
+            "busy": self.current is not None,
+            "served": self.served,
+            "merged": self.merged,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "service_ms": round(self.service_ewma * 1000, 2) if self.service_ewma is not None else None,
+            "service_max_ms": round(self.service_max * 1000, 2),
+            "wait_ms": round(self.wait_ewma * 1000, 2) if self.wait_ewma is not None else None,
+        }
+
+class DeviceActorRegistry:
+    """actor 1 ตัวต่อ device ของทั้ง process - ทุกทางที่อ่าน Modbus ต้องผ่านที่นี่"""
+
+    def __init__(self):
+        self._actors: Dict[str, DeviceActor] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """event loop ที่ actor ทำงาน (ใช้รับ request จาก thread อื่นผ่าน call())"""
+        self.loop = loop
+
+    def actor(self, device_name: str) -> DeviceActor:
+        actor = self._actors.get(device_name)
+        if actor is None:
+            actor = self._actors[device_name] = DeviceActor(device_name)
+        return actor
+
+    async def submit(self, device_name: str, key: Hashable, fn: Callable,
+                     priority: int = PRIORITY_ON_DEMAND) -> Any:
+        """ส่ง request ให้ actor ของ device - fn เป็น coroutine function หรือฟังก์ชัน sync ก็ได้"""
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+        return await self.actor(device_name).submit(key, fn, priority)
+
+    def call(self, device_name: str, key: Hashable, fn: Callable,
+             priority: int = PRIORITY_ON_DEMAND, timeout: Optional[float] = None) -> Any:
+        """สำหรับโค้ด sync ใน thread อื่น: ส่งเข้า actor แล้วรอผล
+
+        ถ้ายังไม่มี event loop (script/benchmark) หรือเรียกจากงานของ actor เอง ให้ทำตรงนี้เลย
+        """
+        loop = self.loop
+        if loop is None or not loop.is_running() or getattr(_local, "actor", None) is not None:
+            return fn()
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            raise RuntimeError(f"Device {device_name}: call() would block the event loop - use submit()")
+        future = asyncio.run_coroutine_threadsafe(self.submit(device_name, key, fn, priority), loop)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def close(self):
+        for actor in self._actors.values():
+            actor.close()
+        self._actors.clear()
+
+    def get_stats(self) -> Dict[str, Dict]:
+        return {name: actor.get_stats() for name, actor in self._actors.items()}
+
+# ใช้ instance เดียวทั้ง process
+device_actors = DeviceActorRegistry()
@@ -1,22 +1,39 @@
 from influxdb_client import InfluxDBClient, Point, WritePrecision
 from app.config.influxdb import influxdb
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Optional, Tuple
 import json
+from math import isfinite
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+CEMS_TAGS = ("stack_id", "stack_name", "status", "device_name")
+
+def _flux_time(value: datetime) -> str:
+    """RFC3339 (UTC) สำหรับ range() - datetime ที่ไม่มี tzinfo ถือเป็น UTC"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+def _flux_string(value: str) -> str:
+    """string literal ใน Flux query (escape \\, " และ ${ ของ string interpolation)"""
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"').replace("${", "\\${") + '"'
+
+def _escape_tag(value: str) -> str:
+    return value.replace("\\", "\\\\").replace(",", "\\,").replace("=", "\\=").replace(" ", "\\ ")
 
 class InfluxDBService:
     def __init__(self):
         self.influxdb = influxdb
 
-    def save_cems_data(self, stack_id: str, stack_name: str, data: dict, corrected_data: dict = None, status: str = "connected", device_name: str = None) -> bool:
-        """บันทึกข้อมูล CEMS ลง InfluxDB"""
+    def save_cems_data(self, stack_id: str, stack_name: str, data: dict, corrected_data: dict = None, status: str = "connected", device_name: str = None, timestamp: datetime = None) -> bool:
+        """บันทึกข้อมูล CEMS ลง InfluxDB (timestamp = เวลาของ sample ถ้ามี)"""
         try:
             # สร้าง Point สำหรับข้อมูล CEMS แบบ dynamic
             point = Point("cems_data") \
                 .tag("stack_id", stack_id) \
                 .tag("stack_name", stack_name) \
                 .tag("status", status) \
-                .time(datetime.utcnow(), WritePrecision.MS)
+                .time(timestamp or datetime.utcnow(), WritePrecision.MS)
             
             # เพิ่ม fields แบบ dynamic จาก data dict
             for field_name, field_value in data.items():
@@ -67,6 +84,154 @@ class InfluxDBService:
             print(f"Error saving modbus data: {e}")
             return False
 
+    def save_status_events(self, events: List) -> bool:
+        """บันทึก event การเปลี่ยนสถานะ status/alarm (StatusEvent) - 1 point ต่อ edge"""
+        try:
+            points = []
+            for event in events:
+                points.append(
+                    Point("status_events")
+                    .tag("name", event.name)
+                    .tag("type", event.type)
+                    .tag("device", event.device)
+                    .field("old", -1 if event.old is None else event.old)
+                    .field("new", event.new)
+                    .field("address", event.address)
+                    .time(event.timestamp, WritePrecision.MS)
+                )
+            if points:
+                self.influxdb.write_api.write(
+                    bucket=self.influxdb.bucket,
+                    org=self.influxdb.org,
+                    record=points
+                )
+            return True
+        except Exception as e:
+            print(f"Error saving status events: {e}")
+            return False
+
+    def get_status_events(self, start_time: datetime = None, end_time: datetime = None,
+                          name: str = None, limit: int = 1000) -> List[Dict]:
+        """ประวัติการเปลี่ยนสถานะ status/alarm (ใหม่ไปเก่า)"""
+        try:
+            range_filter = f'start: {_flux_time(start_time) if start_time else "-7d"}'
+            if end_time:
+                range_filter += f', stop: {_flux_time(end_time)}'
+            name_filter = f'|> filter(fn: (r) => r.name == {_flux_string(name)})' if name else ''
+
+            query = f'''
+            from(bucket: "{self.influxdb.bucket}")
+            |> range({range_filter})
+            |> filter(fn: (r) => r._measurement == "status_events")
+            {name_filter}
+            |> pivot(rowKey: ["_time", "name"], columnKey: ["_field"], valueColumn: "_value")
+            |> group()
+            |> sort(columns: ["_time"], desc: true)
+            |> limit(n: {limit})
+            '''
+            result = self.influxdb.query_api.query(query)
+
+            events = []
+            for table in result:
+                for record in table.records:
+                    old = record.values.get("old")
+                    events.append({
+                        "timestamp": record.get_time(),
+                        "name": record.values.get("name"),
+                        "type": record.values.get("type"),
+                        "device": record.values.get("device"),
+                        "address": record.values.get("address"),
+                        "old": None if old is None or old < 0 else old,
+                        "new": record.values.get("new"),
+                    })
+            return events
+        except Exception as e:
+            print(f"Error getting status events: {e}")
+            return []
+
+    def get_raw_columns(self, stack_id: str, start_time: datetime, end_time: datetime) -> Optional[Dict]:
+        """ค่าดิบ (field ที่ไม่ใช่ *Corr) ของ cems_data ในช่วง [start, end) แบบ column - สำหรับคำนวณใหม่ทั้งชุด
+
+        คืน {"times": [ms], "tags": [tag ต่อแถว], "columns": {field: [ค่า]}} (ค่าที่ไม่มีเป็น NaN)
+        หรือ None เมื่อ query ไม่สำเร็จ
+        """
+        try:
+            query = f'''
+            import "strings"
+            from(bucket: "{self.influxdb.bucket}")
+            |> range(start: {_flux_time(start_time)}, stop: {_flux_time(end_time)})
+            |> filter(fn: (r) => r._measurement == "cems_data" and r.stack_id == "{stack_id}")
+            |> filter(fn: (r) => not strings.hasSuffix(v: r._field, suffix: "Corr"))
+            |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+            '''
+            nan = float("nan")
+            times: List[int] = []
+            tags: List[Tuple] = []
+            columns: Dict[str, List[float]] = {}
+            interned: Dict[Tuple, Tuple] = {}  # tag set เดียวกันใช้ tuple เดียวกัน
+            reserved = set(CEMS_TAGS) | {"result", "table", "_start", "_stop", "_time", "_measurement"}
+            for record in self.influxdb.query_api.query_stream(query):
+                values = record.values
+                row = len(times)
+                times.append((record.get_time() - EPOCH) // timedelta(milliseconds=1))
+                tag = tuple((key, values[key]) for key in CEMS_TAGS if values.get(key) is not None)
+                tags.append(interned.setdefault(tag, tag))
+                for field, value in values.items():
+                    if field in reserved or not isinstance(value, (int, float)):
+                        continue
+                    column = columns.get(field)
+                    if column is None:
+                        column = columns[field] = [nan] * row
+                    column.append(float(value))
+                for column in columns.values():
+                    if len(column) <= row:
+                        column.append(nan)
+            return {"times": times, "tags": tags, "columns": columns}
+        except Exception as e:
+            print(f"Error getting raw CEMS columns: {e}")
+            return None
+
+    def write_corrected_columns(self, times: List[int], tags: List[Tuple], columns: Dict[str, List[float]],
+                                batch_size: int = 5000) -> int:
+        """เขียนทับ field *Corr ของ cems_data (แถวเดียวกับ get_raw_columns) ด้วย line protocol เป็น batch
+
+        ค่า NaN/inf ไม่เขียน - คืนจำนวนแถวที่เขียน หรือ -1 เมื่อเขียนไม่สำเร็จ
+        """
+        try:
+            prefixes: Dict[Tuple, str] = {}
+            # ndarray -> list ของ float (repr ของ numpy scalar ใช้ใน line protocol ไม่ได้)
+            names = [(f"{name}Corr", column.tolist() if hasattr(column, "tolist") else column)
+                     for name, column in columns.items()]
+            lines: List[str] = []
+            written = 0
+            for row, (timestamp, tag) in enumerate(zip(times, tags)):
+                fields = ",".join(f"{name}={column[row]!r}" for name, column in names if isfinite(column[row]))
+                if not fields:
+                    continue
+                prefix = prefixes.get(tag)
+                if prefix is None:
+                    prefix = prefixes[tag] = "cems_data" + "".join(f",{key}={_escape_tag(str(value))}" for key, value in tag)
+                lines.append(f"{prefix} {fields} {timestamp}")
+                if len(lines) >= batch_size:
+                    self._write_lines(lines)
+                    written += len(lines)
+                    lines = []
+            if lines:
+                self._write_lines(lines)
+                written += len(lines)
+            return written
+        except Exception as e:
+            print(f"Error writing corrected CEMS columns: {e}")
+            return -1
+
+    def _write_lines(self, lines: List[str]):
+        self.influxdb.write_api.write(
+            bucket=self.influxdb.bucket,
+            org=self.influxdb.org,
+            record=lines,
+            write_precision=WritePrecision.MS
+        )
+
     def get_latest_cems_data(self, stack_id: str) -> Optional[Dict]:
         """ดึงข้อมูล CEMS ล่าสุด"""
         try:
@@ -0,0 +1,381 @@
+from typing import List, Dict, Tuple, Optional
+from app.core.config import settings
+from app.services.modbus_data_service import ModbusDataService, ILLEGAL_DATA_ADDRESS
+from app.services.poll_scheduler import PollScheduler
+from app.services.rtt_estimator import RttEstimator
+from app.services.deadband_filter import DeadbandFilter
+from app.services.config_snapshot_service import ConfigSnapshot
+from app.services.device_actor import DeviceActorRegistry, device_actors, PRIORITY_POLL
+from app.infrastructure.modbus_connection_manager import ModbusConnectionManager, modbus_connection_manager
+from app.infrastructure.circuit_breaker import CircuitBreakerRegistry, device_breakers
+from app.infrastructure.modbus_pipeline import PipelineError, ModbusExceptionResult
+from app.domain.read_plan_model import DeviceReadPlan, ReadBlock
+from pymodbus.pdu import ExceptionResponse
+from functools import partial
+import asyncio
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+def merge_device_values(results: Dict[str, Dict]) -> Dict:
+    """รวมข้อมูลทุก device (key ซ้ำ - ใช้ค่าที่ไม่เป็น 0)"""
+    data = {}
+    for device_data in results.values():
+        for key, value in device_data.items():
+            if key not in data or value != 0.0:
+                data[key] = value
+    return data
+
+class ModbusAcquisitionService:
+    """อ่านข้อมูลทุก device พร้อมกันด้วย asyncio (pymodbus AsyncModbusTcpClient)
+
+    - แต่ละ request มี timeout ของตัวเอง
+    - device ที่อ่านไม่เสร็จภายใน poll_timeout ถูก cancel จริง (ไม่ค้างเป็น thread)
+    - เวลาต่อรอบขึ้นกับ gateway ที่ช้าที่สุด ไม่ใช่ผลรวมของทุก gateway
+    - unit ทุกตัวหลัง gateway เดียวกัน (host:port เดียวกัน) ใช้ socket ร่วมกัน 1 ตัว
+    - แต่ละรอบอ่านเฉพาะ mapping ที่ถึงกำหนดตาม pollInterval (PollScheduler)
+    - device ที่ตั้ง pipeline > 1 ส่ง block ค้างได้หลาย request บน socket เดียว (จับคู่ด้วย transaction id)
+      ถ้า device ตอบผิดคู่ หรือเงียบติดกัน modbus_pipeline_fallback_timeouts รอบ
+      จะกลับไปใช้แบบทีละ request เป็นเวลา modbus_pipeline_retry_after
+    """
+
+    CYCLE_MARGIN = 1.2  # เผื่อเวลาให้ timeout ของ request เกิดก่อนรอบ poll ถูกยกเลิก
+
+    def __init__(self, modbus_data_service: ModbusDataService,
+                 connection_manager: ModbusConnectionManager = None,
+                 request_timeout: Optional[float] = None,
+                 poll_timeout: Optional[float] = None,
+                 breakers: CircuitBreakerRegistry = None,
+                 actors: DeviceActorRegistry = None):
+        self.modbus_data_service = modbus_data_service
+        self.actors = actors or device_actors
+        self.register_cache = modbus_data_service.register_cache
+        self.connection_manager = connection_manager or modbus_connection_manager
+        self.breakers = breakers or device_breakers
+        self.request_timeout = request_timeout or settings.modbus_request_timeout
+        self.poll_timeout = poll_timeout or settings.modbus_poll_timeout
+        self.scheduler = PollScheduler(modbus_data_service.read_plan_service)
+        # timeout/retry ของแต่ละ device ปรับตาม RTT ที่วัดได้ (request_timeout ใช้ตอนยังไม่มีข้อมูล)
+        self.rtt = RttEstimator(initial_timeout=self.request_timeout, poll_timeout=self.poll_timeout)
+        self.deadband = DeadbandFilter()
+        self.config: Optional[ConfigSnapshot] = None  # config snapshot ที่ scheduler/deadband ใช้อยู่
+        self.device_values: Dict[str, Dict[str, float]] = {}  # ค่าล่าสุดของแต่ละ device
+        self.changes: Dict[str, float] = {}  # ค่าที่ผ่าน deadband ในรอบล่าสุด
+        self.change_seq = 0  # เพิ่มทุกรอบที่มีค่าผ่าน deadband - sink ใช้เทียบว่ามีอะไรใหม่หรือไม่
+        self.device_status: Dict[str, Dict] = {}
+        self.last_cycle: Dict = {}
+        self.pipeline_retry_after = settings.modbus_pipeline_retry_after
+        self.pipeline_fallback: Dict[str, Dict] = {}  # device -> {"until", "reason", "count"}
+        self.pipeline_fallback_timeouts = settings.modbus_pipeline_fallback_timeouts
+        self.pipeline_timeouts: Dict[str, int] = {}  # device -> pipelined รอบที่ timeout ติดกัน
+        # id(plan) -> block หลังแบ่งที่ขอบ illegal address - plan ใน config snapshot ไม่ถูกแก้
+        # (ล้างเมื่อ snapshot เปลี่ยน: snapshot ใหม่ compile จุดแบ่งที่เรียนรู้ไว้แล้ว)
+        self.split_blocks: Dict[int, List[ReadBlock]] = {}
+        # gateway ที่ทุก device เปิด pipelining -> ชื่อ device (ใช้ตัดสินว่าคืน slot ของ async client ได้หรือไม่)
+        self.pipeline_gateways: Dict[str, Tuple[str, ...]] = {}
+
+    @property
+    def poll_interval(self) -> float:
+        """ระยะเวลาระหว่างรอบ poll (= pollInterval ที่สั้นที่สุด)"""
+        return self.scheduler.base_interval
+
+    async def poll_once(self) -> Optional[Dict]:
+        """อ่าน mapping ที่ถึงกำหนดของทุก device พร้อมกัน แล้วรวมเป็น snapshot เดียว
+
+        mapping ที่ยังไม่ถึงรอบจะใช้ค่าที่อ่านได้ล่าสุด
+        ค่าที่เปลี่ยนเกิน deadband (หรือถึงรอบ heartbeat) อยู่ใน self.changes
+        """
+        self.refresh_config()
+        plans = self.scheduler.next_plans()
+
+        started = time.monotonic()
+        gateways: Dict[str, List[DeviceReadPlan]] = {}
+        for name, plan in plans.items():
+            if not plan.blocks:
+                continue
+            if not self.breakers.allow(name):
+                # device ถูกพักไว้ - ไม่ส่ง request จนกว่าจะถึงเวลาทดสอบ
+                self.device_values.pop(name, None)
+                self._set_status(name, "down", error=self.breakers.get_stats().get(name, {}).get("last_error"))
+                continue
+            key = self.connection_manager.gateway_key(plan.host, plan.port)
+            gateways.setdefault(key, []).append(plan)
+
+        # 1 task ต่อ gateway: unit ทุกตัวหลัง gateway เดียวกันใช้ socket เดียว ส่ง request ทีละตัวตามลำดับ
+        outcomes: Dict[str, Tuple[str, object]] = {}
+        tasks = [
+            asyncio.create_task(self._poll_gateway(gateway_plans, outcomes), name=f"modbus:{key}")
+            for key, gateway_plans in gateways.items()
+        ]
+        if tasks:
+            done, pending = await asyncio.wait(tasks, timeout=self._cycle_timeout(gateways))
+            for task in pending:
+                # เกินเวลาของรอบนี้ - ยกเลิกจริงและปิด socket ที่อาจมี response ค้างอยู่
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        results: Dict[str, Dict] = {}
+        for key, gateway_plans in gateways.items():
+            timed_out = False
+            for plan in gateway_plans:
+                name = plan.device
+                outcome, payload = outcomes.get(name, ("timeout", None))
+                if outcome == "ok":
+                    self.breakers.record_success(name)
+                    results[name] = payload
+                    self.device_values.setdefault(name, {}).update(payload)
+                    self._set_status(name, "ok")
+                    continue
+
+                # device อ่านไม่ได้ - ไม่ใช้ค่าเก่าของ device นี้ต่อ
+                self.device_values.pop(name, None)
+                if outcome == "timeout":
+                    timed_out = True
+                    payload = f"poll exceeded {self._cycle_timeout(gateways):.2f}s"
+                self.breakers.record_failure(name, str(payload))
+                self._set_status(name, outcome, error=str(payload))
+            if timed_out:
+                self.connection_manager.reset_async_client(gateway_plans[0].host, gateway_plans[0].port)
+
+        data = self._merge(self.device_values)
+        self.changes = self.deadband.filter(data)
+        if self.changes:
+            self.change_seq += 1
+        self.last_cycle = {
+            "duration_ms": round((time.monotonic() - started) * 1000, 1),
+            "devices": sum(len(p) for p in gateways.values()),
+            "gateways": len(gateways),
+            "devices_ok": len(results),
+            "changed": len(self.changes),
+            "blocks": sum(len(self._blocks(plan)) for plan in plans.values()),
+        }
+        return data if data else None
+
+    def refresh_config(self) -> ConfigSnapshot:
+        """ใช้ config snapshot ล่าสุด - รอบปกติแค่เทียบว่าเป็น snapshot เดิมหรือไม่"""
+        config = self.modbus_data_service.config_snapshot()
+        if config is not self.config:
+            if self.scheduler.update(config.devices, config.mappings, config.read_plans):
+                self.device_values = {}
+            self.deadband.update(config.mappings)
+            self.split_blocks.clear()
+            gateways: Dict[str, List] = {}
+            for device in config.devices:
+                gateways.setdefault(self.connection_manager.gateway_key(device.host, device.port), []).append(device)
+            self.pipeline_gateways = {
+                key: tuple(d.name for d in devices)
+                for key, devices in gateways.items() if all(d.pipeline > 1 for d in devices)
+            }
+            self.config = config
+        return config
+
+    async def _poll_gateway(self, plans: List[DeviceReadPlan], outcomes: Dict[str, Tuple[str, object]]):
+        """อ่านทุก unit หลัง gateway เดียวกันทีละตัว บันทึกผลลง outcomes ทันทีที่แต่ละ unit เสร็จ
+
+        unit ที่มี block น้อยอ่านก่อน (shortest job first) เพื่อให้ unit ส่วนใหญ่เสร็จทันรอบ
+        แม้จะมี unit ที่ช้าอยู่หลัง gateway เดียวกัน
+        """
+        for plan in sorted(plans, key=lambda p: (len(self._blocks(p)), p.unit)):
+            try:
+                # ผ่าน actor ของ device - ไม่ชนกับ status/alarm หรือการอ่านจาก API ที่ device เดียวกัน
+                data = await self.actors.submit(
+                    plan.device, ("poll", id(plan)), partial(self._poll_device, plan), PRIORITY_POLL
+                )
+                outcomes[plan.device] = ("ok", data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                outcomes[plan.device] = ("error", e)
+
+    async def _poll_device(self, plan: DeviceReadPlan) -> Dict:
+        """อ่านทุก block ของ device หนึ่งตัว (request ใน gateway เดียวกันทำทีละตัว)"""
+        if self._use_pipeline(plan):
+            try:
+                return await self._poll_device_pipelined(plan)
+            except PipelineError as e:
+                # response จับคู่ไม่ได้ = device ไม่รองรับ pipelining จริง - อ่านรอบนี้ใหม่แบบทีละ request
+                self._fall_back(plan, e)
+            except (asyncio.TimeoutError, ConnectionError) as e:
+                # frame หายครั้งเดียวยังไม่เลิก pipelining - อ่านรอบนี้ใหม่แบบทีละ request
+                # response ที่มาช้าอาจปนกับ request ถัดไป จึงเปิด socket ใหม่
+                self.connection_manager.reset_pipelined_client(plan.host, plan.port)
+                timeouts = self.pipeline_timeouts[plan.device] = self.pipeline_timeouts.get(plan.device, 0) + 1
+                if timeouts >= self.pipeline_fallback_timeouts:
+                    self._fall_back(plan, e)
+
+        data = {}
+        async with self.connection_manager.async_lock(plan.host, plan.port):
+            client = await self._get_client(plan)
+
+            pending = list(self._blocks(plan))
+            completed = []
+            while pending:
+                block = pending.pop(0)
+                result, client = await self._request(plan, client, block)
+
+                if isinstance(result, ExceptionResponse) and result.exception_code == ILLEGAL_DATA_ADDRESS:
+                    halves = self.modbus_data_service.read_plan_service.split_block(plan.device, block)
+                    if len(halves) > 1:
+                        pending[0:0] = halves
+                        continue
+                completed.append(block)
+                if result.isError() or len(result.registers) < block.count:
+                    logger.warning(f"Error reading block {block.start}+{block.count} from {plan.device}: {result}")
+                    continue
+                self.register_cache.store(plan.device, block.start, result.registers[:block.count])
+                data.update(self.modbus_data_service._decode_block(block, result.registers))
+
+            self._learn_blocks(plan, completed)
+        return data
+
+    def _blocks(self, plan: DeviceReadPlan) -> List[ReadBlock]:
+        return self.split_blocks.get(id(plan), plan.blocks)
+
+    def _learn_blocks(self, plan: DeviceReadPlan, completed: List[ReadBlock]):
+        """จำ block ที่ถูกแบ่งในรอบนี้ไว้ใช้รอบถัดไป"""
+        if len(completed) != len(self._blocks(plan)):
+            self.split_blocks[id(plan)] = sorted(completed, key=lambda b: b.start)
+
+    def _use_pipeline(self, plan: DeviceReadPlan) -> bool:
+        if plan.pipeline <= 1 or len(self._blocks(plan)) <= 1:
+            return False
+        fallback = self.pipeline_fallback.get(plan.device)
+        return fallback is None or time.monotonic() >= fallback["until"]
+
+    def _pipeline_only(self, plan: DeviceReadPlan) -> bool:
+        """ทุก device ของ gateway นี้ใช้ pipelining อยู่ (ไม่มีตัวที่ fallback ค้าง) - ไม่ต้องมี async client"""
+        if not self.pipeline_gateways:
+            return False
+        devices = self.pipeline_gateways.get(self.connection_manager.gateway_key(plan.host, plan.port))
+        if not devices:
+            return False
+        now = time.monotonic()
+        return all(self.pipeline_fallback.get(name, {}).get("until", 0.0) <= now for name in devices)
+
+    def _fall_back(self, plan: DeviceReadPlan, error: Exception):
+        self.connection_manager.reset_pipelined_client(plan.host, plan.port)
+        self.pipeline_timeouts.pop(plan.device, None)
+        fallback = self.pipeline_fallback.setdefault(plan.device, {"count": 0})
+        fallback.update(until=time.monotonic() + self.pipeline_retry_after, reason=str(error) or type(error).__name__)
+        fallback["count"] += 1
+        logger.warning(f"Pipelining disabled for {plan.device} for {self.pipeline_retry_after:.0f}s: {fallback['reason']}")
+
+    async def _poll_device_pipelined(self, plan: DeviceReadPlan) -> Dict:
+        """ส่งทุก block ของ device ค้างไว้ได้ครั้งละไม่เกิน plan.pipeline request บน socket เดียว
+
+        block ที่ได้ illegal address ถูกแบ่งครึ่งแล้วส่งใหม่ในรอบถัดไปของ loop เหมือนแบบทีละ request
+        timeout (นับใน RTT ก่อนส่งต่อ) หรือ response ที่จับคู่ไม่ได้ ส่งต่อให้ผู้เรียกตัดสินว่าจะ fallback หรือไม่
+        """
+        client = await self.connection_manager.get_pipelined_client(
+            plan.host, plan.port, unit=plan.unit, reclaim_async=self._pipeline_only(plan)
+        )
+        window = asyncio.Semaphore(plan.pipeline)
+        timeout = self.rtt.timeout_for(plan.device)
+
+        async def read(block: ReadBlock):
+            async with window:
+                sent = time.monotonic()
+                try:
+                    registers = await asyncio.wait_for(
+                        client.read_registers(plan.unit, block.start, block.count), timeout=timeout
+                    )
+                except ModbusExceptionResult as e:
+                    return block, None, e
+                except (asyncio.TimeoutError, asyncio.CancelledError):
+                    self.rtt.observe_timeout(plan.device)
+                    raise
+                self.rtt.observe(plan.device, time.monotonic() - sent)
+                return block, registers, None
+
+        data = {}
+        pending = list(self._blocks(plan))
+        completed = []
+        while pending:
+            results = await asyncio.gather(*(read(block) for block in pending))
+            pending = []
+            for block, registers, error in results:
+                if error is not None and error.exception_code == ILLEGAL_DATA_ADDRESS:
+                    halves = self.modbus_data_service.read_plan_service.split_block(plan.device, block)
+                    if len(halves) > 1:
+                        pending.extend(halves)
+                        continue
+                completed.append(block)
+                if error is not None:
+                    logger.warning(f"Error reading block {block.start}+{block.count} from {plan.device}: {error}")
+                    continue
+                self.register_cache.store(plan.device, block.start, registers)
+                data.update(self.modbus_data_service._decode_block(block, registers))
+
+        self._learn_blocks(plan, completed)
+        self.pipeline_fallback.pop(plan.device, None)
+        self.pipeline_timeouts.pop(plan.device, None)
+        return data
+
+    async def _request(self, plan: DeviceReadPlan, client, block: ReadBlock):
+        """ส่ง 1 request ด้วย timeout ของ device นี้ ลองซ้ำตาม retry budget เมื่อ timeout"""
+        attempt = 0
+        while True:
+            timeout = self.rtt.timeout_for(plan.device)
+            sent = time.monotonic()
+            try:
+                result = await asyncio.wait_for(
+                    client.read_holding_registers(block.start, block.count, slave=plan.unit),
+                    timeout=timeout,
+                )
+            except asyncio.TimeoutError:
+                self.rtt.observe_timeout(plan.device)
+                # response อาจมาช้ากว่า timeout - ปิด socket เพื่อไม่ให้ไปปนกับ request ถัดไป
+                self.connection_manager.reset_async_client(plan.host, plan.port)
+                if attempt >= self.rtt.retry_budget(plan.device):
+                    raise TimeoutError(f"Block {block.start}+{block.count} timed out after {timeout:.3f}s")
+                attempt += 1
+                client = await self._get_client(plan)
+                continue
+            except asyncio.CancelledError:
+                # รอบ poll หมดเวลาก่อน response มา - นับเป็น timeout เพื่อให้ timeout รอบหน้ายาวขึ้น
+                self.rtt.observe_timeout(plan.device)
+                raise
+            self.rtt.observe(plan.device, time.monotonic() - sent)
+            return result, client
+
+    async def _get_client(self, plan: DeviceReadPlan):
+        # timeout ของ pymodbus ตั้งไว้สูงสุด - timeout จริงของแต่ละ request คุมด้วย wait_for
+        return await self.connection_manager.get_async_client(
+            plan.host, plan.port, self.rtt.max_timeout, unit=plan.unit
+        )
+
+    def _cycle_timeout(self, gateways: Dict[str, List[DeviceReadPlan]]) -> float:
+        """เวลาสูงสุดของรอบนี้: อย่างน้อย poll_timeout และขยายให้ gateway ที่ช้าได้ไม่เกิน 1 tick"""
+        budget = max(
+            (sum(len(self._blocks(plan)) * self.rtt.timeout_for(plan.device) for plan in plans)
+             for plans in gateways.values()),
+            default=0.0,
+        ) * self.CYCLE_MARGIN
+        return min(max(self.poll_timeout, budget), max(self.poll_interval, self.poll_timeout))
+
+    def _merge(self, results: Dict[str, Dict]) -> Dict:
+        return merge_device_values(results)
+
+    def _set_status(self, device_name: str, status: str, error: Optional[str] = None):
+        self.device_status[device_name] = {
+            "status": status,
+            "error": error,
+            "updated_at": time.time(),
+        }
+
+    def get_stats(self) -> Dict:
+        return {
+            "poll_interval": self.poll_interval,
+            "last_cycle": self.last_cycle,
+            "devices": self.device_status,
+            "timeouts": self.rtt.get_stats(),
+            "deadband": self.deadband.get_stats(),
+            "pipeline_fallback": {
+                name: {"reason": f["reason"], "count": f["count"],
+                       "retry_in": round(max(f["until"] - time.monotonic(), 0.0), 1)}
+                for name, f in self.pipeline_fallback.items()
+            },
+            "pipeline_timeouts": dict(self.pipeline_timeouts),
+        }
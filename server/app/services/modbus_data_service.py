@@ -1,17 +1,36 @@
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Tuple, Optional
 from app.services.modbus_service import ModbusService
 from app.services.config_service import ConfigService
+from app.services.read_plan_service import ReadPlanService, REGISTER_WIDTH
 from app.domain.data_model import DataPoint, StackData, DataResponse
+from app.domain.read_plan_model import ReadBlock
+from app.services.register_decoder import decode_block, decode_value
+from app.services.config_snapshot_service import ConfigSnapshotService, ConfigSnapshot
+from app.infrastructure.circuit_breaker import CircuitBreakerRegistry, device_breakers
+from app.services.device_actor import device_actors, PRIORITY_POLL, PRIORITY_STATUS, PRIORITY_ON_DEMAND
+from pymodbus.pdu import ExceptionResponse
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Modbus exception code 0x02 - อ่านช่วง address ที่ device ไม่รองรับ
+ILLEGAL_DATA_ADDRESS = 2
+
 class ModbusDataService:
-    def __init__(self, config_service=None):
-        self.modbus_service = ModbusService()
+    def __init__(self, config_service=None, modbus_service: ModbusService = None,
+                 breakers: CircuitBreakerRegistry = None):
+        self.modbus_service = modbus_service or ModbusService()
+        self.breakers = breakers or device_breakers
+        self.register_cache = self.modbus_service.register_cache
         self.config_service = config_service or ConfigService()
         self.device_configs = {}  # จะถูกโหลดจาก Config
+        self.read_plan_service = ReadPlanService()
+        self.config_snapshots = ConfigSnapshotService(self.config_service, self.read_plan_service)
+        self.config: Optional[ConfigSnapshot] = None
+        self.read_plans = {}  # device_name -> DeviceReadPlan (จาก config snapshot)
+        self._split_blocks = {}  # device_name -> [ReadBlock] หลังแบ่งที่ขอบ illegal address (ไม่แก้ plan ใน snapshot)
+        self._coil_blocks = {}  # (device_name, addresses) -> [ReadBlock]
         self.connected_devices = set()
         
         # เพิ่ม cache เพื่อลดการอ่าน Modbus ซ้ำ
@@ -23,47 +42,32 @@ class ModbusDataService:
         self._load_configs()
 
     def _load_configs(self):
-        """โหลดการตั้งค่า devices และ mappings จาก ConfigService"""
+        """ใช้ config snapshot ล่าสุด - build ใหม่เฉพาะเมื่อ ConfigService.version เปลี่ยน"""
         try:
-            devices = self.config_service.get_devices()
-            mappings = self.config_service.get_mappings()
-            
-            # เปิด debug log เพื่อดูการโหลด config
-            print(f"DEBUG: Loaded {len(devices)} devices: {[d.name for d in devices]}")
-            print(f"DEBUG: Loaded {len(mappings)} mappings: {[m.name for m in mappings]}")
-            
-            # สร้าง device_configs จาก devices และ mappings
-            self.device_configs = {}
-            
-            for device in devices:
-                device_id = device.name  # ใช้ device.name เป็น device_id
-
-                # หา mappings ที่เกี่ยวข้องกับ device นี้
-                device_mappings = {}
-                for mapping in mappings:
-                    if mapping.device == device.name:
-                         device_mappings[mapping.name] = {
-                             "address": mapping.address,
-                             "dataType": mapping.dataType,
-                             "endian": "big"  # default
-                                }
-                
-                self.device_configs[device_id] = {
-                    "host": device.host,
-                    "port": device.port,
-                    "unit": device.unit,
-                    "mappings": device_mappings
-                }
-                
-            logger.info(f"Loaded {len(self.device_configs)} device configurations")
-            
+            snapshot = self.config_snapshots.current()
         except Exception as e:
             logger.error(f"Failed to load configs: {e}")
             self.device_configs = {}
+            self.read_plans = {}
+            return None
+
+        if snapshot is not self.config:
+            self.config = snapshot
+            self.device_configs = snapshot.device_configs
+            self.read_plans = snapshot.read_plans
+            self._split_blocks = {}  # snapshot ใหม่ compile จุดแบ่งที่เรียนรู้ไว้แล้ว
+            logger.info(f"Loaded {len(self.device_configs)} device configurations (config v{snapshot.version})")
+        return snapshot
+
+    def config_snapshot(self) -> ConfigSnapshot:
+        """config snapshot ปัจจุบัน (ตรวจ version ก่อนคืน)"""
+        return self._load_configs() or self.config
 
     def reload_configs(self):
         """โหลดการตั้งค่าใหม่ (เรียกใช้เมื่อมีการอัพเดท Config)"""
+        self.config_snapshots.invalidate()
         self._load_configs()
+        self.register_cache.clear()
         # ตัดการเชื่อมต่อทั้งหมดเพื่อเชื่อมต่อใหม่
         self.connected_devices.clear()
 
@@ -92,7 +96,26 @@ class ModbusDataService:
             self.connected_devices.discard(device_id)
         return success
 
+    def cached_parameter(self, device_id: str, parameter: str, max_age: float) -> Optional[Tuple[float, float]]:
+        """ค่าจาก register cache ถ้าอ่านมาไม่เกิน max_age วินาที - คืน (value, อายุ) หรือ None"""
+        self._load_configs()
+        mapping = self.device_configs.get(device_id, {}).get("mappings", {}).get(parameter)
+        if mapping is None or mapping["dataType"] not in REGISTER_WIDTH:
+            return None
+        hit = self.register_cache.lookup(device_id, mapping["address"], REGISTER_WIDTH[mapping["dataType"]], max_age)
+        if hit is None:
+            return None
+        registers, age = hit
+        word_order = "AB CD" if mapping.get("endian", "big") == "big" else "CD AB"
+        return decode_value(registers, mapping["dataType"], word_order), age
+
     def read_parameter(self, device_id: str, parameter: str) -> Optional[float]:
+        """อ่าน parameter เดียว (ผ่าน actor ของ device - request ซ้ำที่ค้างอยู่ถูกรวมเป็นครั้งเดียว)"""
+        return device_actors.call(
+            device_id, ("read", parameter), lambda: self._read_parameter(device_id, parameter), PRIORITY_ON_DEMAND
+        )
+
+    def _read_parameter(self, device_id: str, parameter: str) -> Optional[float]:
         # ลด debug logs - แสดงเฉพาะเมื่อมี error
         # print(f"Reading parameter {parameter} from device {device_id}")
         
@@ -195,25 +218,30 @@ class ModbusDataService:
     def get_data_from_devices(self) -> Dict:
         """ดึงข้อมูลจากอุปกรณ์ Modbus ทั้งหมด"""
         try:
-            # โหลด configs ก่อนเสมอ
+            # ตรวจ version ของ config (build ใหม่เฉพาะเมื่อเปลี่ยน)
             self._load_configs()
             
             data = {}
             
             # ดึงข้อมูลจากแต่ละ device
             for device_name, device_config in self.device_configs.items():
+                if not self.breakers.allow(device_name):
+                    # device ถูกพักไว้ - ข้ามโดยไม่รอ timeout
+                    continue
                 try:
-                    # เชื่อมต่อ Modbus
-                    success = self.modbus_service.connect_device(
-                        device_name, 
-                        device_config['host'], 
-                        device_config['port'], 
-                        device_config['unit']
-                    )
+                    # ลงทะเบียน device ครั้งแรก/เมื่อ host เปลี่ยน (socket ใช้ร่วมกันที่ connection manager)
+                    target = {
+                        "host": device_config['host'],
+                        "port": device_config['port'],
+                        "unit": device_config['unit'],
+                    }
+                    success = self.modbus_service.devices.get(device_name) == target or self.connect_device(device_name)
                     if success:
                         # ดึงข้อมูลตาม mapping
-                        client = self.modbus_service.get_client(device_name)
-                        device_data = self._read_device_data(client, device_name)
+                        device_data = device_actors.call(
+                            device_name, ("poll-sync",), lambda: self._read_device(device_name), PRIORITY_POLL
+                        )
+                        self.breakers.record_success(device_name)
                         
                         # รวมข้อมูลเข้าด้วยกัน (ไม่เขียนทับ)
                         for key, value in device_data.items():
@@ -227,9 +255,10 @@ class ModbusDataService:
                         # เปิด debug log เพื่อดูข้อมูลที่อ่านได้
                         print(f"DEBUG: Read data from {device_name}: {device_data}")
                     else:
+                        self.breakers.record_failure(device_name, "connect failed")
                         print(f"DEBUG: Failed to connect to {device_name}")
-                        pass
                 except Exception as e:
+                    self.breakers.record_failure(device_name, str(e))
                     # ไม่แสดง error log เมื่อ device ไม่เชื่อมต่อได้ (ยังไม่ได้เปิด Modbus)
                     if "No connection could be made" not in str(e):
                         print(f"DEBUG: Error reading from {device_name}: {e}")
@@ -244,55 +273,71 @@ class ModbusDataService:
                 print(f"DEBUG: Error in get_data_from_devices: {e}")
             return None
 
+    def _read_device(self, device_name: str) -> Dict:
+        with self.modbus_service.lease(device_name) as client:
+            return self._read_device_data(client, device_name)
+
     def _read_device_data(self, client, device_name: str) -> Dict:
-        """อ่านข้อมูลจาก device หนึ่งตัว"""
+        """อ่านข้อมูลจาก device หนึ่งตัวตาม read plan (1 request ต่อ block)"""
         data = {}
-        
-        # หา mappings สำหรับ device นี้
-        device_mappings = [m for m in self.config_service.get_mappings() if m.device == device_name]
-        
-        for mapping in device_mappings:
+
+        plan = self.read_plans.get(device_name)
+        if not plan:
+            return data
+
+        blocks = self._split_blocks.get(device_name, plan.blocks)
+        pending = list(blocks)
+        completed = []
+        while pending:
+            block = pending.pop(0)
             try:
-                # อ่านข้อมูลจาก Modbus (เป็น float32 ตาม format AB CD)
-                result = client.read_holding_registers(mapping.address, 2)  # อ่าน 2 registers สำหรับ float32
-                if result.registers and len(result.registers) >= 2:
-                    # แปลงเป็น float32 ตาม format AB CD
-                    value = self._registers_to_float32(result.registers, mapping.format)
-                    data[mapping.name] = value
-                    # เปิด debug log เพื่อดูข้อมูลที่อ่านได้
-                    print(f"DEBUG: Read {mapping.name} from address {mapping.address}: {result.registers} -> {value}")
-                            
+                result = client.read_holding_registers(block.start, block.count, slave=plan.unit)
+                if isinstance(result, ExceptionResponse) and result.exception_code == ILLEGAL_DATA_ADDRESS:
+                    halves = self.read_plan_service.split_block(device_name, block)
+                    if len(halves) > 1:
+                        # device ไม่รองรับช่วงนี้ทั้งก้อน - แบ่งครึ่งแล้วอ่านใหม่ใน poll เดียวกัน
+                        pending[0:0] = halves
+                        continue
+                if result.isError() or not result.registers or len(result.registers) < block.count:
+                    print(f"DEBUG: Error reading block {block.start}+{block.count} from {device_name}: {result}")
+                    completed.append(block)
+                    continue
+
+                data.update(self._decode_block(block, result.registers))
+                completed.append(block)
             except Exception as e:
-                print(f"DEBUG: Error reading {mapping.name} from {device_name}: {e}")
-        
+                print(f"DEBUG: Error reading block {block.start}+{block.count} from {device_name}: {e}")
+                # timeout/frame เสีย - ให้เปิด socket ใหม่ใน poll ถัดไป
+                self.modbus_service.invalidate(client)
+                completed.append(block)
+
+        # จำ block ที่ถูกแบ่งไว้ใช้รอบถัดไปจนกว่า config snapshot จะเปลี่ยน
+        if len(completed) != len(blocks):
+            self._split_blocks[device_name] = sorted(completed, key=lambda b: b.start)
         return data
 
-    def _registers_to_float32(self, registers: List[int], format: str) -> float:
-        """แปลง registers เป็น float32 ตาม format AB CD"""
-        try:
-            if len(registers) == 2:
-                # แปลงจาก 2 registers (AB CD format)
-                if format == "AB CD":
-                    # Big-endian: AB = registers[0], CD = registers[1]
-                    combined = (registers[0] << 16) | registers[1]
-                else:
-                    # Little-endian: CD = registers[0], AB = registers[1]
-                    combined = (registers[1] << 16) | registers[0]
-                
-                # แปลงเป็น float32
-                import struct
-                # ใช้ big-endian format
-                float_bytes = struct.pack('>I', combined)
-                value = struct.unpack('>f', float_bytes)[0]
-                return value
-            else:
-                return 0.0
-        except Exception as e:
-            print(f"DEBUG: Error converting registers to float32: {e}")
-            return 0.0
+    def _decode_block(self, block: ReadBlock, registers: List[int]) -> Dict:
+        """แปลง registers ของทั้ง block เป็นค่าของแต่ละ mapping"""
+        return decode_block(block, registers)
+
+    def get_read_plan_summary(self) -> Dict:
+        """สรุป read plan ของทุก device และจำนวน round trip ที่ลดได้"""
+        return self.read_plan_service.summarize(self.read_plans)
 
-    def test_connection(self, device_name: str) -> Dict:
-        """ทดสอบการเชื่อมต่อกับ device ตามชื่อ"""
+    def test_connection(self, device_name: str, max_age: Optional[float] = None) -> Dict:
+        """ทดสอบการเชื่อมต่อกับ device ตามชื่อ
+
+        max_age: ถ้า device ตอบ (จาก acquisition หรือการทดสอบก่อนหน้า) ภายในกี่วินาที ให้ถือว่าผ่านโดยไม่ส่ง request
+        """
+        if max_age is not None:
+            age = self.register_cache.last_seen_age(device_name)
+            if age is not None and age <= max_age:
+                return {
+                    "success": True,
+                    "message": f"Device responded {age:.1f}s ago",
+                    "cached": True,
+                    "age": round(age, 3),
+                }
         try:
             # หา device ที่มีชื่อตรงกัน
             devices = self.config_service.get_devices()
@@ -309,13 +354,19 @@ class ModbusDataService:
                     "message": f"Device '{device_name}' not found in configuration"
                 }
             
-            # ทดสอบการเชื่อมต่อ
-            result = self.modbus_service.test_connection(
-                host=target_device.host,
-                port=target_device.port,
-                unit=target_device.unit
+            # ทดสอบการเชื่อมต่อ (ผ่าน actor ของ device)
+            result = device_actors.call(
+                device_name,
+                ("test",),
+                lambda: self.modbus_service.test_connection(
+                    host=target_device.host,
+                    port=target_device.port,
+                    unit=target_device.unit
+                ),
+                PRIORITY_ON_DEMAND,
             )
-            
+            if result.get("success"):
+                self.register_cache.mark_seen(device_name)
             return result
             
         except Exception as e:
@@ -324,46 +375,91 @@ class ModbusDataService:
                 "message": f"Connection test error: {str(e)}"
             }
 
-    def read_coil_status(self, device_name: str, address: int) -> int:
-        max_retries = 3
-        retry_delay = 1  # seconds
-        
-        for attempt in range(max_retries):
-            try:
-                device = self.config_service.get_device_by_name(device_name)
-                if not device:
-                    raise Exception(f"Device '{device_name}' not found")
-                
-                # เชื่อมต่อ Modbus
-                device_id = f"{device.host}:{device.port}"
-                client = self.modbus_service.get_client(device_id)
-                if not client:
-                    success = self.modbus_service.connect_device(device_id, device.host, device.port, device.unit)
-                    if success:
-                        client = self.modbus_service.get_client(device_id)
-                    else:
-                        raise Exception(f"Failed to connect to device {device_id}")
-                
-                if not client:
-                    raise Exception(f"No client available for device {device_id}")
-                
-                # อ่านค่า coil status พร้อม timeout (เปลี่ยนจาก discrete inputs เป็น coils)
-                result = client.read_coils(address, 1, unit=device.unit)
-                
+    def read_coil_bitmap(self, device_name: str, addresses: List[int]) -> Tuple[int, int, int]:
+        """อ่าน coil หลาย address ของ device ด้วย read_coils 1 ครั้งต่อ block บน socket ที่เปิดค้างไว้
+
+        คืน (base, values, valid) - bit i ของ values คือค่า coil ที่ address base + i
+        และ bit i ของ valid บอกว่าอ่าน coil นั้นได้หรือไม่
+        """
+        device = self.config_service.get_device_by_name(device_name)
+        if not device:
+            raise Exception(f"Device '{device_name}' not found")
+        if not addresses:
+            return 0, 0, 0
+
+        key = (device_name, device.host, device.port, device.unit, tuple(sorted(set(addresses))))
+        blocks = self._coil_blocks.get(key)
+        if blocks is None:
+            blocks = self.read_plan_service.compile_coils(device_name, addresses)
+
+        self.breakers.check(device_name)
+        try:
+            result = device_actors.call(
+                device_name, ("coils", key), lambda: self._read_coil_blocks(device, key, blocks, min(addresses)),
+                PRIORITY_STATUS,
+            )
+        except Exception as e:
+            self.breakers.record_failure(device_name, str(e))
+            raise
+        self.breakers.record_success(device_name)
+        return result
+
+    def _read_coil_blocks(self, device, key: Tuple, blocks: List[ReadBlock], base: int) -> Tuple[int, int, int]:
+        device_name = device.name
+        values = valid = 0
+        with self.modbus_service.connection_manager.lease(device.host, device.port, device.unit) as client:
+            pending = list(blocks)
+            completed = []
+            while pending:
+                block = pending.pop(0)
+                result = client.read_coils(block.start, block.count, slave=device.unit)
+
+                if isinstance(result, ExceptionResponse) and result.exception_code == ILLEGAL_DATA_ADDRESS:
+                    halves = self.read_plan_service.split_block(self.read_plan_service.coil_key(device_name), block)
+                    if len(halves) > 1:
+                        pending[0:0] = halves
+                        continue
+                completed.append(block)
                 if result.isError():
-                    raise Exception(f"Modbus read error: {result}")
-                
-                # คืนค่า 0 หรือ 1
-                return 1 if result.bits[0] else 0
-                
-            except Exception as e:
-                print(f"Attempt {attempt + 1}/{max_retries} - Error reading coil status from {device_name} address {address}: {e}")
-                
-                if attempt < max_retries - 1:
-                    print(f"Retrying in {retry_delay} seconds...")
-                    import time
-                    time.sleep(retry_delay)
-                    retry_delay *= 2  # Exponential backoff
-                else:
-                    print(f"All {max_retries} attempts failed")
-                    raise e
\ No newline at end of file
+                    logger.warning(f"Error reading coils {block.start}+{block.count} from {device_name}: {result}")
+                    continue
+
+                mask = 0
+                for i, bit in enumerate(result.bits[:block.count]):
+                    if bit:
+                        mask |= 1 << i
+                shift = block.start - base
+                values |= mask << shift
+                for channel in block.channels:
+                    valid |= 1 << (channel.address - base)
+
+        self._coil_blocks[key] = sorted(completed, key=lambda b: b.start)
+        return base, values, valid
+
+    def read_coil_status(self, device_name: str, address: int) -> int:
+        """อ่าน coil 1 ตัว - device ที่ถูกพักไว้จะ raise CircuitOpenError ทันทีแทนการ retry"""
+        device = self.config_service.get_device_by_name(device_name)
+        if not device:
+            raise Exception(f"Device '{device_name}' not found")
+
+        self.breakers.check(device_name)
+        try:
+            # ยืม socket ของ gateway จาก connection manager (ใน thread ของ actor)
+            result = device_actors.call(
+                device_name, ("coil", address), lambda: self._read_coil(device, address), PRIORITY_STATUS
+            )
+        except Exception as e:
+            self.breakers.record_failure(device_name, str(e))
+            raise
+        # device ตอบกลับ (แม้เป็น exception response) ถือว่ายังติดต่อได้
+        self.breakers.record_success(device_name)
+
+        if result.isError():
+            raise Exception(f"Modbus read error: {result}")
+
+        # คืนค่า 0 หรือ 1
+        return 1 if result.bits[0] else 0
+
+    def _read_coil(self, device, address: int):
+        with self.modbus_service.connection_manager.lease(device.host, device.port, device.unit) as client:
+            return client.read_coils(address, 1, slave=device.unit)
@@ -1,64 +1,78 @@
 from pymodbus.client import ModbusTcpClient
 from pymodbus.exceptions import ModbusException
-import struct
+from app.infrastructure.modbus_connection_manager import ModbusConnectionManager, modbus_connection_manager
+from app.services.register_decoder import decode_value
+from app.services.register_cache import RegisterCache, register_cache
+from contextlib import contextmanager
 import logging
 from typing import Optional, List, Dict
 
 logger = logging.getLogger(__name__)
 
 class ModbusService:
-    def __init__(self):
-        self.clients: Dict[str, ModbusTcpClient] = {}
+    def __init__(self, connection_manager: ModbusConnectionManager = None, cache: RegisterCache = None):
+        # socket จริงอยู่ที่ connection manager (ใช้ร่วมกันทั้ง process)
+        self.connection_manager = connection_manager or modbus_connection_manager
+        self.register_cache = cache or register_cache
+        self.devices: Dict[str, Dict] = {}  # device_id -> {"host", "port", "unit"}
         self.connections: Dict[str, bool] = {}
 
     def connect_device(self, device_id: str, host: str, port: int, unit: int) -> bool:
-        """เชื่อมต่อกับ Modbus device"""
+        """ลงทะเบียน device และตรวจว่าเชื่อมต่อ gateway ได้ (ใช้ socket เดิมถ้ามี)"""
+        self.devices[device_id] = {"host": host, "port": port, "unit": unit}
         try:
-            client = ModbusTcpClient(host=host, port=port)
-            if client.connect():
-                self.clients[device_id] = client
-                self.connections[device_id] = True
-                logger.info(f"Connected to device {device_id} at {host}:{port}")
-                return True
-            else:
-                logger.error(f"Failed to connect to device {device_id}")
-                return False
+            with self.connection_manager.lease(host, port, unit):
+                pass
+            self.connections[device_id] = True
+            return True
         except Exception as e:
             logger.error(f"Connection error for device {device_id}: {e}")
+            self.connections[device_id] = False
             return False
 
     def disconnect_device(self, device_id: str) -> bool:
-        """ตัดการเชื่อมต่อกับ device"""
-        try:
-            if device_id in self.clients:
-                self.clients[device_id].close()
-                del self.clients[device_id]
-                self.connections[device_id] = False
-                logger.info(f"Disconnected from device {device_id}")
-                return True
-            return False
-        except Exception as e:
-            logger.error(f"Disconnect error for device {device_id}: {e}")
-            return False
+        """เลิกใช้ device (socket ยังเปิดค้างไว้ที่ connection manager ให้ตัวอื่นใช้ต่อ)"""
+        if device_id in self.devices:
+            del self.devices[device_id]
+            self.connections[device_id] = False
+            logger.info(f"Disconnected from device {device_id}")
+            return True
+        return False
     
     def is_connected(self, device_id: str) -> bool:
         """ตรวจสอบสถานะการเชื่อมต่อ"""
         return self.connections.get(device_id, False)
 
-    def read_register(self, device_id: str, address: int, count: int = 1, unit: int = 1) -> Optional[List[int]]:
+    @contextmanager
+    def lease(self, device_id: str):
+        """ยืม client ของ device จาก connection manager"""
+        device = self.devices.get(device_id)
+        if device is None:
+            raise ConnectionError(f"Device {device_id} not connected")
+        with self.connection_manager.lease(device["host"], device["port"], device["unit"]) as client:
+            yield client
+
+    def invalidate(self, client: ModbusTcpClient):
+        """ให้ connection manager เปิด socket ใหม่แทน client ที่มีปัญหา"""
+        self.connection_manager.invalidate(client)
+
+    def read_register(self, device_id: str, address: int, count: int = 1, unit: int = None) -> Optional[List[int]]:
         """อ่าน holding registers"""
         try:
-            if device_id not in self.clients:
+            if device_id not in self.devices:
                 logger.error(f"Device {device_id} not connected")
                 return None
-                
-            client = self.clients[device_id]
-            result = client.read_holding_registers(address=address, count=count, unit=unit)
+
+            unit = unit if unit is not None else self.devices[device_id]["unit"]
+            with self.lease(device_id) as client:
+                result = client.read_holding_registers(address=address, count=count, slave=unit)
             
             if result.isError():
                 logger.error(f"Modbus error reading register {address}: {result}")
                 return None
-                
+
+            # ค่าที่อ่านสด ๆ ใช้ตอบ request ถัดไปที่ยอมรับค่าเก่าได้
+            self.register_cache.store(device_id, address, result.registers[:count])
             return result.registers
             
         except ModbusException as e:
@@ -75,16 +89,8 @@ class ModbusService:
             if registers is None or len(registers) < 2:
                 return None
                 
-            # แปลง registers เป็น bytes
-            if endian == "big":
-                # Big Endian: register1 (high) + register2 (low)
-                data = struct.pack("!HH", registers[0], registers[1])
-            else:
-                # Little Endian: register2 (low) + register1 (high)
-                data = struct.pack("!HH", registers[1], registers[0])
-            
-            # แปลง bytes เป็น float
-            return struct.unpack("!f", data)[0]
+            # big = AB CD (register แรกเป็น word สูง), little = CD AB
+            return decode_value(registers, "float32", "AB CD" if endian == "big" else "CD AB")
             
         except Exception as e:
             logger.error(f"Error reading float32 at address {address}: {e}")
@@ -97,12 +103,7 @@ class ModbusService:
             if registers is None or len(registers) < 1:
                 return None
                 
-            # แปลง uint16 เป็น int16
-            value = registers[0]
-            if value > 32767:  # ถ้าเกิน int16 max
-                value = value - 65536  # แปลงเป็น negative
-                
-            return value
+            return decode_value(registers, "int16", "AB")
             
         except Exception as e:
             logger.error(f"Error reading int16 at address {address}: {e}")
@@ -111,34 +112,28 @@ class ModbusService:
     def test_connection(self, host: str, port: int, unit: int = 1) -> Dict:
         """ทดสอบการเชื่อมต่อ"""
         try:
-            client = ModbusTcpClient(host=host, port=port)
-            if client.connect():
+            with self.connection_manager.lease(host, port, unit) as client:
                 # ทดสอบอ่าน register 0
-                result = client.read_holding_registers(0, 1, unit=unit)
-                client.close()
-                
-                if result.isError():
-                    return {
-                        "success": False,
-                        "message": f"Modbus error: {result}"
-                    }
-                else:
-                    return {
-                        "success": True,
-                        "message": "Connection successful"
-                    }
-            else:
+                result = client.read_holding_registers(0, 1, slave=unit)
+
+            if result.isError():
                 return {
                     "success": False,
-                    "message": "Failed to connect to Modbus server"
+                    "message": f"Modbus error: {result}"
                 }
-                
+            else:
+                return {
+                    "success": True,
+                    "message": "Connection successful"
+                }
+
+        except ConnectionError:
+            return {
+                "success": False,
+                "message": "Failed to connect to Modbus server"
+            }
         except Exception as e:
             return {
                 "success": False,
                 "message": f"Connection error: {str(e)}"
             }
-
-    def get_client(self, device_id: str) -> Optional[ModbusTcpClient]:
-        """ดึง client สำหรับ device ที่เชื่อมต่อแล้ว"""
-        return self.clients.get(device_id)
\ No newline at end of file
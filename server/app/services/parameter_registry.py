@@ -0,0 +1,172 @@
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from app.domain.sample import SampleSchema, FIXED_PARAMETERS
+from app.services.correction_engine import CorrectionEngine
+import json
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+GAS_FILE = "config/gas.json"
+
+# correction class ของ parameter
+CORRECTION_O2 = "o2"  # correct ตาม O2 อ้างอิง (ค่าใน reference_o2)
+CORRECTION_NONE = "none"  # copy ค่าเดิม
+
+class ParameterInfo(NamedTuple):
+    name: str
+    index: int  # ตำแหน่งใน schema / Sample.values - คงที่ตลอดอายุ process
+    display: str
+    unit: str
+    enabled: bool
+    mapped: bool  # มี mapping ที่อ่านค่าจาก Modbus
+    correction: str
+    reference_o2: Optional[float]
+
+class ParameterRegistry(NamedTuple):
+    """parameter ทุกตัว (field คงที่ + mappings.json + gas.json) ที่ compile แล้ว 1 version
+
+    สร้างใหม่เฉพาะเมื่อ mappings (ConfigService.version) หรือ gas.json เปลี่ยน
+    """
+    version: Tuple[int, int, int]  # (config version, gas version, mtime ของ gas.json เป็น ns)
+    schema: SampleSchema
+    parameters: Tuple[ParameterInfo, ...]  # เรียงตาม index
+    mapped: frozenset  # ชื่อที่มี mapping
+    gas_settings: Tuple[Dict, ...]  # รายการใน gas.json ตามไฟล์
+    enabled_gases: Tuple[Dict, ...]  # เฉพาะ enabled (สำหรับ /api/gas/list)
+    correction: CorrectionEngine
+    built_at: float
+    build_ms: float
+
+    def get(self, name: str) -> Optional[ParameterInfo]:
+        i = self.schema.index.get(name)
+        return None if i is None else self.parameters[i]
+
+class ParameterRegistryService:
+    """ถือ ParameterRegistry ล่าสุด - เป็นเจ้าของ gas.json (อ่านครั้งเดียว, เขียนผ่าน save_gas_settings)
+
+    mtime ของ gas.json เป็นส่วนหนึ่งของ version (os.stat ครั้งเดียวต่อ current()) -
+    worker อื่นที่บันทึกไฟล์ หรือแก้ไฟล์จากภายนอก ทำให้ทุก worker อ่านไฟล์ใหม่เอง
+
+    index ของ parameter ไม่เปลี่ยนเมื่อ build ใหม่: ชื่อใหม่ต่อท้าย ชื่อที่ถูกลบยังคงตำแหน่งเดิม (enabled=False)
+    """
+
+    def __init__(self, config_service, gas_file: str = GAS_FILE):
+        self.config_service = config_service
+        self.gas_file = gas_file
+        self.builds = 0
+        self._gas_settings: Optional[List[Dict]] = None
+        self._gas_version = 0
+        self._names: Dict[str, None] = dict.fromkeys(FIXED_PARAMETERS)  # ลำดับ index (เพิ่มอย่างเดียว)
+        self._registry: Optional[ParameterRegistry] = None
+        self._lock = threading.Lock()
+
+    def current(self) -> ParameterRegistry:
+        mtime = self._gas_mtime()
+        version = (getattr(self.config_service, "version", 0), self._gas_version, mtime)
+        registry = self._registry
+        if registry is not None and registry.version == version:
+            return registry
+        with self._lock:
+            registry = self._registry
+            version = (getattr(self.config_service, "version", 0), self._gas_version, mtime)
+            if registry is None or registry.version != version:
+                if registry is not None and registry.version[2] != mtime:
+                    self._gas_settings = None  # ไฟล์เปลี่ยน (จาก worker อื่น/ภายนอก) - อ่านใหม่
+                registry = self._build(version)
+                self._registry = registry
+            return registry
+
+    def _gas_mtime(self) -> int:
+        try:
+            return os.stat(self.gas_file).st_mtime_ns
+        except OSError:
+            return 0
+
+    def gas_settings(self) -> List[Dict]:
+        return [dict(gas) for gas in self.current().gas_settings]
+
+    def save_gas_settings(self, gas_list: List[Dict]):
+        """บันทึก gas.json แล้ว build registry (และ rule ของ O2 correction) ใหม่ในครั้งถัดไป"""
+        with open(self.gas_file, "w", encoding="utf-8") as f:
+            json.dump(gas_list, f, indent=2, ensure_ascii=False)
+        with self._lock:
+            self._gas_settings = [dict(gas) for gas in gas_list]
+            self._gas_version += 1
+
+    def reload_gas_settings(self):
+        """อ่าน gas.json ใหม่ (เมื่อแก้ไฟล์จากภายนอก)"""
+        with self._lock:
+            self._gas_settings = None
+            self._gas_version += 1
+
+    def _load_gas_settings(self) -> List[Dict]:
+        try:
+            if os.path.exists(self.gas_file):
+                with open(self.gas_file, "r", encoding="utf-8") as f:
+                    return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Cannot read {self.gas_file}: {e}")
+        return []
+
+    def _build(self, version: Tuple[int, int, int]) -> ParameterRegistry:
+        started = time.perf_counter()
+        if self._gas_settings is None:
+            self._gas_settings = self._load_gas_settings()
+        gas_settings = tuple(dict(gas) for gas in self._gas_settings)
+        gases = {gas["key"]: gas for gas in gas_settings if gas.get("key")}
+        mapping_units = {}
+        for mapping in self.config_service.get_mappings():
+            mapping_units.setdefault(mapping.name, mapping.unit)
+
+        for name in list(mapping_units) + list(gases):
+            self._names.setdefault(name)
+        schema = SampleSchema(self._names)
+        correction = CorrectionEngine.from_gas_settings(gas_settings)
+
+        parameters = []
+        for index, name in enumerate(schema.names):
+            gas = gases.get(name, {})
+            mapped = name in mapping_units
+            reference = correction.rules.get(name)
+            parameters.append(ParameterInfo(
+                name=name,
+                index=index,
+                display=gas.get("display") or name,
+                unit=gas.get("unit") or mapping_units.get(name) or "",
+                enabled=gas.get("enabled", True) if gas else mapped,
+                mapped=mapped,
+                correction=CORRECTION_O2 if reference is not None else CORRECTION_NONE,
+                reference_o2=reference,
+            ))
+
+        build_ms = (time.perf_counter() - started) * 1000
+        self.builds += 1
+        logger.info(f"Parameter registry v{version}: {len(parameters)} parameters ({build_ms:.1f} ms)")
+        return ParameterRegistry(
+            version=version,
+            schema=schema,
+            parameters=tuple(parameters),
+            mapped=frozenset(mapping_units),
+            gas_settings=gas_settings,
+            enabled_gases=tuple(gas for gas in gas_settings if gas.get("enabled", True)),
+            correction=correction,
+            built_at=time.time(),
+            build_ms=round(build_ms, 2),
+        )
+
+    def get_stats(self) -> Dict:
+        registry = self._registry
+        if registry is None:
+            return {"version": None, "builds": self.builds}
+        return {
+            "version": list(registry.version),
+            "builds": self.builds,
+            "parameters": len(registry.parameters),
+            "mapped": len(registry.mapped),
+            "corrected": sum(1 for p in registry.parameters if p.correction == CORRECTION_O2),
+            "build_ms": registry.build_ms,
+            "built_at": registry.built_at,
+        }
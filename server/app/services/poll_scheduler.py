@@ -0,0 +1,107 @@
+from typing import List, Dict, Tuple, Optional, Mapping
+from app.core.config import settings
+from app.domain.config_model import DeviceConfig, MappingConfig
+from app.domain.read_plan_model import DeviceReadPlan
+from app.services.read_plan_service import ReadPlanService
+import logging
+
+logger = logging.getLogger(__name__)
+
+class PollScheduler:
+    """กำหนดว่าแต่ละรอบ (tick) ต้องอ่าน mapping ไหนบ้าง ตาม pollInterval ของ mapping
+
+    tick หนึ่งยาวเท่ากับ pollInterval ที่สั้นที่สุด ส่วน mapping ที่ช้ากว่าจะถูกอ่านทุก ๆ N tick
+    mapping ที่ถึงเวลาพร้อมกันใน device เดียวกันจะถูกรวมเป็น block read ชุดเดียว
+    """
+
+    def __init__(self, read_plan_service: ReadPlanService, default_interval: Optional[float] = None):
+        self.read_plan_service = read_plan_service
+        self.default_interval = default_interval or settings.modbus_default_poll_interval
+        self.base_interval = self.default_interval
+        # กำหนดความยาว tick จากภายนอก (worker ของ shard ใช้ tick เดียวกับทั้งระบบ)
+        self.fixed_interval: Optional[float] = None
+        self.tick = 0
+        self._signature = None
+        self._devices: Dict[str, DeviceConfig] = {}
+        self._entries: Dict[str, List[Tuple[MappingConfig, int]]] = {}  # device -> [(mapping, ทุกกี่ tick)]
+        self._plan_cache: Dict[Tuple, DeviceReadPlan] = {}
+        self._full_plans: Mapping[str, DeviceReadPlan] = {}
+
+    def update(self, devices: List[DeviceConfig], mappings: List[MappingConfig],
+               read_plans: Optional[Mapping[str, DeviceReadPlan]] = None) -> bool:
+        """คำนวณตารางใหม่เมื่อ config เปลี่ยน - คืน True ถ้ามีการเปลี่ยนแปลง
+
+        read_plans: plan ที่ compile ไว้แล้วของทุก mapping ใน device (จาก config snapshot)
+        ใช้แทนการ compile ใหม่ใน tick ที่ทุก mapping ของ device ถึงกำหนดพร้อมกัน
+        """
+        self._full_plans = read_plans or {}
+        signature = (
+            tuple((d.name, d.host, d.port, d.unit, d.pipeline) for d in devices),
+            tuple((m.device, m.name, m.address, m.dataType, m.format, m.count, m.pollInterval) for m in mappings),
+            self.fixed_interval,
+        )
+        if signature == self._signature:
+            return False
+
+        self._signature = signature
+        self._devices = {d.name: d for d in devices}
+        device_mappings = [m for m in mappings if m.device in self._devices]
+        self.base_interval = self.fixed_interval or min(
+            (self.interval_of(m) for m in device_mappings), default=self.default_interval
+        )
+
+        self._entries = {}
+        for mapping in device_mappings:
+            every = max(1, round(self.interval_of(mapping) / self.base_interval))
+            self._entries.setdefault(mapping.device, []).append((mapping, every))
+
+        self._plan_cache.clear()
+        self.tick = 0
+        logger.info(f"Poll schedule rebuilt: base interval {self.base_interval}s, {len(device_mappings)} mappings")
+        return True
+
+    def interval_of(self, mapping: MappingConfig) -> float:
+        if mapping.pollInterval and mapping.pollInterval > 0:
+            return mapping.pollInterval
+        return self.default_interval
+
+    def next_plans(self) -> Dict[str, DeviceReadPlan]:
+        """read plan ของ mapping ที่ถึงกำหนดใน tick นี้ (แยกตาม device)"""
+        tick = self.tick
+        self.tick += 1
+
+        plans = {}
+        for device_name, entries in self._entries.items():
+            due = [mapping for mapping, every in entries if tick % every == 0]
+            if not due:
+                continue
+            if len(due) == len(entries) and device_name in self._full_plans:
+                plans[device_name] = self._full_plans[device_name]
+                continue
+            key = (device_name, tuple((m.name, m.address) for m in due))
+            plan = self._plan_cache.get(key)
+            if plan is None:
+                # ชุด mapping ที่ถึงเวลาพร้อมกันวนซ้ำเป็นรอบ - compile ครั้งเดียวแล้วเก็บไว้
+                plan = self.read_plan_service.compile_device(self._devices[device_name], due)
+                self._plan_cache[key] = plan
+            plans[device_name] = plan
+        return plans
+
+    def get_schedule(self) -> Dict:
+        """ตาราง poll สำหรับแสดงผลผ่าน API"""
+        return {
+            "base_interval": self.base_interval,
+            "tick": self.tick,
+            "devices": {
+                device_name: [
+                    {
+                        "name": mapping.name,
+                        "address": mapping.address,
+                        "interval": round(every * self.base_interval, 3),
+                        "every_ticks": every,
+                    }
+                    for mapping, every in entries
+                ]
+                for device_name, entries in self._entries.items()
+            },
+        }
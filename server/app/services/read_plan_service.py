@@ -0,0 +1,195 @@
+from typing import List, Dict, Set, Optional
+from app.core.config import settings
+from app.domain.config_model import DeviceConfig, MappingConfig
+from app.domain.read_plan_model import BlockChannel, ReadBlock, DeviceReadPlan
+import logging
+
+logger = logging.getLogger(__name__)
+
+# จำนวน register ที่แต่ละ data type ใช้
+REGISTER_WIDTH = {
+    "int16": 1,
+    "uint16": 1,
+    "float32": 2,
+    "int32": 2,
+    "uint32": 2,
+}
+
+class ReadPlanService:
+    """แปลง mappings เป็นแผนการอ่านแบบ block (จำนวน request น้อยที่สุดต่อ device)"""
+
+    def __init__(self, max_block_registers: Optional[int] = None, gap_tolerance: Optional[int] = None):
+        self.max_block_registers = max_block_registers or settings.modbus_max_block_registers
+        self.gap_tolerance = settings.modbus_block_gap_tolerance if gap_tolerance is None else gap_tolerance
+        self.max_block_coils = settings.modbus_max_block_coils
+        self.coil_gap_tolerance = settings.modbus_coil_gap_tolerance
+        # address ที่ต้องขึ้น block ใหม่เสมอ (เรียนรู้จาก illegal address exception)
+        self._split_points: Dict[str, Set[int]] = {}
+
+    def compile(self, devices: List[DeviceConfig], mappings: List[MappingConfig]) -> Dict[str, DeviceReadPlan]:
+        """สร้าง read plan ของทุก device"""
+        grouped: Dict[str, List[MappingConfig]] = {d.name: [] for d in devices}
+        for mapping in mappings:
+            if mapping.device in grouped:
+                grouped[mapping.device].append(mapping)
+        return {device.name: self.compile_device(device, grouped[device.name]) for device in devices}
+
+    def compile_device(self, device: DeviceConfig, mappings: List[MappingConfig]) -> DeviceReadPlan:
+        """รวม mapping ที่ address ติดกัน/ห่างกันไม่เกิน gap_tolerance เป็น block เดียว"""
+        channels = sorted(
+            (
+                BlockChannel(
+                    name=m.name,
+                    address=m.address,
+                    count=self._register_count(m),
+                    dataType=m.dataType,
+                    format=m.format,
+                    offset=0,
+                )
+                for m in mappings
+            ),
+            key=lambda c: (c.address, c.count),
+        )
+        blocks = self._merge_channels(
+            channels,
+            self._split_points.get(device.name, set()),
+            self.max_block_registers,
+            self.gap_tolerance,
+        )
+
+        return DeviceReadPlan(
+            device=device.name,
+            host=device.host,
+            port=device.port,
+            unit=device.unit,
+            pipeline=device.pipeline,
+            blocks=blocks,
+            mapping_count=len(channels),
+        )
+
+    def compile_coils(self, device_name: str, addresses: List[int]) -> List[ReadBlock]:
+        """รวม coil address ของ device เป็น block สำหรับ read_coils
+
+        1 coil = 1 bit จึงยอมให้มีช่องว่างได้มากกว่า register
+        block ที่ device ตอบ illegal address ให้แบ่งด้วย split_block(coil_key(device_name), block)
+        """
+        channels = sorted(
+            (BlockChannel(name=str(address), address=address, count=1, dataType="bit", offset=0)
+             for address in set(addresses)),
+            key=lambda c: c.address,
+        )
+        return self._merge_channels(
+            channels,
+            self._split_points.get(self.coil_key(device_name), set()),
+            self.max_block_coils,
+            self.coil_gap_tolerance,
+        )
+
+    @staticmethod
+    def coil_key(device_name: str) -> str:
+        """key ของจุดแบ่ง block ฝั่ง coil (address space แยกจาก holding register)"""
+        return f"{device_name}:coils"
+
+    def split_block(self, device_name: str, block: ReadBlock) -> List[ReadBlock]:
+        """แบ่ง block ออกเป็น 2 ส่วนที่ขอบ channel เมื่อ device ตอบ illegal address
+
+        จำจุดแบ่งไว้เพื่อให้การ compile ครั้งต่อไปไม่รวม block นี้อีก
+        """
+        if len(block.channels) < 2:
+            return [block]
+
+        middle = len(block.channels) // 2
+        self._split_points.setdefault(device_name, set()).add(block.channels[middle].address)
+        logger.warning(
+            f"Splitting block {block.start}+{block.count} on {device_name} at address {block.channels[middle].address}"
+        )
+
+        halves = []
+        for part in (block.channels[:middle], block.channels[middle:]):
+            start = part[0].address
+            end = max(c.address + c.count for c in part)
+            halves.append(self._make_block(start, end, part))
+        return halves
+
+    def reset_split_points(self, device_name: Optional[str] = None):
+        """ล้างจุดแบ่ง block ที่เรียนรู้มา (เช่น หลังเปลี่ยน device)"""
+        if device_name is None:
+            self._split_points.clear()
+        else:
+            self._split_points.pop(device_name, None)
+
+    def summarize(self, plans: Dict[str, DeviceReadPlan]) -> Dict:
+        """สรุป plan สำหรับแสดงผลผ่าน API"""
+        devices = []
+        total_mappings = 0
+        total_blocks = 0
+        for plan in plans.values():
+            total_mappings += plan.mapping_count
+            total_blocks += len(plan.blocks)
+            devices.append({
+                "device": plan.device,
+                "host": plan.host,
+                "port": plan.port,
+                "unit": plan.unit,
+                "mapping_count": plan.mapping_count,
+                "block_count": len(plan.blocks),
+                "round_trips_saved": plan.round_trips_saved,
+                "split_points": sorted(self._split_points.get(plan.device, set())),
+                "blocks": [
+                    {
+                        "start": block.start,
+                        "count": block.count,
+                        "channels": [c.name for c in block.channels],
+                    }
+                    for block in plan.blocks
+                ],
+            })
+
+        return {
+            "max_block_registers": self.max_block_registers,
+            "gap_tolerance": self.gap_tolerance,
+            "devices": devices,
+            "total_mappings": total_mappings,
+            "total_blocks": total_blocks,
+            "round_trips_saved": max(total_mappings - total_blocks, 0),
+        }
+
+    def _merge_channels(self, channels: List[BlockChannel], split_points: Set[int],
+                        max_count: int, gap_tolerance: int) -> List[ReadBlock]:
+        """รวม channel ที่เรียงตาม address แล้วเป็น block (ไม่เกิน max_count และไม่ข้ามจุดแบ่ง)"""
+        blocks: List[ReadBlock] = []
+        current: List[BlockChannel] = []
+        block_start = block_end = 0  # block_end = address ถัดจาก register สุดท้าย
+
+        for channel in channels:
+            channel_end = channel.address + channel.count
+            if current:
+                gap = channel.address - block_end
+                new_count = max(block_end, channel_end) - block_start
+                if (gap <= gap_tolerance
+                        and new_count <= max_count
+                        and channel.address not in split_points):
+                    current.append(channel)
+                    block_end = max(block_end, channel_end)
+                    continue
+                blocks.append(self._make_block(block_start, block_end, current))
+            current = [channel]
+            block_start, block_end = channel.address, channel_end
+
+        if current:
+            blocks.append(self._make_block(block_start, block_end, current))
+        return blocks
+
+    def _make_block(self, start: int, end: int, channels: List[BlockChannel]) -> ReadBlock:
+        return ReadBlock(
+            start=start,
+            count=end - start,
+            channels=[c.model_copy(update={"offset": c.address - start}) for c in channels],
+        )
+
+    @staticmethod
+    def _register_count(mapping: MappingConfig) -> int:
+        width = REGISTER_WIDTH.get(mapping.dataType)
+        if width is not None:
+            return width
+        return max(mapping.count, 1)
@@ -0,0 +1,184 @@
+from typing import Callable, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from app.core.config import settings
+from app.services.correction_engine import CorrectionEngine
+from app.services.influxdb_service import InfluxDBService
+import json
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class RecorrectionJob:
+    """คำนวณ field *Corr ของ cems_data ย้อนหลังใหม่ตาม rule ปัจจุบันของ CorrectionEngine
+
+    อ่านค่าดิบทีละช่วงเวลา (chunk) แบบ column -> apply_columns() -> เขียนทับ *Corr เป็น batch
+    อ่าน chunk ถัดไปไว้ล่วงหน้าระหว่างคำนวณ/เขียน chunk ปัจจุบัน
+    หลังเขียน chunk เสร็จบันทึก checkpoint (เวลาที่ทำถึง) ลงไฟล์ - หยุดกลางทางแล้ว resume() ต่อจากจุดนั้นได้
+    ทำได้ทีละ job (รันใน thread ของตัวเอง)
+    """
+
+    def __init__(self, engine: Callable[[], CorrectionEngine], influxdb_service: InfluxDBService = None,
+                 checkpoint_path: Optional[str] = None):
+        self.engine = engine  # คืน engine ปัจจุบัน (rule อาจเปลี่ยนหลังสร้าง job)
+        self.influxdb_service = influxdb_service or InfluxDBService()
+        self.checkpoint_path = checkpoint_path or settings.recorrection_checkpoint_path
+        self._thread: Optional[threading.Thread] = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self.state: Dict = {"status": "idle"}
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, stack_id: str, start_time: datetime, end_time: datetime,
+              chunk_seconds: Optional[float] = None) -> Dict:
+        if end_time <= start_time:
+            raise ValueError("end_time must be after start_time")
+        state = {
+            "stack_id": stack_id,
+            "start": start_time.isoformat(),
+            "end": end_time.isoformat(),
+            "chunk_seconds": chunk_seconds or settings.recorrection_chunk_seconds,
+            "cursor": start_time.isoformat(),
+            "rules": self.engine().rules,
+            "rows": 0,
+            "written": 0,
+        }
+        return self._launch(state)
+
+    def resume(self) -> Dict:
+        """ทำต่อจาก checkpoint - rule ต้องเหมือนตอนเริ่ม (ไม่งั้นผลแต่ละช่วงใช้ rule ต่างกัน)"""
+        state = self.load_checkpoint()
+        if state is None:
+            raise FileNotFoundError(f"No checkpoint at {self.checkpoint_path}")
+        if state.get("rules") != self.engine().rules:
+            raise ValueError("Correction rules changed since the checkpoint - start the job again")
+        return self._launch(state)
+
+    def _launch(self, state: Dict) -> Dict:
+        with self._lock:
+            if self.running:
+                raise RuntimeError("A re-correction job is already running")
+            self._cancel.clear()
+            state.update(status="running", message=None, elapsed=0.0, rows_per_second=None, run_from=state["cursor"])
+            self.state = state
+            self._thread = threading.Thread(target=self._run, name="recorrection-job", daemon=True)
+            self._thread.start()
+        return self.get_progress()
+
+    def cancel(self) -> bool:
+        """หยุดหลังจบ chunk ปัจจุบัน (checkpoint ยังอยู่ - resume ได้)"""
+        if not self.running:
+            return False
+        self._cancel.set()
+        return True
+
+    def _run(self):
+        try:
+            self._process(self.state)
+        except Exception as e:
+            self._stop("failed", str(e))
+
+    def _process(self, state: Dict):
+        engine = self.engine()
+        end = datetime.fromisoformat(state["end"])
+        chunk = timedelta(seconds=state["chunk_seconds"])
+        cursor = datetime.fromisoformat(state["cursor"])
+        rows_before = state["rows"]
+        started = time.monotonic()
+        logger.info(f"Re-correction {state['stack_id']} {state['cursor']} -> {state['end']} started")
+
+        def fetch(chunk_start: datetime):
+            chunk_end = min(chunk_start + chunk, end)
+            return chunk_end, self.influxdb_service.get_raw_columns(state["stack_id"], chunk_start, chunk_end)
+
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="recorrection-read") as reader:
+            pending = reader.submit(fetch, cursor) if cursor < end else None
+            while pending is not None:
+                chunk_end, raw = pending.result()
+                if raw is None:
+                    return self._stop("failed", f"Cannot read {cursor.isoformat()} - {chunk_end.isoformat()}")
+                # อ่าน chunk ถัดไประหว่างคำนวณ/เขียน chunk นี้
+                pending = reader.submit(fetch, chunk_end) if chunk_end < end and not self._cancel.is_set() else None
+
+                columns = raw["columns"]
+                if raw["times"] and "O2" in columns:
+                    corrected = engine.apply_columns(columns["O2"], columns)
+                    written = self.influxdb_service.write_corrected_columns(
+                        raw["times"], raw["tags"], corrected, settings.recorrection_write_batch
+                    )
+                    if written < 0:
+                        if pending is not None:
+                            pending.cancel()
+                        return self._stop("failed", f"Cannot write {cursor.isoformat()} - {chunk_end.isoformat()}")
+                    state["written"] += written
+                state["rows"] += len(raw["times"])
+
+                cursor = chunk_end
+                elapsed = time.monotonic() - started
+                state.update(
+                    cursor=cursor.isoformat(),
+                    elapsed=round(elapsed, 1),
+                    rows_per_second=round((state["rows"] - rows_before) / elapsed) if elapsed > 0 else None,
+                )
+                self._save_checkpoint(state)
+                if self._cancel.is_set():
+                    return self._stop("cancelled", None)
+
+        self._stop("done", None)
+        self._remove_checkpoint()
+        logger.info(f"Re-correction {state['stack_id']} done: {state['rows']} rows, {state['written']} written")
+
+    def _stop(self, status: str, message: Optional[str]):
+        self.state.update(status=status, message=message)
+        if message:
+            logger.warning(f"Re-correction {status}: {message}")
+
+    def load_checkpoint(self) -> Optional[Dict]:
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Cannot read re-correction checkpoint {self.checkpoint_path}: {e}")
+            return None
+
+    def _save_checkpoint(self, state: Dict):
+        # เขียนไฟล์ชั่วคราวแล้ว rename - checkpoint ไม่เสียแม้ process ตายระหว่างเขียน
+        checkpoint = {key: state[key] for key in
+                      ("stack_id", "start", "end", "chunk_seconds", "cursor", "rules", "rows", "written")}
+        directory = os.path.dirname(self.checkpoint_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.checkpoint_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f, ensure_ascii=False)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def _remove_checkpoint(self):
+        try:
+            os.remove(self.checkpoint_path)
+        except FileNotFoundError:
+            pass
+
+    def get_progress(self) -> Dict:
+        state = dict(self.state)
+        if "start" in state:
+            start = datetime.fromisoformat(state["start"])
+            cursor = datetime.fromisoformat(state["cursor"])
+            total = (datetime.fromisoformat(state["end"]) - start).total_seconds()
+            state["percent"] = round(100.0 * (cursor - start).total_seconds() / total, 1) if total > 0 else 100.0
+            # ETA จากความเร็ว (ช่วงเวลาข้อมูลต่อวินาที) ของ run นี้
+            done = (cursor - datetime.fromisoformat(state["run_from"])).total_seconds()
+            if state["status"] == "running" and done > 0 and state.get("elapsed"):
+                remaining = (datetime.fromisoformat(state["end"]) - cursor).total_seconds()
+                state["eta_seconds"] = round(state["elapsed"] * remaining / done)
+        elif self.load_checkpoint() is not None:
+            state["checkpoint"] = True
+        return state
@@ -0,0 +1,101 @@
+from typing import Dict, List, Optional, Tuple
+import threading
+import time
+
+class RegisterCache:
+    """register ที่อ่านได้ล่าสุดของแต่ละ device (ระดับ block) พร้อมเวลาที่อ่าน
+
+    acquisition เขียนทุก block ที่อ่านสำเร็จ ส่วน endpoint วินิจฉัย (read/test) ใช้ค่าที่นี่
+    เมื่อยังใหม่พอตาม max_age แทนการส่ง request ไปที่ device ซ้ำ
+    โหมด shard (acquisition_workers > 0): worker เก็บ block ที่อ่านไว้ (record_updates/take_updates)
+    แล้ว API process ใส่ลง cache ของตัวเองด้วย store_updates()
+    """
+
+    def __init__(self):
+        # device -> start -> (end, registers, เวลาที่อ่าน)
+        self._blocks: Dict[str, Dict[int, Tuple[int, Tuple[int, ...], float]]] = {}
+        self._seen: Dict[str, float] = {}  # device -> เวลาที่ตอบครั้งล่าสุด
+        self._lock = threading.Lock()
+        self._journal: Optional[List[Tuple[str, int, Tuple[int, ...], float]]] = None  # block ที่รอส่งต่อ
+        self.hits = 0
+        self.misses = 0
+
+    def store(self, device_name: str, start: int, registers: List[int], at: Optional[float] = None):
+        at = at if at is not None else time.monotonic()
+        entry = (start + len(registers), tuple(registers), at)
+        with self._lock:
+            self._blocks.setdefault(device_name, {})[start] = entry
+            self._seen[device_name] = at
+            if self._journal is not None:
+                self._journal.append((device_name, start, entry[1], at))
+
+    def record_updates(self):
+        """เริ่มเก็บทุก block ที่ store() ไว้ให้ take_updates() (ใช้ใน worker ของ acquisition shard)"""
+        with self._lock:
+            self._journal = []
+
+    def take_updates(self) -> List[Tuple[str, int, Tuple[int, ...], float]]:
+        """block ที่ store() ตั้งแต่เรียกครั้งก่อน - (device, start, registers, อายุเป็นวินาที)
+
+        ส่งอายุแทนเวลา เพราะ monotonic clock ของแต่ละ process เทียบกันไม่ได้
+        """
+        with self._lock:
+            journal = self._journal
+            if not journal:
+                return []
+            self._journal = []
+        now = time.monotonic()
+        return [(device_name, start, registers, now - at) for device_name, start, registers, at in journal]
+
+    def store_updates(self, updates: List[Tuple[str, int, Tuple[int, ...], float]]):
+        """ใส่ block จาก take_updates() ของ process อื่น (อายุคงเดิม)"""
+        now = time.monotonic()
+        for device_name, start, registers, age in updates:
+            self.store(device_name, start, registers, now - age)
+
+    def mark_seen(self, device_name: str, at: Optional[float] = None):
+        """device ตอบกลับ (แม้เป็น exception response) - ใช้กับการทดสอบการเชื่อมต่อ"""
+        self._seen[device_name] = at if at is not None else time.monotonic()
+
+    def lookup(self, device_name: str, address: int, count: int, max_age: float) -> Optional[Tuple[List[int], float]]:
+        """คืน (registers, อายุเป็นวินาที) ถ้ามี block ที่ครอบช่วงนี้และอ่านมาไม่เกิน max_age"""
+        now = time.monotonic()
+        best = None
+        with self._lock:
+            blocks = self._blocks.get(device_name)
+            if blocks:
+                for start, (end, registers, at) in blocks.items():
+                    if start <= address and address + count <= end and now - at <= max_age:
+                        if best is None or at > best[2]:
+                            best = (start, registers, at)
+        if best is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        start, registers, at = best
+        offset = address - start
+        return list(registers[offset:offset + count]), now - at
+
+    def last_seen_age(self, device_name: str) -> Optional[float]:
+        at = self._seen.get(device_name)
+        return None if at is None else time.monotonic() - at
+
+    def clear(self, device_name: Optional[str] = None):
+        with self._lock:
+            if device_name is None:
+                self._blocks.clear()
+                self._seen.clear()
+            else:
+                self._blocks.pop(device_name, None)
+                self._seen.pop(device_name, None)
+
+    def get_stats(self) -> Dict:
+        return {
+            "devices": len(self._blocks),
+            "blocks": sum(len(b) for b in self._blocks.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+# ใช้ instance เดียวทั้ง process
+register_cache = RegisterCache()
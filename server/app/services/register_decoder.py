@@ -0,0 +1,138 @@
+from typing import List, Dict, Tuple, Optional
+from app.domain.read_plan_model import BlockChannel, ReadBlock
+import struct
+
+# data type -> (struct code, ขนาดเป็น byte)
+DATA_TYPES = {
+    "int16": ("h", 2),
+    "uint16": ("H", 2),
+    "float32": ("f", 4),
+    "int32": ("i", 4),
+    "uint32": ("I", 4),
+}
+
+# format -> (สลับ byte ในแต่ละ register หรือไม่, endian ของค่า)
+# registers ถูก pack เป็น big-endian (AB) ก่อน ถ้าสลับ byte ในแต่ละ register แล้วอ่านแบบ
+# little-endian จะได้ลำดับ word กลับด้าน (CD AB) โดยไม่ต้องย้ายข้อมูลทีละค่า
+BYTE_ORDERS = {
+    "AB CD": (False, ">"),
+    "CD AB": (True, "<"),
+    "BA DC": (True, ">"),
+    "DC BA": (False, "<"),
+    "AB": (False, ">"),
+    "BA": (True, ">"),
+}
+DEFAULT_BYTE_ORDER = "CD AB"  # เหมือนพฤติกรรมเดิม: format อื่นที่ไม่ใช่ AB CD = สลับ word
+
+_register_structs: Dict[Tuple[bool, int], struct.Struct] = {}
+
+def _pack_registers(registers: List[int], swapped: bool) -> bytes:
+    """แปลง registers ทั้ง block เป็น bytes ในครั้งเดียว"""
+    key = (swapped, len(registers))
+    packer = _register_structs.get(key)
+    if packer is None:
+        packer = struct.Struct(f"{'<' if swapped else '>'}{len(registers)}H")
+        _register_structs[key] = packer
+    return packer.pack(*registers)
+
+def _data_type(data_type: str, count: int = 2) -> Tuple[str, int]:
+    """data type ที่ไม่รู้จักถือเป็น float32 (เหมือนเดิม) ยกเว้น mapping ที่กว้างแค่ 1 register"""
+    if data_type in DATA_TYPES:
+        return DATA_TYPES[data_type]
+    return DATA_TYPES["float32" if count >= 2 else "uint16"]
+
+def _byte_order(data_type: str, format: str, count: int = 2) -> Tuple[bool, str]:
+    swapped, endian = BYTE_ORDERS.get(format, BYTE_ORDERS[DEFAULT_BYTE_ORDER])
+    if _data_type(data_type, count)[1] == 2:
+        # ค่า 16 บิตไม่มีลำดับ word - ใช้เฉพาะการสลับ byte
+        swapped = format in ("BA DC", "DC BA", "BA")
+        endian = ">"
+    return swapped, endian
+
+class BlockDecoder:
+    """แปลง registers ของทั้ง block เป็นค่าของทุก channel ในครั้งเดียว
+
+    channel ที่ใช้ byte order เดียวกันถูกรวมเป็น struct format เดียว (ช่องว่างใช้ pad byte)
+    ทำให้ทั้ง block ใช้ unpack_from ไม่เกินจำนวนแบบ byte order ที่มี
+    """
+
+    def __init__(self, channels: List[BlockChannel]):
+        groups: Dict[Tuple[bool, str], List[BlockChannel]] = {}
+        for channel in channels:
+            groups.setdefault(_byte_order(channel.dataType, channel.format, channel.count), []).append(channel)
+
+        # (สลับ byte หรือไม่, struct, ชื่อ channel ตามลำดับ)
+        self.steps: List[Tuple[bool, struct.Struct, List[str]]] = []
+        for (swapped, endian), group in groups.items():
+            group.sort(key=lambda c: c.offset)
+            fmt, names, position = endian, [], 0
+            for channel in group:
+                code, size = _data_type(channel.dataType, channel.count)
+                start = channel.offset * 2
+                if start < position:
+                    # channel ซ้อนกัน (เช่น 2 mapping ที่ address เดียวกัน) - เริ่ม struct ใหม่
+                    self.steps.append((swapped, struct.Struct(fmt), names))
+                    fmt, names, position = endian, [], 0
+                if start > position:
+                    fmt += f"{start - position}x"
+                fmt += code
+                names.append(channel.name)
+                position = start + size
+            self.steps.append((swapped, struct.Struct(fmt), names))
+        self.needs_swapped = any(step[0] for step in self.steps)
+        self.needs_plain = any(not step[0] for step in self.steps)
+
+    def decode(self, registers: List[int]) -> Dict[str, float]:
+        plain = _pack_registers(registers, False) if self.needs_plain else None
+        swapped = _pack_registers(registers, True) if self.needs_swapped else None
+
+        data = {}
+        for is_swapped, unpacker, names in self.steps:
+            values = unpacker.unpack_from(swapped if is_swapped else plain)
+            data.update(zip(names, values))
+        return data
+
+def decode_block(block: ReadBlock, registers: List[int]) -> Dict[str, float]:
+    """decode ทั้ง block - decoder ถูก compile ครั้งแรกแล้วเก็บไว้กับ block"""
+    decoder = block.decoder
+    if decoder is None:
+        decoder = BlockDecoder(block.channels)
+        block.decoder = decoder
+    return decoder.decode(registers)
+
+_value_structs: Dict[Tuple[str, str], Tuple[bool, struct.Struct, int]] = {}
+
+def decode_value(registers: List[int], data_type: str = "float32", format: str = "AB CD") -> Optional[float]:
+    """decode ค่าเดียว (สำหรับการอ่านทีละ address) ด้วย struct ที่ compile ไว้แล้ว"""
+    key = (data_type, format)
+    compiled = _value_structs.get(key)
+    if compiled is None:
+        swapped, endian = _byte_order(data_type, format)
+        code, size = _data_type(data_type)
+        compiled = (swapped, struct.Struct(endian + code), size // 2)
+        _value_structs[key] = compiled
+
+    swapped, unpacker, register_count = compiled
+    if len(registers) < register_count:
+        return None
+    return unpacker.unpack(_pack_registers(registers[:register_count], swapped))[0]
+
+_value_encoders: Dict[Tuple[str, str], Tuple[struct.Struct, struct.Struct, bool]] = {}
+_INT_RANGES = {"h": (-0x8000, 0x7FFF), "H": (0, 0xFFFF), "i": (-0x80000000, 0x7FFFFFFF), "I": (0, 0xFFFFFFFF)}
+
+def encode_value(value: float, data_type: str = "float32", format: str = "AB CD") -> List[int]:
+    """แปลงค่าเป็น registers ตาม data type และ format (กลับด้านของ decode_value)"""
+    key = (data_type, format)
+    compiled = _value_encoders.get(key)
+    if compiled is None:
+        swapped, endian = _byte_order(data_type, format)
+        code, size = _data_type(data_type)
+        registers = struct.Struct(f"{'<' if swapped else '>'}{size // 2}H")
+        compiled = (struct.Struct(endian + code), registers, code in _INT_RANGES)
+        _value_encoders[key] = compiled
+
+    packer, registers, is_int = compiled
+    if is_int:
+        low, high = _INT_RANGES[packer.format[-1]]
+        value = min(max(int(round(value)), low), high)
+    return list(registers.unpack(packer.pack(value)))
@@ -0,0 +1,190 @@
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Tuple
+from array import array
+from collections import deque
+from datetime import datetime, timezone
+from app.domain.sample import Sample, SampleSchema
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+INF = float("inf")
+
+class AggregateBucket:
+    """sum/count/min/max ต่อ parameter ของช่วงเวลาหนึ่ง [start, start + window) - index ตาม schema ของ Sample"""
+
+    __slots__ = ("stream", "window", "start", "tz", "schema", "samples", "counts", "sums", "mins", "maxs")
+
+    def __init__(self, stream: str, window: int, start: float, tz, schema: SampleSchema):
+        self.stream = stream
+        self.window = window
+        self.start = start
+        self.tz = tz
+        self.schema = schema
+        self.samples = 0
+        size = len(schema)
+        self.counts = array("l", [0]) * size
+        self.sums = array("d", bytes(8 * size))
+        self.mins = array("d", [INF]) * size
+        self.maxs = array("d", [-INF]) * size
+
+    @property
+    def end(self) -> float:
+        return self.start + self.window
+
+    def add(self, values: Sequence[float]):
+        """ค่า NaN = ไม่ได้อ่าน (device ไม่ตอบ/ไม่มี mapping) - ไม่นับ ไม่ใช่ 0"""
+        self.samples += 1
+        counts, sums, mins, maxs = self.counts, self.sums, self.mins, self.maxs
+        for i, value in enumerate(values):
+            if value != value:
+                continue
+            counts[i] += 1
+            sums[i] += value
+            if value < mins[i]:
+                mins[i] = value
+            if value > maxs[i]:
+                maxs[i] = value
+
+    def extend(self, schema: SampleSchema):
+        """schema ใหม่ที่มี parameter เพิ่มต่อท้าย (index เดิมไม่เปลี่ยน) - เพิ่มช่องว่างให้ parameter ใหม่"""
+        extra = len(schema) - len(self.schema)
+        self.schema = schema
+        if extra > 0:
+            self.counts.extend([0] * extra)
+            self.sums.extend([0.0] * extra)
+            self.mins.extend([INF] * extra)
+            self.maxs.extend([-INF] * extra)
+
+    def average(self, index: int) -> Optional[float]:
+        count = self.counts[index]
+        return self.sums[index] / count if count else None
+
+    def to_dict(self) -> Dict:
+        parameters = {}
+        for i, name in enumerate(self.schema.names):
+            count = self.counts[i]
+            if count:
+                parameters[name] = {
+                    "avg": self.sums[i] / count,
+                    "min": self.mins[i],
+                    "max": self.maxs[i],
+                    "count": count,
+                }
+        return {
+            "stream": self.stream,
+            "window": self.window,
+            "start": datetime.fromtimestamp(self.start, self.tz).isoformat(),
+            "end": datetime.fromtimestamp(self.end, self.tz).isoformat(),
+            "samples": self.samples,
+            "parameters": parameters,
+        }
+
+class RollingAggregator:
+    """ค่าเฉลี่ย/min/max ของ bucket ปัจจุบัน (เช่น 1 นาที, 15 นาที, 1 ชั่วโมง) ที่อัปเดตทีละ sample
+
+    bucket ชิดขอบเวลาจริง (นาทีที่ 0, 15, 30, ...) - sample แรกที่เลยขอบปิด bucket เดิมแล้วเริ่มใหม่
+    ค่าที่ไม่ได้อ่านใน sample ต้องเป็น NaN (count ของ parameter นับเฉพาะค่าที่อ่านได้จริง)
+    bucket ที่ปิดแล้วเก็บไว้ history ตัวล่าสุด และส่งให้ผู้ที่ subscribe() / on_close
+    อ่านค่าเฉลี่ยของ bucket ปัจจุบัน = sum / count (ไม่ต้อง query InfluxDB)
+    ใช้จาก event loop เดียว (ไม่มี lock)
+    """
+
+    def __init__(self, windows: Sequence[int] = (60, 900, 3600), history: int = 60):
+        self.windows: Tuple[int, ...] = tuple(sorted(set(int(w) for w in windows)))
+        self.history = history
+        self._current: Dict[Tuple[str, int], AggregateBucket] = {}
+        self._closed: Dict[Tuple[str, int], Deque[Dict]] = {}
+        self._subscribers: List[asyncio.Queue] = []
+        self.on_close: List[Callable[[Dict], None]] = []
+        self.added = 0
+        self.late = 0  # sample ที่เก่ากว่า bucket ปัจจุบัน (ไม่นับ)
+        self.closed = 0
+
+    def add(self, sample: Sample, stream: str = "data"):
+        ts = sample.timestamp.timestamp()
+        tz = sample.timestamp.tzinfo or timezone.utc
+        values = sample.values
+        self.added += 1
+        for window in self.windows:
+            key = (stream, window)
+            bucket = self._current.get(key)
+            if bucket is not None:
+                if ts < bucket.start:
+                    self.late += 1
+                    continue
+                if ts >= bucket.end:
+                    self._close(bucket)
+                    bucket = None
+                elif bucket.schema is not sample.schema:
+                    bucket.extend(sample.schema)
+            if bucket is None:
+                bucket = self._current[key] = AggregateBucket(stream, window, ts - ts % window, tz, sample.schema)
+            bucket.add(values)
+
+    def close_expired(self, now: float):
+        """ปิด bucket ที่หมดเวลาแล้วแม้ไม่มี sample ใหม่ (เช่น device หยุดตอบ)"""
+        for key, bucket in list(self._current.items()):
+            if now >= bucket.end:
+                del self._current[key]
+                self._close(bucket)
+
+    def _close(self, bucket: AggregateBucket):
+        if not bucket.samples:
+            return
+        closed = bucket.to_dict()
+        self.closed += 1
+        history = self._closed.get((bucket.stream, bucket.window))
+        if history is None:
+            history = self._closed[(bucket.stream, bucket.window)] = deque(maxlen=self.history)
+        history.append(closed)
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(closed)
+            except asyncio.QueueFull:
+                pass  # ผู้รับที่ช้าเกินไปพลาด bucket นี้
+        for callback in self.on_close:
+            try:
+                callback(closed)
+            except Exception as e:
+                logger.warning(f"Rolling aggregate callback failed: {e}")
+
+    def average(self, name: str, window: int, stream: str = "data") -> Optional[float]:
+        """ค่าเฉลี่ยของ bucket ปัจจุบัน - None ถ้ายังไม่มีข้อมูล"""
+        bucket = self._current.get((stream, window))
+        if bucket is None:
+            return None
+        index = bucket.schema.index.get(name)
+        return None if index is None else bucket.average(index)
+
+    def current(self, window: int, stream: str = "data") -> Optional[Dict]:
+        bucket = self._current.get((stream, window))
+        return None if bucket is None else bucket.to_dict()
+
+    def closed_buckets(self, window: int, stream: str = "data", limit: Optional[int] = None) -> List[Dict]:
+        """bucket ที่ปิดแล้ว (ใหม่ไปเก่า)"""
+        history = self._closed.get((stream, window)) or ()
+        result = list(reversed(history))
+        return result[:limit] if limit else result
+
+    def subscribe(self, maxsize: int = 100) -> asyncio.Queue:
+        """queue ที่ได้รับทุก bucket ที่ปิด - เลิกใช้แล้วต้องเรียก unsubscribe()"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self._subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        if queue in self._subscribers:
+            self._subscribers.remove(queue)
+
+    def get_stats(self) -> Dict:
+        return {
+            "windows": list(self.windows),
+            "added": self.added,
+            "late": self.late,
+            "closed": self.closed,
+            "subscribers": len(self._subscribers),
+            "current": {
+                f"{stream}:{window}": bucket.samples for (stream, window), bucket in self._current.items()
+            },
+        }
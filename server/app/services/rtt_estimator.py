@@ -0,0 +1,128 @@
+from typing import Dict, Optional
+from collections import deque
+from app.core.config import settings
+import math
+import time
+
+class _DeviceRtt:
+    def __init__(self, window: int):
+        self.samples = deque(maxlen=window)  # RTT ล่าสุด (วินาที)
+        self.srtt: Optional[float] = None  # EWMA ของ RTT
+        self.rttvar = 0.0  # EWMA ของความคลาดเคลื่อน
+        self.p99: Optional[float] = None
+        self.dirty = False
+        self.backoff = 1  # คูณ timeout เมื่อ timeout ติดกัน (รีเซ็ตเมื่อได้ response)
+        self.requests = 0
+        self.timeouts = 0
+        self.last_rtt: Optional[float] = None
+        self.updated_at = 0.0
+
+class RttEstimator:
+    """คำนวณ timeout และจำนวน retry ของแต่ละ device จาก RTT ที่วัดได้จริง
+
+    - srtt/rttvar แบบ EWMA (เหมือน TCP RFC 6298) ตอบสนองต่อการเปลี่ยนแปลงเร็ว
+    - p99 จาก RTT ล่าสุด window ตัว กันไม่ให้ device ที่มี jitter ถูกตัดว่าตายผิด ๆ
+    - timeout = max(srtt + 4 * rttvar, p99 * P99_MARGIN) จำกัดอยู่ในช่วง min/max
+    - timeout ติดกันจะขยาย timeout เป็น 2 เท่าต่อครั้งจนกว่าจะได้ response
+    - retry budget = จำนวนครั้งที่ลองซ้ำได้ภายใน poll_timeout (device เร็วได้ลองซ้ำมากกว่า)
+    """
+
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+    P99_MARGIN = 1.5
+    MIN_SAMPLES = 5  # ก่อนมีข้อมูลพอใช้ initial_timeout
+
+    def __init__(self, initial_timeout: Optional[float] = None,
+                 min_timeout: Optional[float] = None,
+                 max_timeout: Optional[float] = None,
+                 max_retries: Optional[int] = None,
+                 poll_timeout: Optional[float] = None,
+                 window: int = 200):
+        self.initial_timeout = initial_timeout or settings.modbus_request_timeout
+        self.min_timeout = min_timeout or settings.modbus_min_request_timeout
+        self.max_timeout = max_timeout or settings.modbus_max_request_timeout
+        self.max_retries = settings.modbus_max_retries if max_retries is None else max_retries
+        self.poll_timeout = poll_timeout or settings.modbus_poll_timeout
+        self.window = window
+        self._devices: Dict[str, _DeviceRtt] = {}
+
+    def observe(self, device: str, rtt: float):
+        """บันทึก RTT ของ request ที่ได้ response (รวม exception response)"""
+        stats = self._get(device)
+        stats.requests += 1
+        stats.samples.append(rtt)
+        stats.dirty = True
+        stats.last_rtt = rtt
+        stats.backoff = 1
+        stats.updated_at = time.time()
+        if stats.srtt is None:
+            stats.srtt = rtt
+            stats.rttvar = rtt / 2
+        else:
+            stats.rttvar = (1 - self.BETA) * stats.rttvar + self.BETA * abs(stats.srtt - rtt)
+            stats.srtt = (1 - self.ALPHA) * stats.srtt + self.ALPHA * rtt
+
+    def observe_timeout(self, device: str):
+        stats = self._get(device)
+        stats.requests += 1
+        stats.timeouts += 1
+        stats.backoff = min(stats.backoff * 2, 64)
+        stats.updated_at = time.time()
+
+    def timeout_for(self, device: str) -> float:
+        """timeout ของ request ถัดไปของ device นี้ (วินาที)"""
+        stats = self._devices.get(device)
+        if stats is None or len(stats.samples) < self.MIN_SAMPLES:
+            base = self.initial_timeout
+        else:
+            base = max(stats.srtt + 4 * stats.rttvar, self._p99(stats) * self.P99_MARGIN)
+        if stats is not None:
+            base *= stats.backoff
+        return min(max(base, self.min_timeout), self.max_timeout)
+
+    def retry_budget(self, device: str) -> int:
+        """ลองซ้ำได้กี่ครั้งหลัง timeout โดยไม่เกิน poll_timeout"""
+        timeout = self.timeout_for(device)
+        fits = int(self.poll_timeout // timeout) - 1
+        return max(0, min(self.max_retries, fits))
+
+    def get_stats(self) -> Dict[str, Dict]:
+        return {
+            device: {
+                "srtt_ms": self._ms(stats.srtt),
+                "rttvar_ms": self._ms(stats.rttvar if stats.srtt is not None else None),
+                "p99_ms": self._ms(self._p99(stats) if stats.samples else None),
+                "last_rtt_ms": self._ms(stats.last_rtt),
+                "samples": len(stats.samples),
+                "requests": stats.requests,
+                "timeouts": stats.timeouts,
+                "timeout_ms": self._ms(self.timeout_for(device)),
+                "retry_budget": self.retry_budget(device),
+                "updated_at": stats.updated_at,
+            }
+            for device, stats in list(self._devices.items())
+        }
+
+    def reset(self, device: Optional[str] = None):
+        if device is None:
+            self._devices.clear()
+        else:
+            self._devices.pop(device, None)
+
+    def _get(self, device: str) -> _DeviceRtt:
+        stats = self._devices.get(device)
+        if stats is None:
+            stats = self._devices[device] = _DeviceRtt(self.window)
+        return stats
+
+    @staticmethod
+    def _p99(stats: _DeviceRtt) -> float:
+        if stats.dirty:
+            ordered = sorted(stats.samples)
+            stats.p99 = ordered[max(math.ceil(len(ordered) * 0.99) - 1, 0)]
+            stats.dirty = False
+        return stats.p99
+
+    @staticmethod
+    def _ms(value: Optional[float]) -> Optional[float]:
+        return round(value * 1000, 2) if value is not None else None
@@ -0,0 +1,115 @@
+from typing import NamedTuple, Mapping, Tuple, Optional, AsyncIterator, Dict
+from types import MappingProxyType
+from datetime import datetime
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+_EMPTY: Mapping = MappingProxyType({})
+
+class AcquisitionSnapshot(NamedTuple):
+    """ค่าล่าสุดจาก acquisition 1 ชุด - แก้ไขไม่ได้ ผู้อ่านหลายรายใช้ร่วมกันได้โดยไม่ต้อง copy"""
+    seq: int  # นับเพิ่มทุกครั้งที่ publish
+    change_seq: int  # นับเพิ่มเฉพาะเมื่อมีค่าผ่าน deadband (ดู DeadbandFilter)
+    slot: Optional[int]  # slot ของ poll tick
+    timestamp: Optional[datetime]  # เวลาของ slot (ไม่ใช่เวลาที่อ่านเสร็จ)
+    values: Mapping[str, float]
+    changes: Mapping[str, float]
+    status: str
+    status_alarms: Optional[Tuple[Mapping, ...]]  # None = ยังไม่เคยอ่าน coil
+    status_timestamp: Optional[datetime]
+
+EMPTY_SNAPSHOT = AcquisitionSnapshot(
+    seq=0, change_seq=0, slot=None, timestamp=None, values=_EMPTY, changes=_EMPTY,
+    status="init", status_alarms=None, status_timestamp=None,
+)
+
+class SnapshotHub:
+    """จุดเดียวที่ถือค่าล่าสุดจาก Modbus
+
+    มีเจ้าของเดียว (poll loop) ที่ publish ส่วน REST, WebSocket, ingest และ alarm อ่าน latest()
+    หรือ subscribe() รอ snapshot ใหม่ - จำนวนผู้ใช้ไม่มีผลต่อจำนวน request ที่ไปถึง device
+    """
+
+    def __init__(self):
+        self._latest = EMPTY_SNAPSHOT
+        self._published = asyncio.Event()
+        self.subscribers = 0
+
+    def latest(self) -> AcquisitionSnapshot:
+        return self._latest
+
+    def publish_values(self, values: Dict[str, float], changes: Dict[str, float], change_seq: int,
+                       slot: Optional[int], timestamp: Optional[datetime], status: str = "ok") -> AcquisitionSnapshot:
+        return self._publish(
+            values=MappingProxyType(dict(values or {})),
+            changes=MappingProxyType(dict(changes or {})),
+            change_seq=change_seq,
+            slot=slot,
+            timestamp=timestamp,
+            status=status,
+        )
+
+    def publish_status(self, status: str) -> AcquisitionSnapshot:
+        """รอบ poll ล้มเหลว - คงค่าเดิมไว้ เปลี่ยนเฉพาะ status"""
+        return self._publish(status=status)
+
+    def publish_status_alarms(self, items, timestamp: Optional[datetime]) -> AcquisitionSnapshot:
+        return self._publish(
+            status_alarms=tuple(MappingProxyType(dict(item)) for item in items or []),
+            status_timestamp=timestamp,
+        )
+
+    def publish_snapshot(self, snapshot: AcquisitionSnapshot) -> AcquisitionSnapshot:
+        """ใช้ snapshot ที่สร้างจากที่อื่นทั้งก้อน (เช่น อ่านจาก shared memory ของ worker ที่เป็นผู้ poll)"""
+        self._set(snapshot)
+        return snapshot
+
+    def _publish(self, **fields) -> AcquisitionSnapshot:
+        snapshot = self._latest._replace(seq=self._latest.seq + 1, **fields)
+        self._set(snapshot)
+        return snapshot
+
+    def _set(self, snapshot: AcquisitionSnapshot):
+        self._latest = snapshot
+        # ปลุกผู้รอทั้งหมด แล้วเริ่ม event ใหม่สำหรับ snapshot ถัดไป
+        published, self._published = self._published, asyncio.Event()
+        published.set()
+
+    async def wait_next(self, after_seq: int, timeout: Optional[float] = None) -> AcquisitionSnapshot:
+        """รอ snapshot ที่ seq มากกว่า after_seq - ถ้า timeout คืนตัวล่าสุดที่มี"""
+        while self._latest.seq <= after_seq:
+            try:
+                await asyncio.wait_for(self._published.wait(), timeout)
+            except asyncio.TimeoutError:
+                break
+        return self._latest
+
+    async def subscribe(self, after_seq: int = 0) -> AsyncIterator[AcquisitionSnapshot]:
+        """ส่ง snapshot ใหม่ทุกครั้งที่ publish - ผู้อ่านที่ช้าจะได้ตัวล่าสุดเท่านั้น (ข้าม snapshot ระหว่างทาง)"""
+        self.subscribers += 1
+        try:
+            seq = after_seq
+            while True:
+                snapshot = await self.wait_next(seq)
+                seq = snapshot.seq
+                yield snapshot
+        finally:
+            self.subscribers -= 1
+
+    def get_stats(self) -> Dict:
+        snapshot = self._latest
+        return {
+            "seq": snapshot.seq,
+            "change_seq": snapshot.change_seq,
+            "slot": snapshot.slot,
+            "timestamp": snapshot.timestamp.isoformat() if snapshot.timestamp else None,
+            "status": snapshot.status,
+            "values": len(snapshot.values),
+            "status_alarms": len(snapshot.status_alarms or ()),
+            "subscribers": self.subscribers,
+        }
+
+# ใช้ร่วมกันทั้งแอป
+snapshot_hub = SnapshotHub()
@@ -4,9 +4,9 @@ from app.services.modbus_data_service import ModbusDataService
 from app.services.config_service import ConfigService
 
 class StatusAlarmService:
-    def __init__(self, config_service=None):
+    def __init__(self, config_service=None, modbus_data_service: ModbusDataService = None):
         self.config_service = config_service or ConfigService()
-        self.modbus_service = ModbusDataService(self.config_service)
+        self.modbus_service = modbus_data_service or ModbusDataService(self.config_service)
         # เพิ่ม cache เพื่อลดการอ่าน Modbus ซ้ำ
         self._cache = {}
         self._cache_timeout = 0.1  # ลดเป็น 0.1 วินาที เพื่อให้ real-time มากขึ้น
@@ -46,23 +46,29 @@ class StatusAlarmService:
                 return self._cache
             
             results = []
-            
-            for mapping in mappings:
-                if not mapping.get("enabled", True):
-                    continue
-                    
+            enabled = [m for m in mappings if m.get("enabled", True)]
+
+            # อ่าน coil ทั้งหมดของแต่ละ device ในครั้งเดียว (1 round trip ต่อ block)
+            addresses: Dict[str, List[int]] = {}
+            for mapping in enabled:
+                addresses.setdefault(mapping["device"], []).append(mapping["address"])
+
+            bitmaps = {}  # device -> (base, values, valid, error)
+            for device_name, device_addresses in addresses.items():
                 try:
-                    # อ่านค่า digital จาก Modbus
-                    device_name = mapping["device"]
-                    address = mapping["address"]
-                    
-                    # บังคับให้ reconnect Modbus ทุกครั้ง
-                    self.modbus_service.disconnect_device(device_name)
-                    
-                    # อ่านค่า coil status (0 หรือ 1)
-                    value = self.modbus_service.read_coil_status(device_name, address)
-                    print(f"DEBUG: Read {mapping['name']} from {device_name} address {address} = {value}")
-                    
+                    bitmaps[device_name] = self.modbus_service.read_coil_bitmap(device_name, device_addresses) + (None,)
+                except Exception as e:
+                    print(f"Error reading status/alarm coils from {device_name}: {e}")
+                    bitmaps[device_name] = (0, 0, 0, str(e))
+
+            # แยกค่าจาก bitmask ให้แต่ละ mapping
+            for mapping in enabled:
+                device_name = mapping["device"]
+                address = mapping["address"]
+                base, values, valid, error = bitmaps[device_name]
+                bit = address - base
+                if error is None and (valid >> bit) & 1:
+                    value = (values >> bit) & 1
                     results.append({
                         "id": mapping["id"],
                         "name": mapping["name"],
@@ -74,9 +80,7 @@ class StatusAlarmService:
                         "timestamp": datetime.now(),
                         "enabled": mapping.get("enabled", True)
                     })
-                    
-                except Exception as e:
-                    print(f"Error reading {mapping['name']}: {e}")
+                else:
                     results.append({
                         "id": mapping["id"],
                         "name": mapping["name"],
@@ -87,7 +91,7 @@ class StatusAlarmService:
                         "status": "ERROR",
                         "timestamp": datetime.now(),
                         "enabled": mapping.get("enabled", True),
-                        "error": str(e)
+                        "error": error or f"Coil {address} could not be read"
                     })
             
             # บันทึก cache และข้อมูล mapping
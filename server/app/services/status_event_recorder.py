@@ -0,0 +1,112 @@
+from typing import Callable, Deque, List, Dict, Optional, Iterable, Mapping
+from collections import deque
+from datetime import datetime
+from app.domain.status_model import StatusEvent
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_PENDING_EVENTS = 10000  # event ที่ยังบันทึกไม่สำเร็จเก็บรอได้มากสุด (เกินแล้วทิ้งตัวเก่าสุด)
+
+def state_from_items(items: Iterable[Mapping]) -> Dict[str, Optional[int]]:
+    """สถานะจากผลการอ่าน status/alarm รอบล่าสุด (1 = ON, None = อ่านไม่ได้)
+
+    items มาจาก snapshot (status_alarms) ซึ่งทุก worker มีผ่าน shared table - ไม่ขึ้นกับ worker ที่ตอบ
+    """
+    return {
+        item["name"]: None if item.get("status") == "ERROR" else (1 if item["value"] else 0)
+        for item in items
+    }
+
+class StatusEventRecorder:
+    """ตรวจการเปลี่ยนค่าของ status/alarm coil และคืนเฉพาะ edge (old -> new)
+
+    สถานะปัจจุบันเก็บเป็น bitmap: bit ของแต่ละ status/alarm ตามลำดับที่พบครั้งแรก
+    - values: ค่า (1 = ON) ของทุกตัว
+    - known: ตัวที่อ่านได้ในรอบล่าสุด (coil ที่อ่านไม่ได้ไม่นับเป็นการเปลี่ยน)
+    รอบที่ค่าไม่เปลี่ยนไม่มี event เลย - ประวัติจึงเก็บแค่จุดที่เปลี่ยน
+    event ทุกตัวเข้า pending ก่อน และออกเมื่อ flush() บันทึกสำเร็จเท่านั้น (InfluxDB ล่ม = ลองใหม่รอบถัดไป)
+    """
+
+    def __init__(self):
+        self.index: Dict[str, int] = {}  # ชื่อ -> ตำแหน่ง bit
+        self.values = 0
+        self.known = 0
+        self.seen = 0  # ตัวที่เคยอ่านได้อย่างน้อยครั้งหนึ่ง
+        self.last_timestamp: Optional[datetime] = None
+        self.observations = 0
+        self.events = 0
+        self.pending: Deque[StatusEvent] = deque(maxlen=MAX_PENDING_EVENTS)
+        self.dropped = 0
+        self.failed_flushes = 0
+
+    def observe(self, items: Iterable[Mapping], timestamp: datetime) -> List[StatusEvent]:
+        """เทียบผลการอ่านรอบนี้กับ bitmap แล้วคืน event ของตัวที่ค่าเปลี่ยน"""
+        events = []
+        known = 0
+        for item in items:
+            name = item["name"]
+            bit = self.index.get(name)
+            if bit is None:
+                bit = self.index[name] = len(self.index)
+            if item.get("status") == "ERROR":
+                continue
+            mask = 1 << bit
+            known |= mask
+            new = 1 if item["value"] else 0
+            old = (self.values >> bit) & 1 if self.seen & mask else None
+            if old == new:
+                continue
+            events.append(StatusEvent(
+                name=name,
+                type=item.get("type", "status"),
+                device=item.get("device", ""),
+                address=item.get("address", 0),
+                old=old,
+                new=new,
+                timestamp=timestamp,
+            ))
+            self.values = self.values | mask if new else self.values & ~mask
+            self.seen |= mask
+
+        self.known = known
+        self.last_timestamp = timestamp
+        self.observations += 1
+        self.events += len(events)
+        if len(self.pending) + len(events) > MAX_PENDING_EVENTS:
+            self.dropped += len(self.pending) + len(events) - MAX_PENDING_EVENTS
+        self.pending.extend(events)
+        return events
+
+    def flush(self, save: Callable[[List[StatusEvent]], bool]) -> bool:
+        """บันทึก event ที่ค้างอยู่ทั้งหมด (เก่าไปใหม่) - ลบออกจาก pending เฉพาะเมื่อ save คืน True"""
+        if not self.pending:
+            return True
+        events = list(self.pending)
+        if not save(events):
+            self.failed_flushes += 1
+            logger.warning(f"Saving {len(events)} status events failed - will retry")
+            return False
+        for _ in events:
+            self.pending.popleft()
+        return True
+
+    def current_state(self) -> Dict[str, Optional[int]]:
+        """ค่าปัจจุบันของแต่ละตัวจาก bitmap (None = อ่านไม่ได้ในรอบล่าสุด)"""
+        return {
+            name: (self.values >> bit) & 1 if (self.known >> bit) & 1 else None
+            for name, bit in self.index.items()
+        }
+
+    def get_stats(self) -> Dict:
+        return {
+            "tracked": len(self.index),
+            "values": self.values,
+            "known": self.known,
+            "observations": self.observations,
+            "events": self.events,
+            "pending": len(self.pending),
+            "dropped": self.dropped,
+            "failed_flushes": self.failed_flushes,
+            "last_timestamp": self.last_timestamp,
+        }
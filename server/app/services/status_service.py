@@ -3,11 +3,17 @@ from datetime import datetime
 from app.domain.status_model import StatusItem, AlarmItem, StatusResponse
 from app.services.status_alarm_sevice import StatusAlarmService
 from app.services.config_service import ConfigService
+from app.services.snapshot_hub import SnapshotHub, snapshot_hub as default_snapshot_hub
 
 class StatusService:
-    def __init__(self, config_service=None):
+    def __init__(self, config_service=None, status_alarm_service: StatusAlarmService = None, snapshot_hub: SnapshotHub = None):
         self.config_service = config_service or ConfigService()
-        self.status_alarm_service = StatusAlarmService(config_service=self.config_service)
+        self.status_alarm_service = status_alarm_service or StatusAlarmService(config_service=self.config_service)
+        # ค่า coil มาจาก snapshot ที่ status poll loop publish - ไม่อ่าน Modbus เองต่อ request
+        self.snapshot_hub = snapshot_hub or default_snapshot_hub
+        # StatusResponse ที่สร้างจาก status_alarms ชุดล่าสุด - สร้างใหม่เฉพาะเมื่อ status poll publish ชุดใหม่
+        self._built_for = None
+        self._built: Optional[StatusResponse] = None
     
     def get_status(self) -> StatusResponse:
         # รายการเริ่มต้น (เหมือนเต้าเสียบที่ว่าง) - ย้ายมาที่ต้นฟังก์ชัน
@@ -38,8 +44,9 @@ class StatusService:
         
         # ลองอ่านข้อมูลจาก Modbus ก่อน
         try:
-            modbus_data = self.status_alarm_service.read_status_alarm_data()
-            print(f"DEBUG: StatusService received modbus_data: {modbus_data}")
+            modbus_data = self.snapshot_hub.latest().status_alarms or ()
+            if modbus_data and modbus_data is self._built_for:
+                return self._built
             
             # ถ้ามีข้อมูล Modbus ให้ใช้
             if modbus_data:
@@ -96,12 +103,14 @@ class StatusService:
                             acknowledged=True  # Default เป็น inactive รอการแมพ
                         ))
                 
-                return StatusResponse(
+                self._built = StatusResponse(
                     system_status="online",
                     active_alarms=active_alarms,
                     statuses=all_statuses,
                     alarms=all_alarms
                 )
+                self._built_for = modbus_data
+                return self._built
             
         except Exception as e:
             print(f"Error reading Modbus data: {e}")
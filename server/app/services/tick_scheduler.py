@@ -0,0 +1,99 @@
+from typing import NamedTuple, Dict, Optional
+from datetime import datetime, timezone, timedelta
+import asyncio
+import math
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+thailand_tz = timezone(timedelta(hours=7))
+
+class Tick(NamedTuple):
+    slot: int  # ลำดับช่วงเวลานับจาก epoch (= scheduled_ts / interval)
+    scheduled_at: datetime  # เวลาตามนาฬิกาที่ tick นี้ควรเกิด (Thailand time)
+    late_by: float  # วินาทีที่เกิดช้ากว่ากำหนด
+    skipped: int  # จำนวน slot ที่หลุดไปก่อนหน้า tick นี้
+
+class TickScheduler:
+    """ปลุกตามขอบเวลาจริงของนาฬิกา (เช่น ทุกวินาทีที่ .000) โดยนับเวลาด้วย monotonic clock
+
+    ต่างจาก asyncio.sleep(interval) หลังทำงานเสร็จ ซึ่งทำให้รอบจริงยาวเท่ากับ interval + เวลาทำงาน
+    ถ้างานรอบก่อนใช้เวลาเกิน interval จะนับเป็น overrun และ slot ที่หลุดไปทั้งช่วงจะนับเป็น skipped
+    """
+
+    # ถ้าเวลานาฬิกาถูกปรับกระโดดเกินค่านี้ (วินาที) ให้คำนวณจุดอ้างอิงใหม่
+    CLOCK_STEP_TOLERANCE = 0.5
+
+    def __init__(self, interval: float, name: str = "tick"):
+        self.interval = interval
+        self.name = name
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.last_late_by = 0.0
+        self.max_late_by = 0.0
+        self._offset = None  # time.time() - time.monotonic() ตอนตั้งจุดอ้างอิง
+        self._next_slot: Optional[int] = None
+
+    def set_interval(self, interval: float):
+        """เปลี่ยนความถี่ - เริ่มนับ slot ใหม่ที่ขอบเวลาถัดไป"""
+        if interval != self.interval:
+            self.interval = interval
+            self._next_slot = None
+
+    async def wait_next(self) -> Tick:
+        """รอจนถึงขอบเวลาถัดไป แล้วคืน Tick ของ slot นั้น"""
+        now_wall = self._wall_now()
+        current_slot = math.floor(now_wall / self.interval)
+
+        skipped = 0
+        if self._next_slot is None:
+            slot = current_slot + 1
+        elif current_slot >= self._next_slot:
+            # งานรอบก่อนเกินเวลา - slot ที่ควรเกิดผ่านไปแล้ว ทำ slot ปัจจุบันทันที
+            slot = current_slot
+            skipped = current_slot - self._next_slot
+            self.overruns += 1
+            self.skipped += skipped
+            if skipped:
+                logger.warning(f"{self.name}: skipped {skipped} tick(s) of {self.interval}s")
+        else:
+            slot = self._next_slot
+
+        delay = slot * self.interval - now_wall
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        late_by = max(self._wall_now() - slot * self.interval, 0.0)
+        self._next_slot = slot + 1
+        self.ticks += 1
+        self.last_late_by = late_by
+        self.max_late_by = max(self.max_late_by, late_by)
+
+        return Tick(
+            slot=slot,
+            scheduled_at=datetime.fromtimestamp(slot * self.interval, thailand_tz),
+            late_by=late_by,
+            skipped=skipped,
+        )
+
+    def _wall_now(self) -> float:
+        """เวลานาฬิกาที่คำนวณจาก monotonic clock (ไม่สะดุดตาม NTP ทีละนิด)"""
+        offset = time.time() - time.monotonic()
+        if self._offset is None or abs(offset - self._offset) > self.CLOCK_STEP_TOLERANCE:
+            if self._offset is not None:
+                logger.warning(f"{self.name}: wall clock stepped by {offset - self._offset:.3f}s, re-anchoring")
+                self._next_slot = None
+            self._offset = offset
+        return time.monotonic() + self._offset
+
+    def get_stats(self) -> Dict:
+        return {
+            "interval": self.interval,
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "last_late_ms": round(self.last_late_by * 1000, 2),
+            "max_late_ms": round(self.max_late_by * 1000, 2),
+        }
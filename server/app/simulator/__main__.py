@@ -0,0 +1,74 @@
+"""Modbus TCP simulator
+
+    cd server && python -m app.simulator --port-offset 5000 --units 200 --latency 5 --jitter 2
+
+register map สร้างจาก config/devices.json, config/mappings.json และ config/status_alarm.json
+"""
+from app.domain.simulator_model import FaultProfile, WaveformConfig
+from app.simulator.builder import build_from_files
+from app.simulator.server import ModbusSimulator
+import argparse
+import asyncio
+import json
+import logging
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog="python -m app.simulator", description="Modbus TCP device simulator")
+    parser.add_argument("--config-dir", default="config", help="โฟลเดอร์ที่มี devices.json / mappings.json")
+    parser.add_argument("--host", default="127.0.0.1", help="address ที่ bind")
+    parser.add_argument("--port-offset", type=int, default=0, help="บวกเพิ่มจาก port ใน devices.json (เช่น 5000)")
+    parser.add_argument("--units", type=int, default=0, help="จำนวน unit ต่อ gateway (copy register map ของ unit แรก)")
+    parser.add_argument("--latency", type=float, default=0.0, help="ms ต่อ request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="ms")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="สัดส่วน request ที่ไม่ตอบ (0-1)")
+    parser.add_argument("--exception-rate", type=float, default=0.0, help="สัดส่วน request ที่ตอบ exception (0-1)")
+    parser.add_argument("--exception-code", type=int, default=4)
+    parser.add_argument("--strict", action="store_true", help="ตอบ illegal address เมื่ออ่านช่วงที่ไม่มี mapping")
+    parser.add_argument("--waveforms", help="JSON: {\"<mapping name>\": {\"kind\": \"sine\", \"base\": ..., ...}}")
+    parser.add_argument("--seed", type=int, default=None, help="seed ของ noise/jitter/drop เพื่อให้ผลซ้ำได้")
+    return parser.parse_args()
+
+async def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    waveforms = {}
+    if args.waveforms:
+        with open(args.waveforms, "r", encoding="utf-8") as f:
+            waveforms = {name: WaveformConfig(**w) for name, w in json.load(f).items()}
+
+    faults = FaultProfile(
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        drop_rate=args.drop_rate,
+        exception_rate=args.exception_rate,
+        exception_code=args.exception_code,
+        strict_addresses=args.strict,
+    )
+    gateways = build_from_files(
+        args.config_dir,
+        units_per_gateway=args.units,
+        bind_host=args.host,
+        port_offset=args.port_offset,
+        faults=faults,
+        waveforms=waveforms,
+    )
+    if not gateways:
+        print("No devices found in config - nothing to simulate")
+        return
+
+    simulator = ModbusSimulator(gateways, seed=args.seed)
+    await simulator.start()
+    for gateway in gateways:
+        print(f"Simulating {gateway.source} on {gateway.host}:{gateway.port} "
+              f"units={sorted(gateway.units)[:5]}{'...' if len(gateway.units) > 5 else ''} ({len(gateway.units)})")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await simulator.stop()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,127 @@
+from typing import List, Dict, Tuple, Optional
+from app.domain.config_model import DeviceConfig, MappingConfig
+from app.domain.simulator_model import (
+    WaveformConfig, SimulatedChannel, SimulatedCoil, SimulatedUnit, SimulatedGateway, FaultProfile,
+)
+import json
+import os
+
+# ค่ากลางและช่วงแกว่งโดยประมาณของแต่ละ parameter (ใช้เมื่อไม่ได้กำหนด waveform)
+DEFAULT_WAVEFORMS = {
+    "SO2": (50.0, 5.0),
+    "NOx": (120.0, 10.0),
+    "O2": (10.0, 0.5),
+    "CO": (30.0, 3.0),
+    "CO2": (8.0, 0.5),
+    "Dust": (5.0, 0.5),
+    "Temperature": (180.0, 5.0),
+    "Velocity": (15.0, 1.0),
+    "Flowrate": (50000.0, 2000.0),
+    "Pressure": (101.3, 0.5),
+}
+
+def load_json(path: str) -> list:
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def default_waveform(name: str, unit: int = 1) -> WaveformConfig:
+    base, amplitude = DEFAULT_WAVEFORMS.get(name, (50.0, 5.0))
+    # แต่ละ unit เริ่มคนละ phase เพื่อไม่ให้ทุกตัวขึ้นลงพร้อมกัน
+    return WaveformConfig(kind="sine", base=base, amplitude=amplitude, period=60.0,
+                          noise=amplitude * 0.01, phase=(unit * 7) % 60)
+
+def build_gateways(devices: List[DeviceConfig], mappings: List[MappingConfig],
+                   status_alarms: Optional[List[Dict]] = None,
+                   units_per_gateway: int = 0,
+                   bind_host: str = "127.0.0.1",
+                   port_offset: int = 0,
+                   faults: Optional[FaultProfile] = None,
+                   waveforms: Optional[Dict[str, WaveformConfig]] = None) -> List[SimulatedGateway]:
+    """สร้าง gateway จำลองจาก devices/mappings/status_alarm ตาม config ของระบบ
+
+    device ที่ host:port เดียวกันอยู่ใน gateway เดียวกัน (แยกตาม unit id)
+    units_per_gateway > 0 จะเพิ่ม unit ที่ copy register map ของ unit แรกจนครบจำนวน
+    """
+    waveforms = waveforms or {}
+    gateways: Dict[Tuple[str, int], SimulatedGateway] = {}
+
+    for device in devices:
+        key = (device.host, device.port)
+        gateway = gateways.get(key)
+        if gateway is None:
+            gateway = SimulatedGateway(
+                host=bind_host,
+                port=device.port + port_offset if device.port else 0,
+                faults=faults or FaultProfile(),
+                source=f"{device.host}:{device.port}",
+            )
+            gateways[key] = gateway
+        gateway.units[device.unit] = _build_unit(device.name, device.unit, mappings, status_alarms or [], waveforms)
+
+    if units_per_gateway > 0:
+        for gateway in gateways.values():
+            template = gateway.units[min(gateway.units)]
+            for unit in range(1, units_per_gateway + 1):
+                if unit in gateway.units:
+                    continue
+                gateway.units[unit] = SimulatedUnit(
+                    unit=unit,
+                    device=f"{template.device}#{unit}",
+                    channels=[
+                        c.model_copy(update={"waveform": waveforms.get(c.name) or default_waveform(c.name, unit)})
+                        for c in template.channels
+                    ],
+                    coils=list(template.coils),
+                )
+    return list(gateways.values())
+
+def build_from_files(config_dir: str = "config", **kwargs) -> List[SimulatedGateway]:
+    """อ่าน devices.json, mappings.json และ status_alarm.json จากโฟลเดอร์ config"""
+    devices = [DeviceConfig(**d) for d in load_json(os.path.join(config_dir, "devices.json"))]
+    mappings = [MappingConfig(**m) for m in load_json(os.path.join(config_dir, "mappings.json"))]
+    status_alarms = load_json(os.path.join(config_dir, "status_alarm.json"))
+    return build_gateways(devices, mappings, status_alarms, **kwargs)
+
+def to_configs(gateways: List[SimulatedGateway]) -> Tuple[List[DeviceConfig], List[MappingConfig]]:
+    """devices/mappings ที่ชี้มาที่ simulator (ใช้กับ ModbusDataService ใน test หรือ benchmark)
+
+    ชื่อ mapping ของ unit ที่ copy มาต่อท้ายด้วยชื่อ device เพื่อไม่ให้ซ้ำกัน
+    """
+    devices, mappings = [], []
+    for gateway in gateways:
+        for unit in gateway.units.values():
+            devices.append(DeviceConfig(name=unit.device, host=gateway.host, port=gateway.port, unit=unit.unit))
+            for channel in unit.channels:
+                name = channel.name if "#" not in unit.device else f"{channel.name}@{unit.device}"
+                mappings.append(MappingConfig(
+                    name=name,
+                    unit="",
+                    address=channel.address,
+                    dataType=channel.dataType,
+                    format=channel.format,
+                    count=2 if channel.dataType in ("float32", "int32", "uint32") else 1,
+                    device=unit.device,
+                ))
+    return devices, mappings
+
+def _build_unit(device_name: str, unit: int, mappings: List[MappingConfig],
+                status_alarms: List[Dict], waveforms: Dict[str, WaveformConfig]) -> SimulatedUnit:
+    channels = [
+        SimulatedChannel(
+            name=m.name,
+            address=m.address,
+            dataType=m.dataType,
+            format=m.format,
+            waveform=waveforms.get(m.name) or default_waveform(m.name, unit),
+        )
+        for m in mappings
+        if m.device == device_name
+    ]
+    coils = [
+        SimulatedCoil(name=s.get("name", ""), address=s["address"], period=30.0 + i * 5)
+        for i, s in enumerate(status_alarms)
+        if s.get("device") == device_name
+    ]
+    return SimulatedUnit(unit=unit, device=device_name, channels=channels, coils=coils)
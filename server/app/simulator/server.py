@@ -0,0 +1,260 @@
+from typing import List, Dict, Optional
+from app.domain.simulator_model import SimulatedGateway, SimulatedUnit
+from app.infrastructure.modbus_frame import (
+    read_frame, encode_frame, decode_read_request, encode_register_response, encode_bit_response,
+    encode_exception, ModbusFrameError, BIT_FUNCTIONS, REGISTER_FUNCTIONS,
+    ILLEGAL_FUNCTION, ILLEGAL_DATA_ADDRESS, ILLEGAL_DATA_VALUE, GATEWAY_TARGET_FAILED,
+)
+from app.services.register_decoder import encode_value
+from app.services.read_plan_service import REGISTER_WIDTH
+from app.simulator.waveforms import Waveform
+import asyncio
+import random
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_REGISTERS = 125
+MAX_BITS = 2000
+
+class _UnitState:
+    """register map ของ unit หนึ่งตัวที่เตรียมไว้สำหรับตอบ request"""
+
+    def __init__(self, unit: SimulatedUnit, rng: random.Random):
+        self.unit = unit
+        # (address, จำนวน register, dataType, format, waveform) เรียงตาม address
+        self.channels = sorted(
+            (
+                (c.address, REGISTER_WIDTH.get(c.dataType, 2), c.dataType, c.format, Waveform(c.waveform, rng))
+                for c in unit.channels
+            ),
+            key=lambda c: c[0],
+        )
+        self.coils = {c.address: c for c in unit.coils}
+
+    def read_registers(self, address: int, count: int, t: float, strict: bool) -> Optional[List[int]]:
+        registers = [0] * count
+        end = address + count
+        covered = 0
+        for start, width, data_type, format, waveform in self.channels:
+            if start >= end or start + width <= address:
+                continue
+            values = encode_value(waveform.value(t), data_type, format)
+            for i, value in enumerate(values):
+                position = start + i - address
+                if 0 <= position < count:
+                    registers[position] = value
+                    covered += 1
+        if strict and covered < count:
+            return None
+        return registers
+
+    def read_bits(self, address: int, count: int, t: float, strict: bool) -> Optional[List[int]]:
+        bits = []
+        for a in range(address, address + count):
+            coil = self.coils.get(a)
+            if coil is None:
+                if strict:
+                    return None
+                bits.append(0)
+            elif coil.period > 0:
+                bits.append(int(t // coil.period) % 2)
+            else:
+                bits.append(1 if coil.value else 0)
+        return bits
+
+class _GatewayState:
+    def __init__(self, gateway: SimulatedGateway, rng: random.Random):
+        self.gateway = gateway
+        self.units = {unit_id: _UnitState(unit, rng) for unit_id, unit in gateway.units.items()}
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.handlers: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+        self.connections = 0
+        self.requests = 0
+        self.responses = 0
+        self.drops = 0
+        self.exceptions = 0
+
+class ModbusSimulator:
+    """Modbus TCP server จำลองสำหรับทดสอบ acquisition โดยไม่ต้องมี analyzer จริง
+
+    - register map สร้างจาก devices/mappings (ดู app.simulator.builder)
+    - ค่าแต่ละ channel มาจาก waveform (sine, ramp, square, random_walk, constant)
+    - จำลอง latency, jitter, request ที่ไม่ตอบ และ exception response ตาม FaultProfile ของ gateway
+    - request ใน connection เดียวกันตอบทีละตัวตามลำดับเหมือน gateway จริง
+      (ยกเว้น gateway ที่ตั้ง faults.pipelining - ตอบ request ที่ค้างพร้อมกัน)
+
+    ใช้ได้ทั้ง `async with ModbusSimulator(...)` และ start_in_thread()/stop_thread() สำหรับโค้ดแบบ sync
+    """
+
+    def __init__(self, gateways: List[SimulatedGateway], seed: Optional[int] = None):
+        self.rng = random.Random(seed)
+        self.gateways = [_GatewayState(g, self.rng) for g in gateways]
+        self.started_at = time.monotonic()
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop_event: Optional[asyncio.Event] = None
+
+    async def start(self):
+        self.started_at = time.monotonic()
+        for state in self.gateways:
+            gateway = state.gateway
+            state.server = await asyncio.start_server(
+                lambda r, w, s=state: self._handle(s, r, w), gateway.host, gateway.port
+            )
+            # port 0 = ให้ระบบเลือก port ว่าง
+            gateway.port = state.server.sockets[0].getsockname()[1]
+            logger.info(f"Simulated gateway on {gateway.host}:{gateway.port} ({len(gateway.units)} units)")
+
+    async def stop(self):
+        for state in self.gateways:
+            if state.server is not None:
+                state.server.close()
+                state.server = None
+            # ปิด connection ที่ค้างอยู่ให้ handler จบเอง
+            handlers = list(state.handlers.items())
+            for _, writer in handlers:
+                writer.close()
+            if handlers:
+                await asyncio.gather(*(task for task, _ in handlers), return_exceptions=True)
+
+    async def serve_forever(self):
+        await self.start()
+        self._stop_event = asyncio.Event()
+        try:
+            await self._stop_event.wait()
+        finally:
+            await self.stop()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    def start_in_thread(self, timeout: float = 5.0):
+        """เปิด simulator ใน thread แยก (event loop ของตัวเอง) - คืนเมื่อพร้อมรับ connection"""
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self.start())
+            self._stop_event = asyncio.Event()
+            ready.set()
+            self._loop.run_until_complete(self._stop_event.wait())
+            self._loop.run_until_complete(self.stop())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="modbus-simulator", daemon=True)
+        self._thread.start()
+        if not ready.wait(timeout):
+            raise RuntimeError("Modbus simulator failed to start")
+        return self
+
+    def stop_thread(self, timeout: float = 5.0):
+        if self._thread is None:
+            return
+        self._loop.call_soon_threadsafe(self._stop_event.set)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def get_stats(self) -> List[Dict]:
+        return [
+            {
+                "gateway": f"{s.gateway.host}:{s.gateway.port}",
+                "source": s.gateway.source,
+                "units": len(s.units),
+                "connections": s.connections,
+                "requests": s.requests,
+                "responses": s.responses,
+                "drops": s.drops,
+                "exceptions": s.exceptions,
+            }
+            for s in self.gateways
+        ]
+
+    async def _handle(self, state: _GatewayState, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        state.connections += 1
+        task = asyncio.current_task()
+        state.handlers[task] = writer
+        inflight = set()
+        try:
+            while True:
+                transaction_id, unit, pdu = await read_frame(reader)
+                state.requests += 1
+                if state.gateway.faults.pipelining:
+                    reply = asyncio.create_task(self._reply(state, writer, transaction_id, unit, pdu))
+                    inflight.add(reply)
+                    reply.add_done_callback(inflight.discard)
+                else:
+                    await self._reply(state, writer, transaction_id, unit, pdu)
+        except (asyncio.IncompleteReadError, ConnectionError, ModbusFrameError):
+            pass
+        finally:
+            for reply in inflight:
+                reply.cancel()
+            state.connections -= 1
+            state.handlers.pop(task, None)
+            writer.close()
+
+    async def _reply(self, state: _GatewayState, writer: asyncio.StreamWriter,
+                     transaction_id: int, unit: int, pdu: bytes):
+        response = await self._respond(state, unit, pdu)
+        if response is None:
+            state.drops += 1
+            return
+        writer.write(encode_frame(transaction_id, unit, response))
+        await writer.drain()
+        state.responses += 1
+
+    async def _respond(self, state: _GatewayState, unit_id: int, pdu: bytes) -> Optional[bytes]:
+        faults = state.gateway.faults
+        delay = faults.latency
+        if faults.jitter:
+            delay += self.rng.uniform(-faults.jitter, faults.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if faults.drop_rate and self.rng.random() < faults.drop_rate:
+            return None
+
+        function = pdu[0]
+        if function not in BIT_FUNCTIONS and function not in REGISTER_FUNCTIONS:
+            state.exceptions += 1
+            return encode_exception(function, ILLEGAL_FUNCTION)
+
+        unit = state.units.get(unit_id)
+        if unit is None:
+            state.exceptions += 1
+            return encode_exception(function, GATEWAY_TARGET_FAILED)
+
+        if faults.exception_rate and self.rng.random() < faults.exception_rate:
+            state.exceptions += 1
+            return encode_exception(function, faults.exception_code)
+
+        _, address, count = decode_read_request(pdu)
+        limit = MAX_BITS if function in BIT_FUNCTIONS else MAX_REGISTERS
+        if not 1 <= count <= limit:
+            state.exceptions += 1
+            return encode_exception(function, ILLEGAL_DATA_VALUE)
+        if address + count > 0x10000:
+            state.exceptions += 1
+            return encode_exception(function, ILLEGAL_DATA_ADDRESS)
+
+        t = time.monotonic() - self.started_at
+        if function in BIT_FUNCTIONS:
+            bits = unit.read_bits(address, count, t, faults.strict_addresses)
+            if bits is None:
+                state.exceptions += 1
+                return encode_exception(function, ILLEGAL_DATA_ADDRESS)
+            return encode_bit_response(function, bits)
+
+        registers = unit.read_registers(address, count, t, faults.strict_addresses)
+        if registers is None:
+            state.exceptions += 1
+            return encode_exception(function, ILLEGAL_DATA_ADDRESS)
+        return encode_register_response(function, registers)
@@ -0,0 +1,33 @@
+from app.domain.simulator_model import WaveformConfig
+import math
+import random
+
+class Waveform:
+    """สร้างค่าของ channel จำลองตามเวลา (วินาทีนับจากเริ่ม simulator)"""
+
+    def __init__(self, config: WaveformConfig, rng: random.Random):
+        self.config = config
+        self.rng = rng
+        self._walk = config.base
+
+    def value(self, t: float) -> float:
+        c = self.config
+        period = c.period if c.period > 0 else 1.0
+        cycle = ((t + c.phase) / period) % 1.0
+
+        if c.kind == "constant":
+            value = c.base
+        elif c.kind == "ramp":
+            value = c.base + c.amplitude * (cycle * 2 - 1)
+        elif c.kind == "square":
+            value = c.base + (c.amplitude if cycle < 0.5 else -c.amplitude)
+        elif c.kind == "random_walk":
+            step = self.rng.gauss(0, c.amplitude * 0.05)
+            self._walk = min(max(self._walk + step, c.base - c.amplitude), c.base + c.amplitude)
+            value = self._walk
+        else:  # sine
+            value = c.base + c.amplitude * math.sin(2 * math.pi * cycle)
+
+        if c.noise > 0:
+            value += self.rng.gauss(0, c.noise)
+        return value
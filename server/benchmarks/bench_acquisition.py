@@ -0,0 +1,118 @@
+"""Benchmark: throughput ของ acquisition engine กับ Modbus simulator
+
+สร้าง gateway จำลอง G ตัว ตัวละ U unit (register map จาก config/mappings.json ของ device แรก)
+แล้ววัดเวลาต่อรอบ poll ของ ModbusAcquisitionService
+
+    cd server && python -m benchmarks.bench_acquisition --gateways 4 --units 100 --cycles 20 --latency 1
+    cd server && python -m benchmarks.bench_acquisition --gateways 1 --units 10 --blocks 8 --latency 20 --pipeline 8
+"""
+import os
+import sys
+import argparse
+import asyncio
+import statistics
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.domain.config_model import DeviceConfig, MappingConfig
+from app.services.config_service import StaticConfigService
+from app.domain.simulator_model import FaultProfile
+from app.simulator.builder import build_gateways, load_json, to_configs
+from app.simulator.server import ModbusSimulator
+from app.services.modbus_data_service import ModbusDataService
+from app.services.modbus_acquisition_service import ModbusAcquisitionService
+from app.services.acquisition_shards import ShardedAcquisitionService
+from app.infrastructure.modbus_connection_manager import ModbusConnectionManager
+from app.infrastructure.circuit_breaker import CircuitBreakerRegistry
+
+def template_mappings():
+    mappings = [MappingConfig(**m) for m in load_json(os.path.join("config", "mappings.json"))]
+    if not mappings:
+        mappings = [
+            MappingConfig(name=name, unit="", address=i * 2, device="bench")
+            for i, name in enumerate(["SO2", "NOx", "O2", "CO", "Dust", "Temperature", "Velocity", "Flowrate", "Pressure"])
+        ]
+    # ใช้ mapping ชื่อไม่ซ้ำชุดเดียวเป็นแม่แบบของทุก unit
+    seen, unique = set(), []
+    for m in mappings:
+        if m.name not in seen:
+            seen.add(m.name)
+            unique.append(m.model_copy(update={"device": "bench"}))
+    return unique
+
+async def run(args):
+    devices = [DeviceConfig(name=f"gw{i}", host=f"10.0.0.{i + 1}", port=0, unit=1) for i in range(args.gateways)]
+    template = template_mappings()
+    if args.blocks:
+        # เว้นช่วง address ให้ห่างเกิน gap tolerance - 1 mapping = 1 block
+        template = [
+            m.model_copy(update={"address": i * 2 * (settings.modbus_block_gap_tolerance + 2)})
+            for i, m in enumerate((template * args.blocks)[:args.blocks])
+        ]
+        template = [m.model_copy(update={"name": f"{m.name}_{i}"}) for i, m in enumerate(template)]
+    mappings = [m.model_copy(update={"device": d.name}) for d in devices for m in template]
+    faults = FaultProfile(latency=args.latency / 1000, jitter=args.jitter / 1000, drop_rate=args.drop_rate,
+                          pipelining=args.pipeline > 1)
+    gateways = build_gateways(devices, mappings, units_per_gateway=args.units, faults=faults)
+
+    simulator = ModbusSimulator(gateways, seed=args.seed)
+    async with simulator:
+        sim_devices, sim_mappings = to_configs(gateways)
+        sim_devices = [d.model_copy(update={"pipeline": args.pipeline}) for d in sim_devices]
+        config = StaticConfigService(sim_devices, sim_mappings)
+        connection_manager = ModbusConnectionManager()
+        if args.workers > 0:
+            acquisition = ShardedAcquisitionService(
+                ModbusDataService(config), args.workers, poll_timeout=args.poll_timeout
+            )
+        else:
+            acquisition = ModbusAcquisitionService(
+                ModbusDataService(config),
+                connection_manager,
+                poll_timeout=args.poll_timeout,
+                breakers=CircuitBreakerRegistry(),
+            )
+
+        durations = []
+        values = 0
+        for cycle in range(args.cycles + 1):
+            started = time.perf_counter()
+            data = await acquisition.poll_once()
+            elapsed = time.perf_counter() - started
+            if cycle == 0:
+                continue  # รอบแรกรวมการเปิด connection
+            durations.append(elapsed)
+            values += len(data or {})
+        if args.workers > 0:
+            acquisition.close()
+        connection_manager.close_all()
+
+        requests = sum(s["requests"] for s in simulator.get_stats())
+        total = sum(durations)
+        print(f"gateways={args.gateways} units/gateway={len(gateways[0].units)} "
+              f"devices={len(sim_devices)} mappings={len(sim_mappings)}")
+        print(f"cycle ms: mean {statistics.mean(durations) * 1000:.1f}  "
+              f"p95 {sorted(durations)[int(len(durations) * 0.95) - 1] * 1000:.1f}  "
+              f"max {max(durations) * 1000:.1f}")
+        print(f"values/s {values / total:,.0f}   requests (all cycles) {requests:,}   "
+              f"devices ok last cycle {acquisition.last_cycle.get('devices_ok')}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--gateways", type=int, default=4)
+    parser.add_argument("--units", type=int, default=50)
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0, help="ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="ms")
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--poll-timeout", type=float, default=settings.modbus_poll_timeout * 10)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--blocks", type=int, default=0, help="แยก mapping ต่อ unit เป็นกี่ block (0 = ตาม config)")
+    parser.add_argument("--pipeline", type=int, default=0, help="pipelined request window ต่อ device (0 = ทีละ request)")
+    parser.add_argument("--workers", type=int, default=0, help="acquisition worker processes (0 = in-process)")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
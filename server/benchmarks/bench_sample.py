@@ -0,0 +1,102 @@
+"""Microbenchmark: เวลาและหน่วยความจำต่อ 1 sample บน hot path
+
+เทียบเส้นทางเดิม (DataPoint -> legacy_corrected -> StackData -> .dict() -> แปลง timestamp -> json)
+กับ Sample (timestamp + array ตาม schema) -> correct_sample -> to_json_dict -> json
+ทั้งข้อความ WebSocket และการเตรียม field สำหรับ InfluxDB (ingest)
+
+    cd server && python -m benchmarks.bench_sample
+"""
+import os
+import sys
+import json
+import timeit
+import tracemalloc
+from datetime import datetime, timezone, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.domain.data_model import DataPoint, StackData
+from app.domain.sample import Sample, FIXED_SCHEMA
+from app.services.data_service import DataService
+from app.services.correction_engine import correct_value
+from app.services.config_service import StaticConfigService
+from app.domain.config_model import MappingConfig
+
+FIXED = ("SO2", "NOx", "O2", "CO", "Dust", "Temperature", "Velocity", "Flowrate", "Pressure")
+VALUES = {"SO2": 12.3, "NOx": 50.1, "O2": 10.2, "CO": 4.4, "Dust": 3.3, "Temperature": 120.0,
+          "Velocity": 5.0, "Flowrate": 1000.0, "Pressure": -1.0}
+TIMESTAMP = datetime.now(timezone(timedelta(hours=7)))
+
+def legacy_corrected(service: DataService, data: DataPoint) -> DataPoint:
+    """DataService._calculate_corrected_values เดิม (ก่อนใช้ Sample) - เก็บไว้เป็น baseline ของ benchmark"""
+    factors = service.correction.factors(data.O2)
+    if not factors:
+        return data
+    corrected = DataPoint(timestamp=data.timestamp)
+    for param_name, value in data.to_dict().items():
+        factor = factors.get(param_name)
+        corrected.set(param_name, value if factor is None else correct_value(value, factor))
+    return corrected
+
+def legacy_message(service: DataService) -> str:
+    """_snapshot_stack_data + _data_message เดิมใน main.py"""
+    data = DataPoint(timestamp=TIMESTAMP, **{name: VALUES.get(name, 0.0) for name in FIXED})
+    stack_data = StackData(stack_id="stack1", stack_name="Stack 1", data=data,
+                           corrected_data=legacy_corrected(service, data), status="ok")
+    item = stack_data.dict()
+    for key in ("data", "corrected_data"):
+        if item.get(key) and item[key].get("timestamp"):
+            item[key]["timestamp"] = item[key]["timestamp"].isoformat()
+    return json.dumps({"type": "data", "data": [item], "timestamp": TIMESTAMP.isoformat(), "changed": []})
+
+def sample_message(service: DataService) -> str:
+    sample = Sample.from_mapping(FIXED_SCHEMA, TIMESTAMP, VALUES)
+    corrected = service.correct_sample(sample)
+    item = {"stack_id": "stack1", "stack_name": "Stack 1", "data": sample.to_json_dict(),
+            "corrected_data": corrected.to_json_dict(), "status": "ok"}
+    return json.dumps({"type": "data", "data": [item], "timestamp": TIMESTAMP.isoformat(), "changed": []})
+
+def legacy_ingest(service: DataService):
+    """DataService._convert_modbus_to_stack_data + save_data_to_influxdb เดิม (ไม่รวมการเขียน DB)"""
+    mapped = [m.name for m in service.config_service.get_mappings()]
+    data = DataPoint(timestamp=TIMESTAMP, **{name: VALUES.get(name, 0) if name in mapped else 0 for name in FIXED})
+    stack_data = StackData(stack_id="stack1", stack_name="Stack 1", data=data,
+                           corrected_data=legacy_corrected(service, data), status="ok")
+    return stack_data.data.to_dict(), stack_data.corrected_data.to_dict()
+
+def sample_ingest(service: DataService):
+    sample = service.sample_from_values(VALUES, TIMESTAMP)
+    return sample.as_dict(), service.correct_sample(sample).as_dict()
+
+def allocations(fn, number=1000):
+    """จำนวน byte สูงสุดที่ allocate ระหว่างเรียก 1 ครั้ง (เฉลี่ยจาก number ครั้ง)"""
+    fn()
+    tracemalloc.start()
+    total_bytes = 0
+    for _ in range(number):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        fn()
+        total_bytes += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return total_bytes / number
+
+def run(label, legacy, compiled, number):
+    assert legacy() == compiled(), label
+    legacy_us = min(timeit.repeat(legacy, number=number, repeat=5)) / number * 1e6
+    compiled_us = min(timeit.repeat(compiled, number=number, repeat=5)) / number * 1e6
+    legacy_bytes = allocations(legacy)
+    compiled_bytes = allocations(compiled)
+    print(f"{label:<18} DataPoint {legacy_us:7.1f} us {legacy_bytes:8,.0f} B   "
+          f"Sample {compiled_us:7.1f} us {compiled_bytes:8,.0f} B   x{legacy_us / compiled_us:.1f}")
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    mappings = [MappingConfig(name=name, unit="", address=i * 2, device="bench") for i, name in enumerate(FIXED)]
+    service = DataService(config_service=StaticConfigService([], mappings))
+    print("cost per sample (peak bytes allocated per call)")
+    run("WebSocket message", lambda: legacy_message(service), lambda: sample_message(service), number)
+    run("InfluxDB fields", lambda: legacy_ingest(service), lambda: sample_ingest(service), number)
+
+if __name__ == "__main__":
+    main()
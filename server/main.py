@@ -16,7 +16,8 @@ from reportlab.lib.units import inch
 from app.core.config import settings
 from app.core.constants import DATA_PARAMETERS, DEFAULT_THRESHOLDS, STATUS_CATEGORIES
 from app.services.data_service import DataService
-from app.domain.data_model import DataResponse, DataPoint, StackData
+from app.domain.data_model import DataResponse, DataPoint, StackData, RecorrectionRequest
+from app.domain.sample import Sample, FIXED_SCHEMA
 from app.services.config_service import ConfigService
 from app.domain.config_model import *
 from app.services.websocket_service import WebSocketService
@@ -29,6 +30,10 @@ from app.services.logs_service import LogsService
 from app.services.health_service import HealthService
 from app.domain.logs_model import LogFilter, LogResponse
 from app.services.modbus_data_service import ModbusDataService
+from app.services.modbus_acquisition_service import ModbusAcquisitionService
+from app.services.acquisition_shards import ShardedAcquisitionService
+from app.services.tick_scheduler import TickScheduler
+from app.services.snapshot_hub import snapshot_hub
 from app.services.influxdb_service import InfluxDBService
 from app.routers import influxdb
 from app.routers import config_devices
@@ -37,6 +42,14 @@ from app.routers import config_system
 from app.routers import config_thresholds
 from app.routers import config_status_alarm
 from app.services.status_alarm_sevice import StatusAlarmService
+from app.infrastructure.modbus_connection_manager import modbus_connection_manager
+from app.infrastructure.circuit_breaker import device_breakers
+from app.infrastructure.leader_lock import LeaderLock
+from app.services.device_actor import device_actors
+from app.services.status_event_recorder import StatusEventRecorder, state_from_items
+from app.services.recorrection_job import RecorrectionJob
+from app.services.rolling_aggregates import RollingAggregator
+from app.infrastructure.shared_value_table import SharedValueTable
 
 # Create FastAPI app
 app = FastAPI(
@@ -60,77 +73,266 @@ app.add_middleware(GZipMiddleware, minimum_size=1024)
 # WebSocket CORS is handled by the main CORS middleware
 
 # Initialize services
+# ทุก service ใช้ ModbusDataService ตัวเดียวกัน (socket อยู่ที่ modbus_connection_manager)
 websocket_service = WebSocketService()
 config_service = ConfigService()
-data_service = DataService(websocket_service, config_service)
-status_service = StatusService(config_service)
+modbus_data_service = ModbusDataService(config_service)
+data_service = DataService(websocket_service, config_service, modbus_data_service, snapshot_hub)
+status_alarm_service = StatusAlarmService(config_service, modbus_data_service)
+status_service = StatusService(config_service, status_alarm_service, snapshot_hub)
 blowback_service = BlowbackService()
 logs_service = LogsService()
 health_service = HealthService()
-modbus_data_service = ModbusDataService(config_service)
 influxdb_service = InfluxDBService()
-status_alarm_service = StatusAlarmService(config_service)
+status_events = StatusEventRecorder()
+# คำนวณ *Corr ย้อนหลังใหม่ด้วย rule ปัจจุบันของ data_service.correction
+recorrection_job = RecorrectionJob(lambda: data_service.correction, data_service.influxdb_service)
+# ค่าเฉลี่ย 1 นาที / 15 นาที / 1 ชั่วโมงของ bucket ปัจจุบัน (stream "data" และ "corrected")
+rolling_aggregates = RollingAggregator(settings.rolling_windows, settings.rolling_history)
+ROLLING_CLOSE_GRACE = 5.0  # ปิด bucket ที่ไม่มี sample ใหม่หลังหมดเวลาไปแล้วกี่วินาที (รอ tick สุดท้ายที่มาช้า)
+if settings.acquisition_workers > 0:
+    # device จำนวนมาก - แบ่งตาม gateway ไปอ่านใน worker process (poll loop ยังเป็นผู้ publish snapshot)
+    acquisition_service = ShardedAcquisitionService(modbus_data_service, settings.acquisition_workers)
+else:
+    acquisition_service = ModbusAcquisitionService(modbus_data_service, modbus_connection_manager)
 
 # Background task for periodic saving to InfluxDB every 1 minute
 import asyncio
 _bg_task = None
 
-# ---- Realtime (Modbus) cache + poller ----
+# ---- Realtime (Modbus) poller ----
+# poll loop เป็นผู้อ่าน Modbus เพียงรายเดียว แล้ว publish snapshot ลง snapshot_hub
+# REST, WebSocket, ingest และ status/alarm อ่านจาก snapshot_hub เท่านั้น
+# รันหลาย uvicorn worker ได้: worker ที่ได้ acquisition_lock เป็นผู้ poll และเขียน shared_table
+# worker อื่นอ่าน shared_table มาใส่ snapshot_hub ของตัวเอง (device ถูกอ่านครั้งเดียวไม่ว่ามีกี่ worker)
 from datetime import timezone, timedelta
-_modbus_cache = {"data": None, "ts": None, "status": "init"}
+import tempfile
+import time
+_role_task = None
 _modbus_task = None
+_status_task = None
+_keepalive_task = None
+_aggregate_task = None
+_shared_writer = False
+
+acquisition_lock = LeaderLock(
+    settings.acquisition_lock_path or os.path.join(tempfile.gettempdir(), "cems_acquisition.lock")
+)
+shared_table = SharedValueTable(settings.shared_table_name, settings.shared_table_capacity)
+LEADER_RETRY_INTERVAL = 1.0  # worker ที่ไม่ได้ poll ลองถือ lock ทุกกี่วินาที
+
+# tick ตามขอบเวลาจริง - ts ของทุก sample คือเวลาของ slot ไม่ใช่เวลาที่อ่านเสร็จ
+poll_ticker = TickScheduler(acquisition_service.poll_interval, name="modbus-poll")
+status_ticker = TickScheduler(settings.status_poll_interval, name="status-poll")
+ingest_ticker = TickScheduler(60, name="ingest")
 
 async def _modbus_poll_loop():
-    thailand_tz = timezone(timedelta(hours=7))
-    backoff = 1
     while True:
+        # ความถี่ poll = pollInterval ที่สั้นที่สุดของ mappings (ค่าเริ่มต้น 1 วินาที)
+        poll_ticker.set_interval(acquisition_service.poll_interval)
+        tick = await poll_ticker.wait_next()
         try:
-            # จำกัดเวลา poll ไม่ให้ค้างนาน (เช่น 500ms)
-            data = await asyncio.wait_for(
-                asyncio.to_thread(modbus_data_service.get_data_from_devices),
-                timeout=0.5
+            # อ่านทุก device พร้อมกัน - device ที่เกิน settings.modbus_poll_timeout ถูก cancel
+            data = await acquisition_service.poll_once()
+            # change_seq เปลี่ยนเฉพาะเมื่อมีค่าผ่าน deadband - sink ที่ change_seq ไม่เปลี่ยนไม่ต้องส่ง/บันทึกซ้ำ
+            snapshot = snapshot_hub.publish_values(
+                data,
+                acquisition_service.changes,
+                acquisition_service.change_seq,
+                slot=tick.slot,
+                timestamp=tick.scheduled_at,
             )
-            now = datetime.now(thailand_tz)
-            _modbus_cache["data"] = data
-            _modbus_cache["ts"] = now
-            _modbus_cache["status"] = "ok"
-            backoff = 1  # reset เมื่อสำเร็จ
         except Exception as e:
-            _modbus_cache["status"] = f"error: {e}"
-            # exponential backoff: 1s → 2s → 4s (สูงสุด 10s)
-            await asyncio.sleep(backoff)
-            backoff = min(backoff * 2, 10)
-            continue
+            snapshot = snapshot_hub.publish_status(f"error: {e}")
+        _share(snapshot)
 
-        # ความถี่ poll ปกติ (เช่น ทุก 1 วินาที)
-        await asyncio.sleep(1)
+async def _status_poll_loop():
+    """อ่าน coil ของ status/alarm ทุก settings.status_poll_interval วินาที แล้ว publish ลง snapshot_hub"""
+    while True:
+        tick = await status_ticker.wait_next()
+        try:
+            items = await asyncio.to_thread(status_alarm_service.read_status_alarm_data)
+            _share(snapshot_hub.publish_status_alarms(items, tick.scheduled_at))
+            # บันทึกเฉพาะตัวที่ค่าเปลี่ยน (edge) - รอบที่ไม่มีอะไรเปลี่ยนไม่เขียน InfluxDB
+            # event ที่บันทึกไม่สำเร็จค้างใน pending และถูกส่งซ้ำรอบถัดไป
+            status_events.observe(items, tick.scheduled_at)
+            if status_events.pending:
+                await asyncio.to_thread(status_events.flush, influxdb_service.save_status_events)
+        except Exception as e:
+            print(f"Status poll error: {e}")
+
+def _share(snapshot):
+    """เขียน snapshot ลง shared memory ให้ uvicorn worker อื่นอ่าน"""
+    if not _shared_writer:
+        return
+    try:
+        shared_table.write(snapshot)
+    except Exception as e:
+        print(f"Shared table write error: {e}")
+
+async def _acquisition_role_loop():
+    """รอจนได้ acquisition_lock (แล้วเริ่ม poll) - ระหว่างรอ อ่านค่าล่าสุดจาก shared memory ของผู้ poll"""
+    next_try = 0.0
+    while True:
+        now = time.monotonic()
+        if now >= next_try:
+            next_try = now + LEADER_RETRY_INTERVAL
+            if acquisition_lock.acquire():
+                _start_acquisition_tasks()
+                return
+        try:
+            snapshot = shared_table.read()
+            if snapshot is not None and snapshot.seq != snapshot_hub.latest().seq:
+                snapshot_hub.publish_snapshot(snapshot)
+        except Exception as e:
+            print(f"Shared table read error: {e}")
+        await asyncio.sleep(settings.shared_table_refresh)
+
+async def _modbus_keepalive_loop():
+    """ตรวจ socket Modbus ที่ว่างอยู่เป็นระยะ ไม่ให้ gateway ตัดทิ้ง"""
+    while True:
+        await asyncio.sleep(settings.modbus_keepalive_interval)
+        try:
+            await asyncio.to_thread(modbus_connection_manager.keepalive)
+        except Exception as e:
+            print(f"Modbus keepalive error: {e}")
 
 async def _background_ingest_loop():
-    """Fetch latest data and persist to InfluxDB every 60 seconds."""
+    """Fetch latest data and persist to InfluxDB on every wall-clock minute."""
+    last_seq = None
     while True:
+        await ingest_ticker.wait_next()
         try:
+            snapshot = snapshot_hub.latest()
+            # ไม่มีค่าไหนเปลี่ยนเกิน deadband ตั้งแต่รอบก่อน (และยังไม่ถึง heartbeat) - ไม่ต้องบันทึกซ้ำ
+            if snapshot.change_seq == last_seq:
+                continue
+            last_seq = snapshot.change_seq
             # Determine stack id
             stacks = config_service.get_stacks() or []
             stack_id = stacks[0].id if stacks else "stack1"
-            # get_latest_data already handles saving to DB when enabled
-            data_service.get_latest_data(stack_id)
+            await asyncio.to_thread(data_service.ingest_snapshot, snapshot, stack_id)
         except Exception as e:
             print(f"Background ingest error: {e}")
-        await asyncio.sleep(60)
+
+async def _rolling_aggregate_loop():
+    """ป้อนทุก poll tick (ค่าดิบและค่าที่ correct แล้ว) เข้า rolling_aggregates - ทำในทุก worker"""
+    last_slot = None
+    seq = snapshot_hub.latest().seq
+    while True:
+        snapshot = await snapshot_hub.wait_next(seq, timeout=1.0)
+        try:
+            if snapshot.seq != seq:
+                seq = snapshot.seq
+                # snapshot ของ status/alarm หรือรอบที่ poll ล้มเหลวใช้ slot เดิม - นับเฉพาะ tick ใหม่
+                if snapshot.values and snapshot.timestamp and snapshot.slot != last_slot:
+                    last_slot = snapshot.slot
+                    registry = data_service.parameters()
+                    # device ที่ไม่ตอบไม่มีค่าใน snapshot - ใช้ NaN ไม่ให้ถูกเฉลี่ยเป็น 0
+                    sample = Sample.from_mapping(registry.schema, snapshot.timestamp, snapshot.values,
+                                                 registry.mapped, missing=float("nan"))
+                    rolling_aggregates.add(sample, "data")
+                    rolling_aggregates.add(data_service.correct_sample(sample), "corrected")
+            rolling_aggregates.close_expired(time.time() - ROLLING_CLOSE_GRACE)
+        except Exception as e:
+            print(f"Rolling aggregate error: {e}")
+
+def _snapshot_samples(snapshot, timestamp: datetime):
+    """(sample, corrected) ของ dashboard จาก snapshot (ใช้ร่วมกันระหว่าง REST และ WebSocket)"""
+    sample = Sample.from_mapping(FIXED_SCHEMA, timestamp, snapshot.values)
+    return sample, data_service.correct_sample(sample)
+
+_message_cache = (None, None)  # ((snapshot seq, stack_id), ข้อความ) - client ทุกตัวที่รอ snapshot เดียวกันใช้ข้อความเดียว
+
+def _snapshot_message(snapshot, stack_id: str) -> str:
+    """ข้อความ type=data ของ /ws/data จาก snapshot โดยตรง (ไม่ผ่าน pydantic)
+
+    เวลาของข้อมูลคือเวลาของ snapshot (slot) - ข้อความจึงขึ้นกับ seq และ stack_id เท่านั้น
+    """
+    global _message_cache
+    key = (snapshot.seq, stack_id)
+    cached_key, message = _message_cache
+    if cached_key == key:
+        return message
+    timestamp = snapshot.timestamp or datetime.now(timezone(timedelta(hours=7)))
+    sample, corrected = _snapshot_samples(snapshot, timestamp)
+    item = {
+        "stack_id": stack_id,
+        "stack_name": "Stack 1",
+        "data": sample.to_json_dict(),
+        "corrected_data": corrected.to_json_dict(),
+        "status": snapshot.status,
+    }
+    message = json.dumps({
+        "type": "data",
+        "data": [item],
+        "timestamp": datetime.now().isoformat(),
+        "changed": list(snapshot.changes),
+    })
+    _message_cache = (key, message)
+    return message
+
+def _data_message(stack_data: StackData, changed: Optional[List[str]] = None) -> str:
+    """ข้อความ type=data ของ /ws/data (timestamp เป็น ISO string)"""
+    item = stack_data.dict()
+    for key in ("data", "corrected_data"):
+        if item.get(key) and item[key].get("timestamp"):
+            item[key]["timestamp"] = item[key]["timestamp"].isoformat()
+    message = {"type": "data", "data": [item], "timestamp": datetime.now().isoformat()}
+    if changed is not None:
+        message["changed"] = changed
+    return json.dumps(message)
 
 @app.on_event("startup")
 async def _start_background_task():
-    global _bg_task, _modbus_task
+    global _role_task, _aggregate_task
+    # การอ่าน Modbus จาก thread อื่น (status/alarm, API) ส่งเข้า actor ของ device บน loop นี้
+    device_actors.bind(asyncio.get_running_loop())
+    if _role_task is None:
+        _role_task = asyncio.create_task(_acquisition_role_loop())
+    if _aggregate_task is None:
+        _aggregate_task = asyncio.create_task(_rolling_aggregate_loop())
+
+def _start_acquisition_tasks():
+    """worker นี้เป็นผู้ poll Modbus, อ่าน status/alarm และบันทึก InfluxDB (worker เดียวในระบบ)"""
+    global _bg_task, _modbus_task, _status_task, _keepalive_task, _shared_writer
+    try:
+        shared_table.close()  # เคยเปิดแบบผู้อ่าน
+        shared_table.create_or_attach()
+        _shared_writer = True
+    except Exception as e:
+        print(f"Shared table unavailable - other workers will not see values: {e}")
+    print(f"✅ Acquisition owner: pid {os.getpid()}")
     if _bg_task is None:
         _bg_task = asyncio.create_task(_background_ingest_loop())
         print("✅ Background ingest started (every 60s)")
     if _modbus_task is None:
         _modbus_task = asyncio.create_task(_modbus_poll_loop())
         print("✅ Modbus poller started (every ~1s)")
+    if _status_task is None:
+        _status_task = asyncio.create_task(_status_poll_loop())
+    if _keepalive_task is None:
+        _keepalive_task = asyncio.create_task(_modbus_keepalive_loop())
 
 @app.on_event("shutdown")
 async def _stop_background_task():
-    global _bg_task, _modbus_task
+    global _role_task, _bg_task, _modbus_task, _status_task, _keepalive_task, _aggregate_task
+    if _role_task:
+        _role_task.cancel()
+        try:
+            await _role_task
+        except asyncio.CancelledError:
+            pass
+        _role_task = None
+
+    if _aggregate_task:
+        _aggregate_task.cancel()
+        try:
+            await _aggregate_task
+        except asyncio.CancelledError:
+            pass
+        _aggregate_task = None
+
     if _bg_task:
         _bg_task.cancel()
         try:
@@ -149,6 +351,28 @@ async def _stop_background_task():
         _modbus_task = None
         print("🛑 Modbus poller stopped")
 
+    if _status_task:
+        _status_task.cancel()
+        try:
+            await _status_task
+        except asyncio.CancelledError:
+            pass
+        _status_task = None
+
+    if _keepalive_task:
+        _keepalive_task.cancel()
+        try:
+            await _keepalive_task
+        except asyncio.CancelledError:
+            pass
+        _keepalive_task = None
+    if isinstance(acquisition_service, ShardedAcquisitionService):
+        acquisition_service.close()
+    device_actors.close()
+    modbus_connection_manager.close_all()
+    shared_table.close()
+    acquisition_lock.release()
+
 # Include routers
 app.include_router(influxdb.router)
 app.include_router(config_devices.router)
@@ -214,41 +438,15 @@ async def get_latest_data(stack_id: str):
 
 @app.get("/api/data/realtime/{stack_id}")
 async def get_realtime_data(stack_id: str):
-    """ดึงข้อมูลเรียลไทม์จาก cache (ที่มี poller อัปเดตทุก ~1s)"""
-    from app.domain.data_model import DataPoint, StackData
+    """ดึงข้อมูลเรียลไทม์จาก snapshot ล่าสุด (ที่ poller publish ทุก ~1s)"""
     thailand_tz = timezone(timedelta(hours=7))
-    now = datetime.now(thailand_tz)
-
-    raw = _modbus_cache.get("data") or {}
-    data = DataPoint(
-        timestamp=now,
-        SO2=raw.get("SO2", 0.0),
-        NOx=raw.get("NOx", 0.0),
-        O2=raw.get("O2", 0.0),
-        CO=raw.get("CO", 0.0),
-        Dust=raw.get("Dust", 0.0),
-        Temperature=raw.get("Temperature", 0.0),
-        Velocity=raw.get("Velocity", 0.0),
-        Flowrate=raw.get("Flowrate", 0.0),
-        Pressure=raw.get("Pressure", 0.0),
-    )
-
-    corrected_data = data_service._calculate_corrected_values(data)
-
-    stack_data = StackData(
-        stack_id=stack_id,
-        stack_name="Stack 1",
-        data=data,
-        corrected_data=corrected_data,
-        status=_modbus_cache.get("status", "unknown"),
-    )
-
-    # เขียนลง DB แบบ async-ไม่-block (โยนไป thread)
-    try:
-        await asyncio.to_thread(data_service.save_data_to_influxdb, stack_data)
-    except Exception as e:
-        print(f"save_data_to_influxdb error: {e}")
+    snapshot = snapshot_hub.latest()
+    # ใช้เวลาของ slot ที่อ่านค่ามา (ตรงกับขอบวินาที) เพื่อให้ค่าเฉลี่ยรายชั่วโมงนับ sample ได้แน่นอน
+    sample, corrected = _snapshot_samples(snapshot, snapshot.timestamp or datetime.now(thailand_tz))
+    # อ่านอย่างเดียว - ingest loop เป็นผู้เขียน InfluxDB เพียงทางเดียว (ผ่าน deadband/change_seq)
 
+    # pydantic model สร้างเฉพาะตอนตอบ API
+    stack_data = data_service.to_stack_data(stack_id, sample, corrected, snapshot.status, stack_name="Stack 1")
     return DataResponse(success=True, data=[stack_data])
 
 @app.post("/api/data/toggle-modbus")
@@ -295,19 +493,9 @@ async def add_devices(devices: List[DeviceConfig]):
 
 @app.get("/api/gas/list")
 async def get_gas_list():
-    """ดึงรายการแก๊สที่เปิดใช้งาน"""
+    """ดึงรายการแก๊สที่เปิดใช้งาน (จาก parameter registry - ไม่อ่านไฟล์ทุก request)"""
     try:
-        # ดึงข้อมูลจาก gas.json
-        gas_file = "config/gas.json"
-        if os.path.exists(gas_file):
-            with open(gas_file, "r", encoding="utf-8") as f:
-                gas_settings = json.load(f)
-        else:
-            gas_settings = []
-        
-        # กรองเฉพาะแก๊สที่ enabled = true
-        enabled_gases = [g for g in gas_settings if g.get('enabled', True)]
-        
+        enabled_gases = list(data_service.parameters().enabled_gases)
         return {
             "success": True, 
             "data": enabled_gases,
@@ -324,15 +512,7 @@ async def get_gas_list():
 async def get_gas_config():
     """ดึงข้อมูล gas settings สำหรับหน้า Config"""
     try:
-        # ดึงข้อมูลจาก gas.json
-        gas_file = "config/gas.json"
-        if os.path.exists(gas_file):
-            with open(gas_file, "r", encoding="utf-8") as f:
-                gas_settings = json.load(f)
-        else:
-            gas_settings = []
-        
-        return {"gas_settings": gas_settings}
+        return {"gas_settings": data_service.parameter_registry.gas_settings()}
     except Exception as e:
         return {"gas_settings": [], "error": str(e)}
 
@@ -340,15 +520,23 @@ async def get_gas_config():
 async def update_gas_settings(gas_list: List[dict]):
     """บันทึกข้อมูล gas settings"""
     try:
-        # บันทึกลง gas.json
-        gas_file = "config/gas.json"
-        with open(gas_file, "w", encoding="utf-8") as f:
-            json.dump(gas_list, f, indent=2, ensure_ascii=False)
+        # บันทึกลง gas.json - registry และ rule ของ O2 correction (correct/referenceO2) build ใหม่ตาม
+        data_service.parameter_registry.save_gas_settings(gas_list)
         
         return {"success": True, "message": "Gas settings saved successfully"}
     except Exception as e:
         return {"success": False, "message": f"Failed to save gas settings: {str(e)}"}
 
+@app.get("/api/parameters")
+async def get_parameters():
+    """parameter ทั้งหมดใน registry (index, หน่วย, correction, enabled, mapped)"""
+    registry = data_service.parameters()
+    return {
+        "success": True,
+        "version": list(registry.version),
+        "data": [p._asdict() for p in registry.parameters],
+    }
+
 @app.get("/api/config/system")
 async def get_system_params():
     return {"system_params": config_service.get_system_params()}
@@ -386,85 +574,34 @@ async def data_websocket(websocket: WebSocket):
     connection_active = True
     
     try:
-        # ส่งข้อมูลเริ่มต้น
+        # ส่งข้อมูลเริ่มต้น (snapshot ล่าสุด - ไม่อ่าน Modbus เอง)
         try:
             stack_data = data_service.get_latest_data("stack1")
             if stack_data:
-                message = {
-                    "type": "data",
-                    "data": [stack_data.dict()],
-                    "timestamp": datetime.now().isoformat()
-                }
-                # Convert datetime objects to ISO format strings
-                if 'data' in message and message['data']:
-                    for item in message['data']:
-                        if 'data' in item and 'timestamp' in item['data']:
-                            item['data']['timestamp'] = item['data']['timestamp'].isoformat()
-                        if 'corrected_data' in item and item['corrected_data'] and 'timestamp' in item['corrected_data']:
-                            item['corrected_data']['timestamp'] = item['corrected_data']['timestamp'].isoformat()
-                await websocket.send_text(json.dumps(message))
+                await websocket.send_text(_data_message(stack_data))
                 print("Initial data sent")
         except Exception as e:
             print(f"Error sending initial data: {e}")
         
-        # ส่งข้อมูลแบบ periodic ทุก 2 วินาที - แก้ให้ส่งทุกครั้ง มิใช่เฉพาะเวลาค่าเปลี่ยน
+        # รอ snapshot ใหม่จาก snapshot_hub - ส่งเมื่อมีค่าเปลี่ยนเกิน deadband หรือถึงรอบ heartbeat
         import asyncio
-        from datetime import timezone, timedelta
         
         async def send_periodic_data():
-            thailand_tz = timezone(timedelta(hours=7))
-            while connection_active:
+            sent_seq = None
+            async for snapshot in snapshot_hub.subscribe(snapshot_hub.latest().seq):
+                if not connection_active:
+                    break
+                # snapshot ที่ไม่มีค่าผ่าน deadband (เช่น status/alarm อัปเดต) ไม่ต้องส่ง
+                if snapshot.change_seq == sent_seq:
+                    continue
+                sent_seq = snapshot.change_seq
                 try:
-                    # สร้างข้อมูลจาก Modbus cache แทนการดึงจาก DB
-                    raw = _modbus_cache.get("data") or {}
-                    now = datetime.now(thailand_tz)
-
-                    # สร้าง DataPoint จาก cache
-                    data = DataPoint(
-                        timestamp=now,
-                        SO2=raw.get("SO2", 0.0),
-                        NOx=raw.get("NOx", 0.0),
-                        O2=raw.get("O2", 0.0),
-                        CO=raw.get("CO", 0.0),
-                        Dust=raw.get("Dust", 0.0),
-                        Temperature=raw.get("Temperature", 0.0),
-                        Velocity=raw.get("Velocity", 0.0),
-                        Flowrate=raw.get("Flowrate", 0.0),
-                        Pressure=raw.get("Pressure", 0.0),
-                    )
-
-                    corrected_data = data_service._calculate_corrected_values(data)
-
-                    stack_data = StackData(
-                        stack_id="stack1",
-                        stack_name="Stack 1",
-                        data=data,
-                        corrected_data=corrected_data,
-                        status=_modbus_cache.get("status", "unknown"),
-                    )
-
-                    # ส่งข้อมูลทุกครั้งพร้อม timestamp ปัจจุบัน
-                    message = {
-                        "type": "data",
-                        "data": [stack_data.dict()],
-                        "timestamp": datetime.now().isoformat()
-                    }
-                    
-                    # แปลง timestamp เป็น ISO string
-                    for item in message["data"]:
-                        if 'data' in item and 'timestamp' in item['data']:
-                            item['data']['timestamp'] = item['data']['timestamp'].isoformat()
-                        if 'corrected_data' in item and item['corrected_data'] and 'timestamp' in item['corrected_data']:
-                            item['corrected_data']['timestamp'] = item['corrected_data']['timestamp'].isoformat()
-
-                    await websocket.send_text(json.dumps(message))
+                    # ส่ง snapshot เต็ม พร้อมรายชื่อ parameter ที่เปลี่ยน (changed)
+                    await websocket.send_text(_snapshot_message(snapshot, "stack1"))
                     print(f"Periodic data sent at {datetime.now().strftime('%H:%M:%S')}")
-                    
                 except Exception as e:
                     print(f"Error sending periodic data: {e}")
                     break
-                    
-                await asyncio.sleep(2)
         
         # เริ่มส่งข้อมูลแบบ periodic
         periodic_task = asyncio.create_task(send_periodic_data())
@@ -480,19 +617,7 @@ async def data_websocket(websocket: WebSocket):
                     try:
                         stack_data = data_service.get_latest_data("stack1")
                         if stack_data:
-                            message = {
-                                "type": "data",
-                                "data": [stack_data.dict()],
-                                "timestamp": datetime.now().isoformat()
-                            }
-                            # Convert datetime objects to ISO format strings
-                            if 'data' in message and message['data']:
-                                for item in message['data']:
-                                    if 'data' in item and 'timestamp' in item['data']:
-                                        item['data']['timestamp'] = item['data']['timestamp'].isoformat()
-                                    if 'corrected_data' in item and item['corrected_data'] and 'timestamp' in item['corrected_data']:
-                                        item['corrected_data']['timestamp'] = item['corrected_data']['timestamp'].isoformat()
-                            await websocket.send_text(json.dumps(message))
+                            await websocket.send_text(_data_message(stack_data))
                             print("Latest data sent on request")
                     except Exception as e:
                         print(f"Error sending latest data: {e}")
@@ -694,20 +819,53 @@ async def get_system_info():
 
 # Modbus Routes
 @app.get("/api/modbus/test/{device_id}")
-async def test_modbus_connection(device_id: str):
-    result = modbus_data_service.test_connection(device_id)
+async def test_modbus_connection(device_id: str, max_age: Optional[float] = None):
+    """max_age (วินาที): ถ้า device ตอบ acquisition ภายในช่วงนี้ ไม่ต้องส่ง request ทดสอบใหม่"""
+    result = await asyncio.to_thread(modbus_data_service.test_connection, device_id, max_age)
     return result
 
 @app.get("/api/modbus/read/{device_id}/{parameter}")
-async def read_modbus_parameter(device_id: str, parameter: str):
-    value = modbus_data_service.read_parameter(device_id, parameter)
+async def read_modbus_parameter(device_id: str, parameter: str, max_age: Optional[float] = None):
+    """max_age (วินาที): ใช้ค่าจาก register cache ถ้าอ่านมาไม่เกินนี้ ไม่เช่นนั้นอ่านสดผ่าน actor ของ device"""
+    cached = modbus_data_service.cached_parameter(device_id, parameter, max_age) if max_age is not None else None
+    if cached is not None:
+        value, age = cached
+    else:
+        value, age = await asyncio.to_thread(modbus_data_service.read_parameter, device_id, parameter), None
     return {
         "device_id": device_id,
         "parameter": parameter,
         "value": value,
-        "success": value is not None
+        "success": value is not None,
+        "source": "cache" if cached is not None else "device",
+        "age": round(age, 3) if age is not None else None,
     }
 
+@app.get("/api/modbus/read-plan")
+async def get_modbus_read_plan():
+    """แสดง read plan (block reads) ของแต่ละ device และจำนวน round trip ที่ลดได้"""
+    return modbus_data_service.get_read_plan_summary()
+
+@app.get("/api/modbus/schedule")
+async def get_modbus_schedule():
+    """แสดงรอบการอ่านของแต่ละ mapping (pollInterval)"""
+    return acquisition_service.scheduler.get_schedule()
+
+@app.get("/api/modbus/health")
+async def get_modbus_health():
+    """สถานะ circuit breaker ของแต่ละ device (closed/open/half_open) และเวลาทดสอบครั้งถัดไป"""
+    return {"devices": device_breakers.get_stats()}
+
+@app.get("/api/modbus/actors")
+async def get_modbus_actors():
+    """คิวของ actor แต่ละ device: จำนวนที่รอ, request ที่ถูกรวม และเวลาให้บริการ (EWMA)"""
+    return {"devices": device_actors.get_stats()}
+
+@app.get("/api/modbus/timeouts")
+async def get_modbus_timeouts():
+    """RTT (EWMA/p99) ของแต่ละ device และ timeout/retry budget ที่คำนวณได้"""
+    return {"devices": acquisition_service.get_stats()["timeouts"]}
+
 @app.post("/api/modbus/toggle")
 async def toggle_modbus(enabled: bool):
     data_service.toggle_modbus(enabled)
@@ -722,7 +880,23 @@ async def get_modbus_status():
     return {
         "modbus_enabled": data_service.use_modbus,
         "connected_devices": list(modbus_data_service.connected_devices),
-        "available_devices": list(modbus_data_service.device_configs.keys())
+        "available_devices": list(modbus_data_service.device_configs.keys()),
+        "connections": modbus_connection_manager.get_stats(),
+        "health": device_breakers.get_stats(),
+        "acquisition": acquisition_service.get_stats(),
+        "actors": device_actors.get_stats(),
+        "register_cache": modbus_data_service.register_cache.get_stats(),
+        "config": modbus_data_service.config_snapshots.get_stats(),
+        "parameters": data_service.parameter_registry.get_stats(),
+        "aggregates": rolling_aggregates.get_stats(),
+        "snapshot": snapshot_hub.get_stats(),
+        "role": "owner" if acquisition_lock.held else "reader",
+        "shared_table": shared_table.get_stats(),
+        "ticks": {
+            "poll": poll_ticker.get_stats(),
+            "status": status_ticker.get_stats(),
+            "ingest": ingest_ticker.get_stats()
+        }
     }
 
 @app.post("/api/config/reload")
@@ -730,6 +904,7 @@ async def reload_config():
     """โหลดการตั้งค่าใหม่จาก Config"""
     try:
         modbus_data_service.reload_configs()
+        data_service.parameter_registry.reload_gas_settings()
         return {"success": True, "message": "Configuration reloaded successfully"}
     except Exception as e:
         return {"success": False, "message": f"Failed to reload config: {str(e)}"}
@@ -738,7 +913,7 @@ async def reload_config():
 async def test_modbus_connection_endpoint(device: dict):
     """ทดสอบการเชื่อมต่อ Modbus"""
     try:
-        result = modbus_data_service.test_connection(device.get("name", ""))
+        result = await asyncio.to_thread(modbus_data_service.test_connection, device.get("name", ""))
         return result
     except Exception as e:
         return {"success": False, "message": f"Connection test failed: {str(e)}"}
@@ -774,6 +949,32 @@ async def search_data(
     except Exception as e:
         return {"success": False, "message": str(e)}
 
+@app.post("/api/influxdb/recorrect")
+async def start_recorrection(request: RecorrectionRequest):
+    """เริ่มคำนวณ *Corr ของช่วงเวลานี้ใหม่ตาม rule ปัจจุบัน (ทำใน background)"""
+    try:
+        progress = recorrection_job.start(request.stack_id, request.start_time, request.end_time, request.chunk_seconds)
+        return {"success": True, "data": progress}
+    except (ValueError, RuntimeError) as e:
+        return {"success": False, "message": str(e)}
+
+@app.post("/api/influxdb/recorrect/resume")
+async def resume_recorrection():
+    """ทำต่อจาก checkpoint ของ job ที่หยุดไป"""
+    try:
+        return {"success": True, "data": recorrection_job.resume()}
+    except (FileNotFoundError, ValueError, RuntimeError) as e:
+        return {"success": False, "message": str(e)}
+
+@app.post("/api/influxdb/recorrect/cancel")
+async def cancel_recorrection():
+    """หยุดหลังจบ chunk ปัจจุบัน - resume ได้ภายหลัง"""
+    return {"success": recorrection_job.cancel(), "data": recorrection_job.get_progress()}
+
+@app.get("/api/influxdb/recorrect")
+async def get_recorrection_progress():
+    return {"success": True, "data": recorrection_job.get_progress()}
+
 @app.get("/api/influxdb/test-connection")
 async def test_influxdb_connection():
     """ทดสอบการเชื่อมต่อ InfluxDB"""
@@ -792,15 +993,73 @@ async def test_influxdb_connection():
 
 
 # Status Alarm Routes
+@app.get("/api/status-alarm/events")
+async def get_status_alarm_events(
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    name: Optional[str] = None,
+    limit: int = 1000
+):
+    """ประวัติการเปลี่ยนสถานะ status/alarm (บันทึกเฉพาะจุดที่ค่าเปลี่ยน)"""
+    events = await asyncio.to_thread(influxdb_service.get_status_events, start_time, end_time, name, limit)
+    return {"success": True, "data": events, "count": len(events)}
+
+@app.get("/api/status-alarm/state")
+async def get_status_alarm_state():
+    """สถานะปัจจุบัน (1 = ON, None = อ่านไม่ได้) จาก snapshot ล่าสุด - ได้ผลเดียวกันทุก worker
+
+    stats ของ recorder มีเฉพาะ worker ที่อ่าน status/alarm เอง (worker อื่นเป็น None)
+    """
+    snapshot = snapshot_hub.latest()
+    return {
+        "state": state_from_items(snapshot.status_alarms or ()),
+        "timestamp": snapshot.status_timestamp,
+        "stats": status_events.get_stats() if _status_task is not None else None,
+    }
+
+@app.get("/api/aggregates/current")
+async def get_current_aggregates(window: int = 3600, stream: str = "data"):
+    """avg/min/max ของ bucket ปัจจุบัน (ยังไม่ปิด) จาก memory - ไม่ query InfluxDB"""
+    if window not in rolling_aggregates.windows:
+        return {"success": False, "message": f"window must be one of {list(rolling_aggregates.windows)}"}
+    return {"success": True, "data": rolling_aggregates.current(window, stream)}
+
+@app.get("/api/aggregates/average")
+async def get_current_average(name: str, window: int = 3600, stream: str = "data"):
+    """ค่าเฉลี่ยของ parameter เดียวใน bucket ปัจจุบัน"""
+    return {"success": True, "name": name, "window": window,
+            "value": rolling_aggregates.average(name, window, stream)}
+
+@app.get("/api/aggregates/closed")
+async def get_closed_aggregates(window: int = 60, stream: str = "data", limit: int = 0):
+    """bucket ที่ปิดแล้วล่าสุด (ใหม่ไปเก่า) - เก็บไว้ settings.rolling_history ตัวต่อ window"""
+    data = rolling_aggregates.closed_buckets(window, stream, limit or None)
+    return {"success": True, "data": data, "count": len(data), "stats": rolling_aggregates.get_stats()}
+
+@app.websocket("/ws/aggregates")
+async def aggregates_websocket(websocket: WebSocket):
+    """ส่ง bucket ทุกตัวที่ปิด (type=aggregate) ทันทีที่ปิด"""
+    await websocket.accept()
+    queue = rolling_aggregates.subscribe()
+    try:
+        while True:
+            bucket = await queue.get()
+            await websocket.send_text(json.dumps({"type": "aggregate", "data": bucket}))
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        rolling_aggregates.unsubscribe(queue)
+
 @app.get("/api/status-alarm/data")
 async def get_status_alarm_data():
     """ดึงข้อมูล status/alarm จาก Modbus"""
     try:
-        data = status_alarm_service.read_status_alarm_data()
+        snapshot = snapshot_hub.latest()
+        data = [dict(item) for item in snapshot.status_alarms or ()]
         return {
             "success": True,
             "data": data,
-            "timestamp": datetime.now(),
+            "timestamp": snapshot.status_timestamp or datetime.now(),
             "count": len(data)
         }
     except Exception as e:
@@ -0,0 +1,38 @@
+import asyncio
+from types import SimpleNamespace
+from app.domain.config_model import DeviceConfig, MappingConfig
+from app.infrastructure.modbus_pipeline import ModbusExceptionResult
+from app.services.modbus_acquisition_service import ModbusAcquisitionService
+from app.services.read_plan_service import ReadPlanService
+
+class GappedClient:
+    """device ที่ไม่มี register 2-3 - อ่านข้ามช่วงนั้นได้ illegal address"""
+    async def read_registers(self, unit, address, count):
+        if address < 4 and address + count > 2:
+            raise ModbusExceptionResult(3, 2)
+        return [0] * count
+
+class FakeConnectionManager:
+    async def get_pipelined_client(self, host, port, unit=None, reclaim_async=False):
+        return GappedClient()
+
+def test_learned_split_does_not_modify_snapshot_plan():
+    read_plan_service = ReadPlanService(max_block_registers=100, gap_tolerance=10)
+    device = DeviceConfig(name="dev1", host="127.0.0.1", port=502, unit=1, pipeline=4)
+    mappings = [MappingConfig(name=name, device="dev1", unit="ppm", address=address, dataType="float32")
+                for name, address in (("SO2", 0), ("NOx", 4), ("CO", 8))]
+    plan = read_plan_service.compile_device(device, mappings)
+    original = list(plan.blocks)
+    assert len(original) == 1
+
+    data_service = SimpleNamespace(
+        register_cache=SimpleNamespace(store=lambda *args, **kwargs: None),
+        read_plan_service=read_plan_service,
+        _decode_block=lambda block, registers: {c.name: 0.0 for c in block.channels},
+    )
+    service = ModbusAcquisitionService(data_service, connection_manager=FakeConnectionManager())
+    data = asyncio.run(service._poll_device_pipelined(plan))
+
+    assert set(data) == {"SO2", "NOx", "CO"}
+    assert plan.blocks == original  # plan ใน config snapshot คงเดิม
+    assert [b.start for b in service._blocks(plan)] == [0, 4]
@@ -0,0 +1,36 @@
+import json
+import os
+from app.core.config import settings
+from app.services.config_service import ConfigService
+from app.services.config_snapshot_service import ConfigSnapshotService
+from app.services.read_plan_service import ReadPlanService
+
+def write_devices(names):
+    with open("config/devices.json", "w", encoding="utf-8") as f:
+        json.dump([{"name": name, "host": "127.0.0.1", "port": 502, "unit": 1} for name in names], f)
+    # กัน mtime ละเอียดไม่พอเมื่อเขียนติดกัน
+    stat = os.stat("config/devices.json")
+    os.utime("config/devices.json", ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+def test_poller_sees_devices_saved_by_another_worker(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(settings, "config_check_interval", 0.0)
+    os.makedirs("config")
+    write_devices(["dev1"])
+    # poller (leader) กับ worker ที่รับ HTTP request แก้ config เป็นคนละ process
+    poller = ConfigService()
+    snapshots = ConfigSnapshotService(poller, ReadPlanService())
+    assert [d.name for d in snapshots.current().devices] == ["dev1"]
+
+    write_devices(["dev1", "dev2"])  # + refresh_configs() ที่ worker อื่น
+    assert [d.name for d in snapshots.current().devices] == ["dev1", "dev2"]
+
+def test_unchanged_files_are_not_reloaded(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(settings, "config_check_interval", 0.0)
+    os.makedirs("config")
+    write_devices(["dev1"])
+    service = ConfigService()
+    version = service.version
+    assert service.reload_if_changed() is False
+    assert service.version == version
@@ -0,0 +1,116 @@
+import asyncio
+import socket
+import threading
+import time
+import pytest
+from app.infrastructure.modbus_connection_manager import ModbusConnectionManager
+
+class CountingServer:
+    """TCP server ที่นับ connection ที่เปิดค้างอยู่ (ไม่ตอบ Modbus - ทดสอบแค่จำนวน socket)"""
+
+    def __init__(self):
+        self.listener = socket.socket()
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen(16)
+        self.port = self.listener.getsockname()[1]
+        self.open = 0
+        self.lock = threading.Lock()
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                return
+            with self.lock:
+                self.open += 1
+            threading.Thread(target=self._hold, args=(conn,), daemon=True).start()
+
+    def _hold(self, conn):
+        try:
+            while conn.recv(1024):
+                pass
+        except OSError:
+            pass
+        finally:
+            conn.close()
+            with self.lock:
+                self.open -= 1
+
+    def settled_open(self) -> int:
+        time.sleep(0.1)  # ให้ thread ของ server เห็น close/accept ล่าสุดก่อน
+        with self.lock:
+            return self.open
+
+    def close(self):
+        self.listener.close()
+
+@pytest.fixture
+def server():
+    server = CountingServer()
+    yield server
+    server.close()
+
+def test_open_sockets_never_exceed_the_gateway_limit(server):
+    manager = ModbusConnectionManager(max_connections_per_gateway=2, lease_timeout=0.2)
+    host, port = "127.0.0.1", server.port
+    pool_of = lambda: manager._get_pool(host, port)
+
+    def check():
+        assert pool_of().open_count <= 2
+        assert server.settled_open() <= 2
+
+    async def scenario():
+        # socket sync ที่ว่างอยู่ 2 ตัว (เต็ม limit)
+        with manager.lease(host, port):
+            with manager.lease(host, port):
+                pass
+        check()
+        assert len(pool_of().idle) == 2
+
+        # async client ได้ slot จากการปิด socket ว่าง 1 ตัว
+        await manager.get_async_client(host, port)
+        check()
+        assert len(pool_of().idle) == 1
+
+        # async + pipelined ใช้ได้ไม่เกิน max - 1 - pipelined เปิดไม่ได้
+        with pytest.raises(ConnectionError):
+            await manager.get_pipelined_client(host, port)
+        check()
+
+        # status/coil/diagnostic ยังได้ socket เสมอ
+        with manager.lease(host, port):
+            check()
+            # lease ที่ 2 พร้อมกันต้องรอ (ไม่เปิดเกิน limit)
+            with pytest.raises(TimeoutError):
+                with manager.lease(host, port):
+                    pass
+        check()
+
+        # หมดช่วง fallback - pipelined ขอคืน slot จาก async client ที่ไม่มีใครใช้
+        await manager.get_pipelined_client(host, port, reclaim_async=True)
+        await asyncio.sleep(0.05)
+        check()
+        assert pool_of().async_client is None
+        manager.close_all()
+        await asyncio.sleep(0.05)  # async transport ปิดจริงใน event loop
+        assert pool_of().open_count == 0
+        assert server.settled_open() == 0
+
+    asyncio.run(scenario())
+
+def test_waiting_lease_gets_the_returned_socket(server):
+    manager = ModbusConnectionManager(max_connections_per_gateway=1, lease_timeout=2.0)
+    host, port = "127.0.0.1", server.port
+    got = []
+
+    with manager.lease(host, port) as first:
+        waiter = threading.Thread(target=lambda: got.append(manager.lease(host, port).__enter__()))
+        waiter.start()
+        time.sleep(0.1)
+        assert not got
+    waiter.join(1.0)
+    assert got == [first]
+    assert server.settled_open() == 1
+    manager.close_all()
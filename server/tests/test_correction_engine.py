@@ -0,0 +1,37 @@
+from datetime import datetime
+import pytest
+from app.domain.sample import Sample, SampleSchema
+from app.services import correction_engine
+from app.services.correction_engine import CorrectionEngine
+
+# O2 = ค่าอ้างอิง (7%) -> factor 1.0 พอดี: ผลขึ้นกับการปัดค่ากึ่งกลางอย่างเดียว
+HALF_WAY = [1.05, 2.45, 0.15, 0.25, 2.675, -1.05, 0.0, 123.45]
+O2 = 7.0
+
+def live(engine: CorrectionEngine):
+    schema = SampleSchema()
+    result = []
+    for value in HALF_WAY:
+        sample = Sample.from_mapping(schema, datetime(2026, 1, 1), {"SO2": value, "O2": O2})
+        result.append(engine.apply(sample).get("SO2"))
+    return result
+
+def bulk(engine: CorrectionEngine):
+    columns = {"SO2": HALF_WAY, "O2": [O2] * len(HALF_WAY)}
+    return [float(value) for value in engine.apply_columns(columns["O2"], columns)["SO2"]]
+
+def test_loop_columns_match_live(monkeypatch):
+    engine = CorrectionEngine.from_gas_settings()
+    monkeypatch.setattr(correction_engine, "np", None)
+    assert bulk(engine) == live(engine)
+
+def test_vectorized_columns_match_live():
+    pytest.importorskip("numpy")
+    engine = CorrectionEngine.from_gas_settings()
+    assert correction_engine.np is not None
+    assert bulk(engine) == live(engine)
+
+def test_invalid_o2_leaves_values_unchanged():
+    engine = CorrectionEngine.from_gas_settings()
+    columns = {"SO2": [10.0, 10.0, 10.0], "O2": [0.0, 20.95, 25.0]}
+    assert list(engine.apply_columns(columns["O2"], columns)["SO2"]) == [10.0, 10.0, 10.0]
@@ -0,0 +1,24 @@
+from app.domain.config_model import MappingConfig
+from app.services.deadband_filter import DeadbandFilter
+
+def mapping(**kwargs) -> MappingConfig:
+    return MappingConfig(name="SO2", device="dev1", unit="ppm", address=0, dataType="float32", **kwargs)
+
+def test_default_deadband_ignores_float_noise():
+    deadband = DeadbandFilter()
+    deadband.update([mapping()])
+    assert deadband.filter({"SO2": 100.0}, now=0.0) == {"SO2": 100.0}
+    assert deadband.filter({"SO2": 100.00001}, now=1.0) == {}
+    assert deadband.filter({"SO2": 100.5}, now=2.0) == {"SO2": 100.5}
+
+def test_zero_percent_reports_every_change():
+    deadband = DeadbandFilter()
+    deadband.update([mapping(deadbandPercent=0)])
+    deadband.filter({"SO2": 100.0}, now=0.0)
+    assert deadband.filter({"SO2": 100.00001}, now=1.0) == {"SO2": 100.00001}
+
+def test_heartbeat_after_max_silence():
+    deadband = DeadbandFilter(max_silence=60.0)
+    deadband.update([mapping()])
+    deadband.filter({"SO2": 100.0}, now=0.0)
+    assert deadband.filter({"SO2": 100.0}, now=60.0) == {"SO2": 100.0}
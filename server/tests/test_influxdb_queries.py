@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from app.services.influxdb_service import InfluxDBService
+
+THAILAND_TZ = timezone(timedelta(hours=7))
+
+class RecordingQueryApi:
+    def __init__(self):
+        self.queries = []
+
+    def query(self, query):
+        self.queries.append(query)
+        return []
+
+def make_service() -> InfluxDBService:
+    service = InfluxDBService()
+    service.influxdb = SimpleNamespace(bucket="cems", query_api=RecordingQueryApi())
+    return service
+
+def test_status_event_range_is_converted_to_utc():
+    service = make_service()
+    service.get_status_events(datetime(2026, 1, 1, 8, 0, tzinfo=THAILAND_TZ),
+                              datetime(2026, 1, 1, 9, 0, tzinfo=THAILAND_TZ))
+    query = service.influxdb.query_api.queries[0]
+    assert "start: 2026-01-01T01:00:00.000000Z" in query
+    assert "stop: 2026-01-01T02:00:00.000000Z" in query
+
+def test_status_event_name_is_escaped():
+    service = make_service()
+    service.get_status_events(name='Pump" or true or "\\${x}')
+    query = service.influxdb.query_api.queries[0]
+    assert 'r.name == "Pump\\" or true or \\"\\\\\\${x}")' in query
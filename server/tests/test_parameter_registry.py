@@ -0,0 +1,31 @@
+import json
+import os
+from app.services.parameter_registry import ParameterRegistryService
+
+class FakeConfigService:
+    version = 1
+
+    def get_mappings(self):
+        return []
+
+def test_other_worker_sees_saved_gas_settings(tmp_path):
+    gas_file = str(tmp_path / "gas.json")
+    with open(gas_file, "w", encoding="utf-8") as f:
+        json.dump([{"key": "SO2", "display": "SO2"}], f)
+    # สอง worker = สอง process ที่ใช้ไฟล์เดียวกัน
+    first = ParameterRegistryService(FakeConfigService(), gas_file)
+    second = ParameterRegistryService(FakeConfigService(), gas_file)
+    assert second.current().get("SO2").display == "SO2"
+
+    first.save_gas_settings([{"key": "SO2", "display": "Sulfur dioxide"}])
+    stat = os.stat(gas_file)
+    os.utime(gas_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))  # กัน mtime ละเอียดไม่พอ
+
+    assert first.current().get("SO2").display == "Sulfur dioxide"
+    assert second.current().get("SO2").display == "Sulfur dioxide"
+
+def test_unchanged_file_is_not_rebuilt(tmp_path):
+    service = ParameterRegistryService(FakeConfigService(), str(tmp_path / "gas.json"))
+    registry = service.current()
+    assert service.current() is registry
+    assert service.builds == 1
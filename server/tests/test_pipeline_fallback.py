@@ -0,0 +1,72 @@
+import asyncio
+from types import SimpleNamespace
+from app.domain.read_plan_model import DeviceReadPlan, ReadBlock
+from app.infrastructure.modbus_pipeline import PipelineError
+from app.services.modbus_acquisition_service import ModbusAcquisitionService
+
+class FakeConnectionManager:
+    def __init__(self, pipelined_client):
+        self.pipelined_client = pipelined_client
+        self.lock = asyncio.Lock()
+        self.resets = 0
+
+    async def get_pipelined_client(self, host, port, unit=None, reclaim_async=False):
+        return self.pipelined_client
+
+    def reset_pipelined_client(self, host, port):
+        self.resets += 1
+
+    def async_lock(self, host, port):
+        return self.lock
+
+    async def get_async_client(self, host, port, timeout=None, unit=None):
+        return StrictClient()
+
+class StrictClient:
+    async def read_holding_registers(self, address, count, slave=0):
+        return SimpleNamespace(registers=[0] * count, isError=lambda: False)
+
+class SilentClient:
+    """device ที่ไม่ตอบ pipelined request (frame หาย)"""
+    async def read_registers(self, unit, address, count):
+        await asyncio.sleep(10)
+
+class MismatchedClient:
+    async def read_registers(self, unit, address, count):
+        raise PipelineError("Response for unknown transaction")
+
+def make_service(client) -> ModbusAcquisitionService:
+    data_service = SimpleNamespace(
+        register_cache=SimpleNamespace(store=lambda *args, **kwargs: None),
+        read_plan_service=None,
+        _decode_block=lambda block, registers: {},
+    )
+    service = ModbusAcquisitionService(data_service, connection_manager=FakeConnectionManager(client),
+                                       request_timeout=0.01, poll_timeout=0.5)
+    service.pipeline_fallback_timeouts = 3
+    return service
+
+def make_plan() -> DeviceReadPlan:
+    blocks = [ReadBlock(start=0, count=2, channels=[]), ReadBlock(start=100, count=2, channels=[])]
+    return DeviceReadPlan(device="dev1", host="127.0.0.1", port=502, unit=1, pipeline=4, blocks=blocks)
+
+def test_single_timeout_does_not_disable_pipelining():
+    service = make_service(SilentClient())
+    plan = make_plan()
+
+    asyncio.run(service._poll_device(plan))
+    assert "dev1" not in service.pipeline_fallback
+    assert service.pipeline_timeouts["dev1"] == 1
+    assert service.rtt.get_stats()["dev1"]["timeouts"] == 2  # ทั้งสอง block นับใน RTT
+    assert service._use_pipeline(plan)
+
+    asyncio.run(service._poll_device(plan))
+    asyncio.run(service._poll_device(plan))
+    assert "dev1" in service.pipeline_fallback
+    assert not service._use_pipeline(plan)
+
+def test_mismatched_response_disables_pipelining_at_once():
+    service = make_service(MismatchedClient())
+    plan = make_plan()
+    asyncio.run(service._poll_device(plan))
+    assert "dev1" in service.pipeline_fallback
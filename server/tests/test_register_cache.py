@@ -0,0 +1,19 @@
+from app.services.register_cache import RegisterCache
+
+def test_blocks_read_in_a_shard_worker_fill_the_api_cache():
+    worker_cache = RegisterCache()
+    worker_cache.record_updates()
+    worker_cache.store("dev1", 0, [1, 2, 3, 4])
+
+    api_cache = RegisterCache()
+    api_cache.store_updates(worker_cache.take_updates())
+    registers, age = api_cache.lookup("dev1", 2, 2, max_age=1.0)
+    assert registers == [3, 4]
+    assert age < 1.0
+    # ส่งแล้วไม่ส่งซ้ำ
+    assert worker_cache.take_updates() == []
+
+def test_updates_are_not_recorded_by_default():
+    cache = RegisterCache()
+    cache.store("dev1", 0, [1])
+    assert cache.take_updates() == []
@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta, timezone
+from app.domain.sample import Sample, SampleSchema
+from app.services.rolling_aggregates import RollingAggregator
+
+NAN = float("nan")
+THAILAND_TZ = timezone(timedelta(hours=7))
+SCHEMA = SampleSchema(["HCl"])
+T0 = datetime(2026, 1, 1, 8, 0, 0, tzinfo=THAILAND_TZ)
+
+def tick(second: int, values, allowed=None) -> Sample:
+    return Sample.from_mapping(SCHEMA, T0 + timedelta(seconds=second), values, allowed, missing=NAN)
+
+def test_device_dropping_out_is_not_averaged_as_zero():
+    aggregator = RollingAggregator((60,))
+    aggregator.add(tick(0, {"SO2": 100.0}))
+    aggregator.add(tick(1, {"SO2": 100.0}))
+    # device ไม่ตอบ - ไม่มีค่าใน snapshot
+    aggregator.add(tick(2, {}))
+    aggregator.add(tick(3, {}))
+
+    assert aggregator.average("SO2", 60) == 100.0
+    current = aggregator.current(60)
+    assert current["samples"] == 4
+    assert current["parameters"]["SO2"] == {"avg": 100.0, "min": 100.0, "max": 100.0, "count": 2}
+
+    aggregator.add(tick(60, {"SO2": 50.0}))
+    closed = aggregator.closed_buckets(60)[0]
+    assert closed["parameters"]["SO2"]["count"] == 2
+    assert closed["parameters"]["SO2"]["avg"] == 100.0
+
+def test_real_zero_is_counted():
+    aggregator = RollingAggregator((60,))
+    aggregator.add(tick(0, {"SO2": 100.0}))
+    aggregator.add(tick(1, {"SO2": 0.0}))
+    assert aggregator.average("SO2", 60) == 50.0
+
+def test_unmapped_parameters_are_not_reported():
+    aggregator = RollingAggregator((60,))
+    aggregator.add(tick(0, {"SO2": 10.0, "HCl": 5.0}, allowed={"SO2"}))
+    parameters = aggregator.current(60)["parameters"]
+    assert set(parameters) == {"SO2"}
+    assert aggregator.average("HCl", 60) is None
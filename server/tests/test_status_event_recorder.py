@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta, timezone
+from app.infrastructure.shared_value_table import SharedValueTable
+from app.services.snapshot_hub import SnapshotHub
+from app.services.status_event_recorder import StatusEventRecorder, state_from_items
+import uuid
+
+THAILAND_TZ = timezone(timedelta(hours=7))
+T0 = datetime(2026, 1, 1, 8, 0, 0, tzinfo=THAILAND_TZ)
+
+def items(value: int):
+    return [{"name": "Pump Fault", "value": value}]
+
+def test_events_are_kept_until_saved():
+    recorder = StatusEventRecorder()
+    recorder.observe(items(0), T0)
+    recorder.flush(lambda events: True)
+
+    # InfluxDB ล่ม - edge ต้องไม่หาย
+    recorder.observe(items(1), T0 + timedelta(seconds=1))
+    assert recorder.flush(lambda events: False) is False
+    recorder.observe(items(1), T0 + timedelta(seconds=2))
+    recorder.observe(items(0), T0 + timedelta(seconds=3))
+    assert len(recorder.pending) == 2
+
+    saved = []
+    assert recorder.flush(lambda events: saved.extend(events) or True) is True
+    assert [(event.old, event.new) for event in saved] == [(0, 1), (1, 0)]
+    assert not recorder.pending
+
+def test_state_is_the_same_in_reader_workers():
+    name = f"cems_test_{uuid.uuid4().hex[:8]}"
+    writer = SharedValueTable(name, capacity=8).create_or_attach()
+    reader = SharedValueTable(name, capacity=8)
+    try:
+        hub = SnapshotHub()
+        items = [{"name": "Pump Fault", "value": 1}, {"name": "Door Open", "value": 0, "status": "ERROR"}]
+        writer.write(hub.publish_status_alarms(items, T0))
+        # worker ที่ไม่ได้อ่าน status/alarm เองได้สถานะเดียวกันจาก shared table
+        snapshot = reader.read()
+        assert state_from_items(snapshot.status_alarms) == {"Pump Fault": 1, "Door Open": None}
+        assert state_from_items(snapshot.status_alarms) == state_from_items(hub.latest().status_alarms)
+    finally:
+        reader.close()
+        writer.unlink()
+        writer.close()